@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the ticket/attachment/audit listing queries
+
+Seeds a synthetic dataset (1M tickets by default), then prints the query plan
+and latency of every listing query the API issues, with and without the
+indexes from migrations/versions/002_listing_indexes.py.
+
+    python scripts/bench_listing.py --sqlite /tmp/bench.db
+    python scripts/bench_listing.py --postgres postgresql://helpdesk:pw@localhost/helpdesk
+
+The Postgres run works in a separate helpdesk_bench schema and drops it at the end.
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_tickets_user_status_priority_id ON tickets(user_id, status, priority, id)",
+    "CREATE INDEX IF NOT EXISTS ix_tickets_user_priority_id ON tickets(user_id, priority, id)",
+    "CREATE INDEX IF NOT EXISTS ix_tickets_status_priority_id ON tickets(status, priority, id)",
+    "CREATE INDEX IF NOT EXISTS ix_tickets_priority_id ON tickets(priority, id)",
+    "CREATE INDEX IF NOT EXISTS ix_tickets_assigned_status_id ON tickets(assigned_to, status, id)",
+    "CREATE INDEX IF NOT EXISTS ix_attachments_ticket_id ON attachments(ticket_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_audit_log_entity ON audit_log(entity, entity_id, id)",
+]
+DROP_INDEXES = [f"DROP INDEX IF EXISTS {stmt.split()[5]}" for stmt in INDEXES]
+
+COLS = "id,title,description,status,priority,created_at,updated_at,assigned_to,user_id"
+
+
+def queries(users, tickets):
+    uid = random.randint(1, users)
+    tid = random.randint(1, tickets)
+    mid = tickets // 2
+    return [
+        ("user list", f"SELECT {COLS} FROM tickets WHERE user_id=? ORDER BY id DESC LIMIT 21 OFFSET 0", (uid,)),
+        ("user list status", f"SELECT {COLS} FROM tickets WHERE user_id=? AND status=? ORDER BY id DESC LIMIT 21 OFFSET 0", (uid, "Open")),
+        ("user list priority", f"SELECT {COLS} FROM tickets WHERE user_id=? AND priority=? ORDER BY id DESC LIMIT 21 OFFSET 0", (uid, "High")),
+        ("user count", "SELECT COUNT(*) FROM tickets WHERE user_id=?", (uid,)),
+        ("admin list", f"SELECT {COLS} FROM tickets ORDER BY id DESC LIMIT 21 OFFSET 0", ()),
+        ("admin list status+priority", f"SELECT {COLS} FROM tickets WHERE status=? AND priority=? ORDER BY id DESC LIMIT 21 OFFSET 0", ("Open", "High")),
+        ("admin list priority", f"SELECT {COLS} FROM tickets WHERE priority=? ORDER BY id DESC LIMIT 21 OFFSET 0", ("Low",)),
+        ("admin count status", "SELECT COUNT(*) FROM tickets WHERE status=?", ("Open",)),
+        ("admin deep offset", f"SELECT {COLS} FROM tickets WHERE status=? ORDER BY id DESC LIMIT 21 OFFSET ?", ("Open", mid // 2)),
+        ("admin keyset", f"SELECT {COLS} FROM tickets WHERE status=? AND id<? ORDER BY id DESC LIMIT 21", ("Open", mid)),
+        ("assignee queue", f"SELECT {COLS} FROM tickets WHERE assigned_to=? AND status=? ORDER BY id DESC LIMIT 21", (uid, "Open")),
+        ("attachments", "SELECT id,filename,stored_path,mime,size,uploaded_at,uploader_id FROM attachments WHERE ticket_id=? ORDER BY id DESC", (tid,)),
+        ("ticket history", "SELECT id,ts,actor_id,action,details FROM audit_log WHERE entity=? AND entity_id=? ORDER BY id DESC LIMIT 50", ("ticket", tid)),
+    ]
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    int_pk = "INTEGER PRIMARY KEY"
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+
+    def execute(self, sql, params=()):
+        c = self.conn.cursor()
+        c.execute(sql, params)
+        return c
+
+    def insert_many(self, table, cols, rows):
+        marks = ",".join("?" * len(cols))
+        self.conn.executemany(f"INSERT INTO {table}({','.join(cols)}) VALUES({marks})", rows)
+
+    def explain(self, sql, params):
+        rows = self.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        return [r[-1] for r in rows]
+
+    def analyze(self):
+        self.execute("ANALYZE")
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class PostgresBackend:
+    name = "postgres"
+    int_pk = "INTEGER PRIMARY KEY"
+
+    def __init__(self, url):
+        import psycopg2
+        from psycopg2.extras import execute_values
+        self._execute_values = execute_values
+        self.conn = psycopg2.connect(url)
+        self.execute("DROP SCHEMA IF EXISTS helpdesk_bench CASCADE")
+        self.execute("CREATE SCHEMA helpdesk_bench")
+        self.execute("SET search_path TO helpdesk_bench")
+
+    def execute(self, sql, params=()):
+        c = self.conn.cursor()
+        c.execute(sql.replace("?", "%s"), params)
+        return c
+
+    def insert_many(self, table, cols, rows):
+        c = self.conn.cursor()
+        self._execute_values(c, f"INSERT INTO {table}({','.join(cols)}) VALUES %s", rows, page_size=5000)
+
+    def explain(self, sql, params):
+        return [r[0] for r in self.execute("EXPLAIN " + sql, params).fetchall()]
+
+    def analyze(self):
+        self.conn.commit()
+        self.execute("ANALYZE")
+
+    def close(self):
+        self.conn.commit()
+        self.execute("DROP SCHEMA IF EXISTS helpdesk_bench CASCADE")
+        self.conn.commit()
+        self.conn.close()
+
+
+def seed(backend, tickets, users, batch=20000):
+    """Create a synthetic dataset shaped like production traffic"""
+    backend.execute(f'''CREATE TABLE IF NOT EXISTS tickets(
+        id {backend.int_pk}, title TEXT NOT NULL, description TEXT NOT NULL,
+        status TEXT DEFAULT 'Open', priority TEXT DEFAULT 'Normal',
+        created_at TEXT, updated_at TEXT, assigned_to INTEGER, user_id INTEGER)''')
+    backend.execute(f'''CREATE TABLE IF NOT EXISTS attachments(
+        id {backend.int_pk}, ticket_id INTEGER, filename TEXT, stored_path TEXT,
+        mime TEXT, size INTEGER, uploaded_at TEXT, uploader_id INTEGER)''')
+    backend.execute(f'''CREATE TABLE IF NOT EXISTS audit_log(
+        id {backend.int_pk}, ts TEXT, actor_id INTEGER, action TEXT,
+        entity TEXT, entity_id INTEGER, details TEXT)''')
+    if backend.execute("SELECT COUNT(*) FROM tickets").fetchone()[0] >= tickets:
+        return
+
+    rnd = random.Random(42)
+    techs = max(users // 50, 1)
+    ts = "2026-01-01 00:00:00"
+    for start in range(1, tickets + 1, batch):
+        ids = range(start, min(start + batch, tickets + 1))
+        backend.insert_many("tickets", ["id", "title", "description", "status", "priority", "created_at", "updated_at", "assigned_to", "user_id"], [
+            (i, f"Ticket {i}", "Synthetic benchmark ticket", rnd.choice(("Open", "Closed", "Closed")),
+             rnd.choice(("Low", "Normal", "Normal", "High")), ts, ts,
+             rnd.randint(1, techs) if rnd.random() < 0.6 else None, rnd.randint(1, users))
+            for i in ids])
+        backend.insert_many("attachments", ["ticket_id", "filename", "stored_path", "mime", "size", "uploaded_at", "uploader_id"], [
+            (i, "screenshot.png", f"{i}_screenshot.png", "image/png", 1024, ts, 1)
+            for i in ids if rnd.random() < 0.3])
+        backend.insert_many("audit_log", ["ts", "actor_id", "action", "entity", "entity_id", "details"], [
+            (ts, 1, action, "ticket", i, "")
+            for i in ids for action in ("create", "update")])
+        backend.conn.commit()
+        print(f"  seeded {ids[-1]:,} tickets", end="\r", flush=True)
+    print()
+
+
+def measure(backend, users, tickets, runs):
+    results = {}
+    for _ in range(runs):
+        for name, sql, params in queries(users, tickets):
+            t0 = time.perf_counter()
+            backend.execute(sql, params).fetchall()
+            results.setdefault(name, []).append((time.perf_counter() - t0) * 1000)
+    return results
+
+
+def report(backend, label, users, tickets, runs, show_plans):
+    print(f"\n== {backend.name}: {label} ==")
+    if show_plans:
+        for name, sql, params in queries(users, tickets):
+            print(f"-- {name}")
+            for line in backend.explain(sql, params):
+                print(f"     {line}")
+    results = measure(backend, users, tickets, runs)
+    print(f"{'query':<28}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, samples in results.items():
+        samples.sort()
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        print(f"{name:<28}{statistics.median(samples):>10.2f}{p95:>10.2f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--sqlite", help="SQLite file to create/reuse")
+    target.add_argument("--postgres", help="PostgreSQL URL")
+    parser.add_argument("--tickets", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--no-plans", action="store_true", help="only print latencies")
+    args = parser.parse_args()
+
+    backend = SQLiteBackend(args.sqlite) if args.sqlite else PostgresBackend(args.postgres)
+    try:
+        seed(backend, args.tickets, args.users)
+        for stmt in DROP_INDEXES:
+            backend.execute(stmt)
+        backend.analyze()
+        before = report(backend, "without indexes", args.users, args.tickets, args.runs, not args.no_plans)
+        for stmt in INDEXES:
+            backend.execute(stmt)
+        backend.analyze()
+        after = report(backend, "with indexes", args.users, args.tickets, args.runs, not args.no_plans)
+        print(f"\n{'query':<28}{'speedup (p50)':>14}")
+        for name in after:
+            speedup = statistics.median(before[name]) / max(statistics.median(after[name]), 1e-6)
+            print(f"{name:<28}{speedup:>13.1f}x")
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark for ticket full-text search (GET /api/tickets?q=...)
+
+Seeds tickets with word-like titles and descriptions (1M by default, Zipf-ish
+word frequencies), then compares a LIKE '%term%' scan with the FTS index the
+API uses: FTS5 on SQLite, the generated tsvector + GIN index on Postgres (see
+server/search.py and migrations/versions/007_ticket_search.py).
+
+    python scripts/bench_search.py --sqlite /tmp/bench_search.db
+    python scripts/bench_search.py --postgres postgresql://helpdesk:pw@localhost/helpdesk
+
+Search queries are the same shape as the API's: ranked first page of 21 rows
+with highlights, and the total count. The Postgres run works in a separate
+helpdesk_bench schema and drops it at the end.
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+from bench_listing import SQLiteBackend, PostgresBackend
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+import search  # noqa: E402
+
+COLS = "t.id,t.title,t.description,t.status,t.priority,t.created_at,t.updated_at,t.assigned_to,t.user_id"
+COMMON = ["printer", "email", "password", "vpn", "laptop", "network", "error", "login", "access", "slow",
+          "screen", "update", "install", "account", "server", "outlook", "wifi", "reset", "license", "backup"]
+
+
+def vocabulary(size, rnd):
+    """COMMON words first, then pronounceable filler; earlier words are drawn far more often"""
+    syllables = ["ka", "lo", "mi", "ter", "on", "ra", "ex", "po", "ul", "sen", "di", "ga", "vor", "ne", "tu"]
+    words = list(COMMON)
+    seen = set(words)
+    while len(words) < size:
+        w = "".join(rnd.choice(syllables) for _ in range(rnd.randint(2, 4)))
+        if w not in seen:
+            seen.add(w)
+            words.append(w)
+    return words, list(itertools.accumulate(1 / (rank + 1) for rank in range(size)))
+
+
+def seed(backend, tickets, users, vocab_size, batch=20000):
+    backend.execute(f'''CREATE TABLE IF NOT EXISTS tickets(
+        id {backend.int_pk}, title TEXT NOT NULL, description TEXT NOT NULL,
+        status TEXT DEFAULT 'Open', priority TEXT DEFAULT 'Normal',
+        created_at TEXT, updated_at TEXT, assigned_to INTEGER, user_id INTEGER)''')
+    # Non-admin searches are scoped to the caller's tickets, as in the API
+    backend.execute("CREATE INDEX IF NOT EXISTS ix_tickets_user_status_priority_id ON tickets(user_id, status, priority, id)")
+    rnd = random.Random(42)
+    words, cum_weights = vocabulary(vocab_size, rnd)
+    if backend.execute("SELECT COUNT(*) FROM tickets").fetchone()[0] >= tickets:
+        return words
+    ts = "2026-01-01 00:00:00"
+    for start in range(1, tickets + 1, batch):
+        ids = range(start, min(start + batch, tickets + 1))
+        rows = []
+        for i in ids:
+            title = " ".join(rnd.choices(words, cum_weights=cum_weights, k=rnd.randint(3, 8))).capitalize()
+            description = " ".join(rnd.choices(words, cum_weights=cum_weights, k=rnd.randint(15, 60)))
+            rows.append((i, title, description, rnd.choice(("Open", "Closed", "Closed")), "Normal", ts, ts, None,
+                         rnd.randint(1, users)))
+        backend.insert_many("tickets", ["id", "title", "description", "status", "priority", "created_at",
+                                        "updated_at", "assigned_to", "user_id"], rows)
+        backend.conn.commit()
+        print(f"  seeded {ids[-1]:,} tickets", end="\r", flush=True)
+    print()
+    return words
+
+
+def build_index(backend):
+    t0 = time.perf_counter()
+    if backend.name == "sqlite":
+        search.init_sqlite(backend.conn.cursor())
+    else:
+        for stmt in search.POSTGRES_DDL:
+            backend.execute(stmt)
+    backend.analyze()
+    return time.perf_counter() - t0
+
+
+def cases(words, users):
+    """(label, search words, user_id) covering frequent, rare, prefix and multi-word searches"""
+    uid = random.randint(1, users)
+    rare = random.choice(words[len(words) // 2:])
+    return [
+        ("common word", [words[0]], None),
+        ("mid-frequency word", [words[200]], None),
+        ("rare word", [rare], None),
+        ("prefix (3 chars)", [words[30][:3]], None),
+        ("two words", [words[1], words[5]], None),
+        ("common word, own tickets", [words[0]], uid),
+        ("mid-frequency, own tickets", [words[200]], uid),
+    ]
+
+
+def like_query(terms, uid):
+    where = " AND ".join("(t.title LIKE ? OR t.description LIKE ?)" for _ in terms)
+    params = [p for w in terms for p in (f"%{w}%", f"%{w}%")]
+    if uid is not None:
+        where += " AND t.user_id=?"
+        params.append(uid)
+    return (f"SELECT {COLS} FROM tickets t WHERE {where} ORDER BY t.id DESC LIMIT 21",
+            f"SELECT COUNT(*) FROM tickets t WHERE {where}", params)
+
+
+def fts_query(backend, terms, uid):
+    user = " AND t.user_id=?" if uid is not None else ""
+    if backend.name == "sqlite":
+        match = [search.fts5_query(terms)] + ([uid] if uid is not None else [])
+        source = "tickets_fts JOIN tickets t ON t.id = tickets_fts.rowid"
+        page = (f"SELECT {COLS}, highlight(tickets_fts, 0, ?, ?), snippet(tickets_fts, 1, ?, ?, '…', 16) "
+                f"FROM {source} WHERE tickets_fts MATCH ?{user} ORDER BY bm25(tickets_fts, 10.0, 1.0), t.id DESC LIMIT 21")
+        return page, f"SELECT COUNT(*) FROM {source} WHERE tickets_fts MATCH ?{user}", \
+            [search.MARK_START, search.MARK_END] * 2 + match, match
+    q = search.tsquery(terms)
+    match = [q] + ([uid] if uid is not None else [])
+    query = "to_tsquery('english', ?)"
+    page = (f"SELECT p.*, ts_headline('english', p.title, {query}, ?), ts_headline('english', p.description, {query}, ?) "
+            f"FROM (SELECT {COLS}, ts_rank_cd(t.search, {query}) AS rank FROM tickets t "
+            f"WHERE t.search @@ {query}{user} ORDER BY rank DESC, t.id DESC LIMIT 21) p ORDER BY p.rank DESC, p.id DESC")
+    return page, f"SELECT COUNT(*) FROM tickets t WHERE t.search @@ {query}{user}", \
+        [q, search.PG_HEADLINE_TITLE, q, search.PG_HEADLINE_SNIPPET, q] + match, match
+
+
+def timed(backend, sql, params):
+    t0 = time.perf_counter()
+    rows = backend.execute(sql, params).fetchall()
+    return (time.perf_counter() - t0) * 1000, rows
+
+
+def pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--sqlite", help="SQLite file to create/reuse")
+    target.add_argument("--postgres", help="PostgreSQL URL")
+    parser.add_argument("--tickets", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--like-runs", type=int, default=3, help="runs of the (slow) LIKE baseline")
+    args = parser.parse_args()
+
+    backend = SQLiteBackend(args.sqlite) if args.sqlite else PostgresBackend(args.postgres)
+    try:
+        words = seed(backend, args.tickets, args.users, args.vocabulary)
+        print(f"built search index in {build_index(backend):.1f}s")
+        print(f"\n== {backend.name}: {args.tickets:,} tickets ==")
+        print(f"{'search':<28}{'matches':>9}{'LIKE p50':>10}{'page p50':>10}{'page p95':>10}"
+              f"{'count p50':>11}{'count p95':>11}")
+        for label, terms, uid in cases(words, args.users):
+            like_page, like_count, like_params = like_query(terms, uid)
+            like = [timed(backend, like_page, like_params)[0] + timed(backend, like_count, like_params)[0]
+                    for _ in range(args.like_runs)]
+            page_sql, count_sql, page_params, count_params = fts_query(backend, terms, uid)
+            page, count = [], []
+            for _ in range(args.runs):
+                page.append(timed(backend, page_sql, page_params)[0])
+                elapsed, rows = timed(backend, count_sql, count_params)
+                count.append(elapsed)
+            print(f"{label:<28}{rows[0][0]:>9,}{statistics.median(like):>10.1f}{statistics.median(page):>10.1f}"
+                  f"{pct(page, 0.95):>10.1f}{statistics.median(count):>11.1f}{pct(count, 0.95):>11.1f}")
+        print("\nLIKE = first page + count by substring scan; page/count = the FTS queries the API runs (ms)")
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Load test for the ticket endpoints, to compare the WSGI and ASGI deployments
+
+Logs in (registering the user if needed), seeds a few tickets, then runs a
+closed loop of N concurrent clients for --duration seconds per concurrency
+level against a mix of ticket list / ticket read / ticket create requests and
+prints throughput, latency percentiles and error counts.
+
+    # sync workers (the ticket CRUD routes live in app.py; app_production has none)
+    gunicorn -b 127.0.0.1:8080 -w 4 app:app
+    # async entry point, same worker count
+    RATELIMIT_ENABLED=false gunicorn -k uvicorn.workers.UvicornWorker -b 127.0.0.1:8081 -w 4 app_async:app
+
+    python scripts/load_ticket_api.py --url http://127.0.0.1:8080 --concurrency 1,16,64,256
+    python scripts/load_ticket_api.py --url http://127.0.0.1:8081 --concurrency 1,16,64,256
+
+Requires httpx (pip install httpx). Each client keeps its own connection and
+shares the session cookie of one of --users accounts (loadtest, loadtest2, ...);
+on a fresh database the first one registered is the admin, so its clients list
+every ticket while the others see only their own. Spreading writes over several
+owners shows contention on rows every ticket write touches. Point it at a
+throwaway database: it creates tickets.
+Turn off the production rate limits (RATELIMIT_ENABLED=false) for the run.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+
+async def login(client, username, password):
+    # Production enforces CSRF on POSTs; app.py has no /api/csrf and no CSRF
+    r = await client.get("/api/csrf")
+    if r.status_code == 200:
+        client.headers["X-CSRFToken"] = r.json()["csrf_token"]
+    await client.post("/api/register", json={"username": username, "password": password})
+    r = await client.post("/api/login", json={"username": username, "password": password})
+    r.raise_for_status()
+
+
+async def seed(client, count):
+    ids = []
+    for i in range(count):
+        r = await client.post("/api/tickets", json={"title": f"Load test {i}", "description": "seeded by load_ticket_api"})
+        r.raise_for_status()
+        ids.append(r.json()["id"])
+    return ids
+
+
+def pick_request(mix, ticket_ids):
+    kind = random.choices(list(mix), weights=list(mix.values()))[0]
+    if kind == "list":
+        return kind, "GET", "/api/tickets?size=20", None
+    if kind == "get":
+        return kind, "GET", f"/api/tickets/{random.choice(ticket_ids)}", None
+    return kind, "POST", "/api/tickets", {"title": "Load test", "description": "created under load"}
+
+
+async def worker(base_url, session, mix, deadline, results):
+    cookies, headers, ticket_ids = session
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, headers=headers, timeout=30) as client:
+        while time.perf_counter() < deadline:
+            kind, method, path, body = pick_request(mix, ticket_ids)
+            start = time.perf_counter()
+            try:
+                r = await client.request(method, path, json=body)
+                ok = r.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            results.append((kind, time.perf_counter() - start, ok))
+
+
+async def run_level(args, sessions, mix, concurrency):
+    results = []
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*[worker(args.url, sessions[i % len(sessions)], mix, deadline, results)
+                           for i in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def pct(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else float("nan")
+
+
+def report(concurrency, results, elapsed):
+    print(f"\nconcurrency {concurrency}: {len(results)} requests in {elapsed:.1f}s "
+          f"= {len(results) / elapsed:.1f} req/s, errors {sum(1 for r in results if not r[2])}")
+    print(f"  {'endpoint':<8} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for kind in ("list", "get", "create", "all"):
+        lat = sorted(r[1] for r in results if kind == "all" or r[0] == kind)
+        if not lat:
+            continue
+        print(f"  {kind:<8} {len(lat):>7} {pct(lat, 0.5):>8.1f} {pct(lat, 0.95):>8.1f} "
+              f"{pct(lat, 0.99):>8.1f} {statistics.fmean(lat) * 1000:>8.1f}")
+
+
+async def main_async(args):
+    mix = dict(zip(("list", "get", "create"), (float(x) for x in args.mix.split(","))))
+    sessions = []
+    for i in range(args.users):
+        async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+            await login(client, args.username if i == 0 else f"{args.username}{i + 1}", args.password)
+            ticket_ids = await seed(client, args.seed)
+            sessions.append((dict(client.cookies), dict(client.headers), ticket_ids))
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        results, elapsed = await run_level(args, sessions, mix, concurrency)
+        report(concurrency, results, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--username", default="loadtest")
+    parser.add_argument("--password", default="loadtest-pw")
+    parser.add_argument("--concurrency", default="1,16,64", help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=15, help="seconds per concurrency level")
+    parser.add_argument("--mix", default="6,3,1", help="weights for list,get,create")
+    parser.add_argument("--seed", type=int, default=50, help="tickets each user creates before the run")
+    parser.add_argument("--users", type=int, default=1, help="accounts the clients are spread over")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
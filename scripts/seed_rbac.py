@@ -8,10 +8,10 @@ import sys
 import getpass
 from werkzeug.security import generate_password_hash
 
-# Add the current directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add the server directory to Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server"))
 
-from server.app_production import get_db_connection, DATABASE_URL
+from app_production import get_db_connection, DATABASE_URL
 
 def create_admin_user():
     """Create an admin user interactively"""
@@ -0,0 +1,182 @@
+"""
+Async database pool for the ASGI entry point (app_async.py)
+
+asyncpg for Postgres, aiosqlite for the SQLite fallback. Queries are written
+once with ? placeholders and rewritten to $1, $2, ... for asyncpg; rows come
+back as dicts on both backends. Checkout waits are bounded by the same
+DB_POOL_TIMEOUT as the sync pool and raise db_pool.PoolTimeout.
+"""
+import os
+import re
+import itertools
+import asyncio
+from contextlib import asynccontextmanager
+
+from db_pool import PoolTimeout
+
+_PLACEHOLDER = re.compile(r"\?")
+
+
+def _pg(sql):
+    n = itertools.count(1)
+    return _PLACEHOLDER.sub(lambda m: f"${next(n)}", sql)
+
+
+def _rowcount(status):
+    # asyncpg returns the command tag, e.g. "UPDATE 3"
+    try:
+        return int(status.rsplit(" ", 1)[-1])
+    except (AttributeError, ValueError):
+        return 0
+
+
+class PostgresConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def fetch(self, sql, *args):
+        return [dict(r) for r in await self._conn.fetch(_pg(sql), *args)]
+
+    async def fetchrow(self, sql, *args):
+        row = await self._conn.fetchrow(_pg(sql), *args)
+        return dict(row) if row is not None else None
+
+    async def fetchval(self, sql, *args):
+        return await self._conn.fetchval(_pg(sql), *args)
+
+    async def execute(self, sql, *args):
+        return _rowcount(await self._conn.execute(_pg(sql), *args))
+
+    def transaction(self):
+        return self._conn.transaction()
+
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def fetch(self, sql, *args):
+        async with self._conn.execute(sql, args) as cur:
+            return [dict(r) for r in await cur.fetchall()]
+
+    async def fetchrow(self, sql, *args):
+        async with self._conn.execute(sql, args) as cur:
+            row = await cur.fetchone()
+        return dict(row) if row is not None else None
+
+    async def fetchval(self, sql, *args):
+        async with self._conn.execute(sql, args) as cur:
+            row = await cur.fetchone()
+        return row[0] if row is not None else None
+
+    async def execute(self, sql, *args):
+        async with self._conn.execute(sql, args) as cur:
+            return cur.rowcount
+
+    @asynccontextmanager
+    async def transaction(self):
+        try:
+            yield
+        except BaseException:
+            await self._conn.rollback()
+            raise
+        await self._conn.commit()
+
+
+class AsyncDatabase:
+    """Per-process async pool; open() and close() run in the ASGI lifespan"""
+
+    def __init__(self, url, min_size=1, max_size=10, timeout=5.0, sqlite_path="tickets.db"):
+        self.url = url
+        self.postgres = url.startswith("postgresql://")
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.sqlite_path = sqlite_path
+        self._pool = None
+        self._idle = None
+        self._size = 0
+        self._slots = None
+        self.timeouts = 0
+
+    async def open(self):
+        if self.postgres:
+            import asyncpg
+            self._pool = await asyncpg.create_pool(self.url, min_size=self.min_size, max_size=self.max_size)
+        else:
+            self._idle = asyncio.LifoQueue()
+            self._slots = asyncio.Semaphore(self.max_size)
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+        while self._idle is not None and not self._idle.empty():
+            await self._idle.get_nowait().close()
+            self._size -= 1
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.postgres:
+            try:
+                conn = await self._pool.acquire(timeout=self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise PoolTimeout(f"no connection available within {self.timeout}s")
+            try:
+                yield PostgresConnection(conn)
+            finally:
+                await self._pool.release(conn)
+            return
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise PoolTimeout(f"no connection available within {self.timeout}s")
+        try:
+            conn = await self._checkout_sqlite()
+            try:
+                yield SQLiteConnection(conn)
+            finally:
+                await self._checkin_sqlite(conn)
+        finally:
+            self._slots.release()
+
+    async def _checkout_sqlite(self):
+        if not self._idle.empty():
+            return self._idle.get_nowait()
+        import aiosqlite
+        conn = await aiosqlite.connect(self.sqlite_path)
+        conn.row_factory = aiosqlite.Row
+        self._size += 1
+        return conn
+
+    async def _checkin_sqlite(self, conn):
+        """Return a connection; uncommitted work is rolled back"""
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+            self._idle.put_nowait(conn)
+        except Exception:
+            self._size -= 1
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        if self.postgres and self._pool is not None:
+            return {"backend": "asyncpg", "size": self._pool.get_size(), "idle": self._pool.get_idle_size(),
+                    "min_size": self.min_size, "max_size": self.max_size, "timeouts": self.timeouts}
+        return {"backend": "aiosqlite", "size": self._size, "idle": self._idle.qsize() if self._idle else 0,
+                "min_size": self.min_size, "max_size": self.max_size, "timeouts": self.timeouts}
+
+
+def database_from_env(url, prefix="DB_POOL_"):
+    return AsyncDatabase(
+        url,
+        min_size=int(os.getenv(prefix + "MIN_SIZE", "1")),
+        max_size=int(os.getenv(prefix + "MAX_SIZE", "10")),
+        timeout=float(os.getenv(prefix + "TIMEOUT", "5")),
+    )
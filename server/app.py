@@ -1,27 +1,47 @@
+import io
 import os
 import sqlite3
-import secrets
 import mimetypes
 from datetime import datetime, timedelta
 from functools import wraps
 
-from flask import Flask, request, jsonify, session, send_from_directory
+from flask import Flask, request, jsonify, session, send_from_directory, g
 from flask_cors import CORS
-from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
-from werkzeug.security import generate_password_hash, check_password_hash
+from itsdangerous import URLSafeSerializer, URLSafeTimedSerializer, BadSignature, SignatureExpired
 from werkzeug.utils import secure_filename
 
+import audit
+import audit_log
+import blobstore
+import bulk
+import counters
+import db_pool
+import events
+import hashing
+import http_cache
+import search
+import sessions
+import storage
+import ticket_io
+from cache import TTLCache
+
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-change-me")
 app.permanent_session_lifetime = timedelta(minutes=30)
 CORS(app, supports_credentials=True)
 
 app.config['UPLOAD_FOLDER'] = os.path.abspath('./uploads')
-app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10 MB
+# Uploads stream to disk chunk by chunk, so the limit no longer bounds worker memory
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("MAX_CONTENT_LENGTH", 512 * 1024 * 1024))
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+storage.init_app(app, lambda: storage.LocalSink(app.config['UPLOAD_FOLDER']))
+
+DB_PATH = "tickets.db"
+pool = db_pool.pool_from_env(lambda: sqlite3.connect(DB_PATH, check_same_thread=False))
+db_pool.init_app(app, pool)
 
 def db():
-    return sqlite3.connect("tickets.db")
+    return db_pool.request_connection(pool)
 
 def init_db():
     conn = db(); c = conn.cursor()
@@ -61,8 +81,42 @@ def init_db():
         mime TEXT,
         size INTEGER,
         uploaded_at TEXT,
-        uploader_id INTEGER
+        uploader_id INTEGER,
+        sha256 TEXT
     )''')
+    if "sha256" not in [r[1] for r in c.execute("PRAGMA table_info(attachments)")]:
+        c.execute("ALTER TABLE attachments ADD COLUMN sha256 TEXT")
+    c.execute('''CREATE TABLE IF NOT EXISTS blobs(
+        sha256 TEXT PRIMARY KEY,
+        size INTEGER,
+        stored_path TEXT,
+        refcount INTEGER DEFAULT 0,
+        created_at TEXT
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS user_sessions(
+        sid TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        username TEXT,
+        role TEXT,
+        expires_at TEXT
+    )''')
+    # Keep in sync with migrations/versions/002_listing_indexes.py
+    for stmt in (
+        "CREATE INDEX IF NOT EXISTS ix_tickets_user_status_priority_id ON tickets(user_id, status, priority, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tickets_user_priority_id ON tickets(user_id, priority, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tickets_status_priority_id ON tickets(status, priority, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tickets_priority_id ON tickets(priority, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tickets_assigned_status_id ON tickets(assigned_to, status, id)",
+        "CREATE INDEX IF NOT EXISTS ix_attachments_ticket_id ON attachments(ticket_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_audit_log_entity ON audit_log(entity, entity_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_attachments_stored_path ON attachments(stored_path)",
+        "CREATE INDEX IF NOT EXISTS ix_user_sessions_user_id ON user_sessions(user_id)",
+    ):
+        c.execute(stmt)
+    search.init_sqlite(c)
+    counters.init(c)
+    http_cache.init(c)
+    audit_log.init(c)
     conn.commit(); conn.close()
 
 def row_to_user(row):
@@ -75,21 +129,76 @@ def row_to_ticket(row):
             "priority": row[4], "created_at": row[5], "updated_at": row[6],
             "assigned_to": row[7], "user_id": row[8]}
 
+# Cross-request user records; off by default since other workers keep their own copy
+user_cache = TTLCache(maxsize=4096, ttl=float(os.getenv("USER_CACHE_TTL", "0")))
+
+# SESSION_BACKEND=db keeps {id, username, role} in user_sessions so auth checks skip the users table
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "cookie")
+session_store = sessions.DBSessionStore(db, app.permanent_session_lifetime) if SESSION_BACKEND == "db" else None
+
 def get_current_user():
     if "user_id" not in session: return None
-    conn = db(); c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE id=?", (session["user_id"],))
-    u = row_to_user(c.fetchone()); conn.close(); return u
+    if "current_user" in g: return g.current_user
+    if session_store and "sid" in session:
+        g.current_user = session_store.get(session["sid"])
+        return g.current_user
+    uid = session["user_id"]
+    u = user_cache.get(uid)
+    if u is None:
+        conn = db(); c = conn.cursor()
+        c.execute("SELECT * FROM users WHERE id=?", (uid,))
+        u = row_to_user(c.fetchone()); conn.close()
+        if u: user_cache.set(uid, u)
+    g.current_user = u
+    return u
+
+def invalidate_user(user_id, role=None):
+    # A role change is pushed into the user's sessions; anything else (password reset) revokes them
+    user_cache.invalidate(user_id)
+    if session_store:
+        if role: session_store.update_user(user_id, role=role)
+        else: session_store.revoke_user(user_id)
+    if g.get("current_user") and g.current_user["id"] == user_id:
+        g.pop("current_user")
 
 def json_error(msg, code=400):
     return jsonify({"error": msg}), code
 
+@app.errorhandler(db_pool.PoolTimeout)
+def handle_pool_timeout(e):
+    return json_error("db_unavailable", 503)
+
+# Password hashing runs on a bounded pool (PASSWORD_HASH_WORKERS; inline by default)
+passwords = hashing.hasher_from_env()
+
+@app.errorhandler(hashing.HashingBusy)
+def handle_hashing_busy(e):
+    return json_error("busy", 503)
+
+# AUDIT_MODE=transaction (default) inserts on the request's connection, so the row commits
+# together with the change it describes; call log_action before conn.commit().
+# AUDIT_MODE=async hands the row to a background writer that batches inserts.
+AUDIT_MODE = os.getenv("AUDIT_MODE", "transaction")
+audit_writer = audit.writer_from_env(pool) if AUDIT_MODE == "async" else None
+
 def log_action(actor_id, action, entity, entity_id, details=""):
-    conn = db(); c = conn.cursor()
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if audit_writer:
+        audit_writer.submit((ts, actor_id, action, entity, entity_id, details)); return
+    conn = db(); c = conn.cursor()
     c.execute("INSERT INTO audit_log(ts,actor_id,action,entity,entity_id,details) VALUES(?,?,?,?,?,?)",
               (ts, actor_id, action, entity, entity_id, details))
-    conn.commit(); conn.close()
+    conn.close()
+
+def log_actions(events):
+    # Many (ts, actor_id, action, entity, entity_id, details) rows in a few multi-row INSERTs
+    if audit_writer:
+        for event in events: audit_writer.submit(event)
+        return
+    conn = db(); c = conn.cursor()
+    for chunk, params in audit.chunks(events):
+        c.execute(audit.insert_sql(len(chunk)), params)
+    conn.close()
 
 def signer():
     return URLSafeTimedSerializer(app.secret_key, salt="pwd-reset")
@@ -129,7 +238,7 @@ def api_register():
     conn = db(); c = conn.cursor()
     try:
         c.execute("INSERT INTO users(username,password) VALUES(?,?)",
-                  (username, generate_password_hash(password)))
+                  (username, passwords.hash(password)))
         conn.commit()
         return jsonify({"ok": True}), 201
     except sqlite3.IntegrityError:
@@ -145,15 +254,24 @@ def api_login():
     conn = db(); c = conn.cursor()
     c.execute("SELECT * FROM users WHERE username=?", (username,))
     user = row_to_user(c.fetchone()); conn.close()
-    if user and check_password_hash(user["password"], password):
+    if user and passwords.verify(user["password"], password):
+        new_hash = passwords.rehash(user["password"], password)
+        if new_hash:
+            conn = db(); conn.execute("UPDATE users SET password=? WHERE id=?", (new_hash, user["id"]))
+            conn.commit(); conn.close()
         session.permanent = True
         session["user_id"] = user["id"]
+        session.pop("sid", None)
+        if session_store: session["sid"] = session_store.create(user)
         return jsonify({"ok": True, "user": {"id": user["id"], "username": user["username"], "role": user["role"]}})
     return json_error("invalid_credentials", 401)
 
 @app.post("/api/logout")
 def api_logout():
+    sid = session.pop("sid", None)
+    if session_store and sid: session_store.delete(sid)
     session.pop("user_id", None)
+    g.pop("current_user", None)
     return jsonify({"ok": True})
 
 @app.get("/api/me")
@@ -182,44 +300,143 @@ def api_users_role(user_id):
     c.execute("UPDATE users SET role=? WHERE id=?", (role, user_id))
     if c.rowcount == 0:
         conn.close(); return json_error("not_found", 404)
-    conn.commit(); conn.close()
     log_action(get_current_user()["id"], "set_role", "user", user_id, role)
+    conn.commit(); conn.close()
+    invalidate_user(user_id, role=role)
     return jsonify({"ok": True})
 
+def cursor_signer():
+    return URLSafeSerializer(app.secret_key, salt="tickets-cursor")
+
+# Short-lived per-filter totals for count=approx
+ticket_count_cache = TTLCache(maxsize=1024, ttl=float(os.getenv("TICKET_COUNT_CACHE_TTL", "30")))
+
+# Ticket reads carry ETags from ticket_versions; RESPONSE_CACHE_TTL>0 also keeps list bodies
+response_cache = http_cache.cache_from_env()
+
+def not_modified(tag):
+    return "", 304, {"ETag": tag, "Cache-Control": http_cache.CACHE_CONTROL}
+
+def tagged(resp, tag):
+    resp.headers["ETag"] = tag
+    resp.headers["Cache-Control"] = http_cache.CACHE_CONTROL
+    return resp
+
+# Live ticket changes for GET /api/events, published after each commit. This process only;
+# app_async relays them between workers through Postgres NOTIFY or Redis (EVENTS_BACKEND).
+hub = events.hub_from_env()
+SSE_MAX_SECONDS = float(os.getenv("SSE_MAX_SECONDS", "300"))
+
+def publish(kind, ticket):
+    hub.dispatch(events.make_event(kind, ticket, get_current_user()["id"]))
+
+# Offset mode (page/size) by default. after_id, or the opaque cursor from a previous
+# response, switches to keyset mode which seeks on the primary key instead of skipping
+# rows. count=exact|approx|none; exact by default in offset mode, none in keyset mode.
+# q= searches title/description (FTS5, prefix match per word); offset-mode results are
+# ranked by bm25 with title matches weighted higher and carry highlighted fragments.
 @app.get("/api/tickets")
 @login_required_json
 def api_list_tickets():
     u = get_current_user()
     status = (request.args.get("status") or "").strip()
     priority = (request.args.get("priority") or "").strip()
+    words = search.terms(request.args.get("q"))
     page = max(int(request.args.get("page", 1)), 1)
     size = min(max(int(request.args.get("size", 20)), 1), 100)
     offset = (page - 1) * size
 
-    base = "SELECT id,title,description,status,priority,created_at,updated_at,assigned_to,user_id FROM tickets"
-    where, params = [], []
+    after_id = request.args.get("after_id", type=int)
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            after_id = int(cursor_signer().loads(cursor))
+        except (BadSignature, ValueError, TypeError):
+            return json_error("bad_cursor", 400)
+    keyset = after_id is not None
+    count_mode = request.args.get("count", "none" if keyset else "exact")
+    if count_mode not in ("exact", "approx", "none"):
+        return json_error("bad_count", 400)
+
+    # Revalidation costs one lookup: the ETag only changes when a ticket in the caller's scope does
+    conn = db(); c = conn.cursor()
+    scope = http_cache.list_scope(u, is_admin_or_tech())
+    c.execute(*http_cache.version_query(scope))
+    version = c.fetchone()
+    tag = http_cache.etag("tickets", scope, (version[0] if version else 0) or 0, sorted(request.args.items(multi=True)))
+    if http_cache.matches(request.headers.get("If-None-Match"), tag):
+        conn.close(); return not_modified(tag)
+    body = response_cache.get(tag)
+    if body is not None:
+        conn.close(); return tagged(app.response_class(body, mimetype="application/json"), tag)
+
+    cols = "t.id,t.title,t.description,t.status,t.priority,t.created_at,t.updated_at,t.assigned_to,t.user_id"
+    where, params, select_params = [], [], []
+    if words:
+        source = "tickets_fts JOIN tickets t ON t.id = tickets_fts.rowid"
+        cols += ", highlight(tickets_fts, 0, ?, ?), snippet(tickets_fts, 1, ?, ?, '…', 16)"
+        select_params = [search.MARK_START, search.MARK_END] * 2
+        where.append("tickets_fts MATCH ?"); params.append(search.fts5_query(words))
+    else:
+        source = "tickets t"
 
     if not is_admin_or_tech():
-        where.append("user_id=?"); params.append(u["id"])
+        where.append("t.user_id=?"); params.append(u["id"])
     if status and status in ("Open","Closed"):
-        where.append("status=?"); params.append(status)
+        where.append("t.status=?"); params.append(status)
     if priority and priority in ("Low","Normal","High"):
-        where.append("priority=?"); params.append(priority)
+        where.append("t.priority=?"); params.append(priority)
 
     where_sql = (" WHERE " + " AND ".join(where)) if where else ""
-    order = " ORDER BY id DESC"
-    limit = " LIMIT ? OFFSET ?"
     params_count = tuple(params)
-    params += [size, offset]
-
+    if keyset:
+        page_sql = (" AND " if where else " WHERE ") + "t.id<? ORDER BY t.id DESC LIMIT ?"
+        params += [after_id, size + 1]
+    else:
+        order = "bm25(tickets_fts, 10.0, 1.0), t.id DESC" if words else "t.id DESC"
+        page_sql = f" ORDER BY {order} LIMIT ? OFFSET ?"
+        params += [size + 1, offset]
+
+    total = None
+    if count_mode == "approx":
+        total = ticket_count_cache.get((where_sql, params_count))
+    if count_mode == "exact" or (count_mode == "approx" and total is None):
+        c.execute(f"SELECT COUNT(*) FROM {source}{where_sql}", params_count)
+        total = c.fetchone()[0]
+        ticket_count_cache.set((where_sql, params_count), total)
+
+    c.execute(f"SELECT {cols} FROM {source}" + where_sql + page_sql, tuple(select_params + params))
+    rows = []
+    for r in c.fetchall():
+        t = row_to_ticket(r)
+        if words: t["highlight"] = {"title": search.mark(r[9]), "description": search.mark(r[10])}
+        rows.append(t)
+    conn.close()
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        # Ranked search pages are not in id order, so they page with page= instead of a cursor
+        if keyset or not words:
+            next_cursor = cursor_signer().dumps(rows[-1]["id"])
+    resp = jsonify({"items": rows, "page": page, "size": size, "total": total,
+                    "next_cursor": next_cursor})
+    response_cache.set(tag, resp.get_data())
+    return tagged(resp, tag)
+
+@app.get("/api/tickets/stats")
+@login_required_json
+def api_ticket_stats():
+    # Read from ticket_counts (maintained by triggers), never from tickets
+    u = get_current_user()
+    owner = request.args.get("user_id", type=int) if is_admin_or_tech() else u["id"]
     conn = db(); c = conn.cursor()
-    c.execute(f"SELECT COUNT(*) FROM tickets{where_sql}", params_count)
-    total = c.fetchone()[0]
-
-    c.execute(base + where_sql + order + limit, tuple(params))
-    rows = [row_to_ticket(r) for r in c.fetchall()]
+    c.execute(counters.SELECT_SCOPE, ("owner", str(owner)) if owner else ("all", ""))
+    stats = counters.summarize(c.fetchall())
+    if is_admin_or_tech():
+        c.execute(counters.SELECT_ASSIGNEES)
+        stats["by_assignee"] = counters.assignees(c.fetchall())
     conn.close()
-    return jsonify({"items": rows, "page": page, "size": size, "total": total})
+    return jsonify(stats)
 
 @app.post("/api/tickets")
 @login_required_json
@@ -238,12 +455,13 @@ def api_create_ticket():
     conn = db(); c = conn.cursor()
     c.execute('INSERT INTO tickets(title,description,priority,created_at,updated_at,user_id) VALUES(?,?,?,?,?,?)',
               (title, description, priority, now, now, u["id"]))
-    conn.commit()
     ticket_id = c.lastrowid
+    log_action(u["id"], "create", "ticket", ticket_id, f"title={title}")
+    conn.commit()
     c.execute('SELECT id,title,description,status,priority,created_at,updated_at,assigned_to,user_id FROM tickets WHERE id=?', (ticket_id,))
     created = row_to_ticket(c.fetchone())
     conn.close()
-    log_action(u["id"], "create", "ticket", ticket_id, f"title={title}")
+    publish("created", created)
     return jsonify(created), 201
 
 @app.get("/api/tickets/<int:ticket_id>")
@@ -251,13 +469,21 @@ def api_create_ticket():
 def api_get_ticket(ticket_id):
     u = get_current_user()
     conn = db(); c = conn.cursor()
-    c.execute('SELECT id,title,description,status,priority,created_at,updated_at,assigned_to,user_id FROM tickets WHERE id=?', (ticket_id,))
-    t = row_to_ticket(c.fetchone())
+    c.execute('SELECT t.id,t.title,t.description,t.status,t.priority,t.created_at,t.updated_at,t.assigned_to,t.user_id,v.version '
+              f'FROM tickets t LEFT JOIN ticket_versions v ON v.scope = {http_cache.owner_scope_sql("t")} WHERE t.id=?', (ticket_id,))
+    row = c.fetchone()
     conn.close()
-    if not t: return json_error("not_found", 404)
+    if not row: return json_error("not_found", 404)
+    t = row_to_ticket(row)
     if not is_admin_or_tech() and t["user_id"] != u["id"]:
         return json_error("forbidden", 403)
-    return jsonify(t)
+    tag = http_cache.etag("ticket", ticket_id, row[9] or 0)
+    if http_cache.matches(request.headers.get("If-None-Match"), tag):
+        return not_modified(tag)
+    return tagged(jsonify(t), tag)
+
+# Fields whose old/new values PUT /api/tickets/<id> records in the audit log
+TRACKED_FIELDS = ("title", "description", "status", "priority")
 
 @app.put("/api/tickets/<int:ticket_id>")
 @login_required_json
@@ -285,10 +511,12 @@ def api_update_ticket(ticket_id):
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     c.execute('UPDATE tickets SET title=?, description=?, priority=?, status=?, updated_at=? WHERE id=?',
               (title, description, priority, status, now, ticket_id))
+    log_action(u["id"], "update", "ticket", ticket_id, audit_log.changes(
+        t, {"title": title, "description": description, "priority": priority, "status": status}, TRACKED_FIELDS))
     conn.commit()
     c.execute('SELECT id,title,description,status,priority,created_at,updated_at,assigned_to,user_id FROM tickets WHERE id=?', (ticket_id,))
     updated = row_to_ticket(c.fetchone()); conn.close()
-    log_action(u["id"], "update", "ticket", ticket_id, "")
+    publish("closed" if status == "Closed" and t["status"] != "Closed" else "updated", updated)
     return jsonify(updated)
 
 @app.delete("/api/tickets/<int:ticket_id>")
@@ -296,16 +524,17 @@ def api_update_ticket(ticket_id):
 def api_delete_ticket(ticket_id):
     u = get_current_user()
     conn = db(); c = conn.cursor()
-    c.execute('SELECT user_id FROM tickets WHERE id=?', (ticket_id,))
-    row = c.fetchone()
-    if not row:
+    c.execute('SELECT id,title,description,status,priority,created_at,updated_at,assigned_to,user_id FROM tickets WHERE id=?', (ticket_id,))
+    t = row_to_ticket(c.fetchone())
+    if not t:
         conn.close(); return json_error("not_found", 404)
-    owner_id = row[0]
-    if not is_admin_or_tech() and owner_id != u["id"]:
+    if not is_admin_or_tech() and t["user_id"] != u["id"]:
         conn.close(); return json_error("forbidden", 403)
+    blobstore.release(conn, ticket_id)
     c.execute('DELETE FROM tickets WHERE id=?', (ticket_id,))
-    conn.commit(); conn.close()
     log_action(u["id"], "delete", "ticket", ticket_id, "")
+    conn.commit(); conn.close()
+    publish("deleted", t)
     return jsonify({"ok": True})
 
 @app.put("/api/tickets/<int:ticket_id>/assign")
@@ -317,10 +546,15 @@ def api_assign(ticket_id):
     if not user_id: return json_error("missing_user_id", 400)
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     conn = db(); c = conn.cursor()
+    c.execute('SELECT assigned_to FROM tickets WHERE id=?', (ticket_id,))
+    row = c.fetchone()
+    if not row: conn.close(); return json_error("not_found", 404)
     c.execute('UPDATE tickets SET assigned_to=?, updated_at=? WHERE id=?', (user_id, now, ticket_id))
-    if c.rowcount == 0: conn.close(); return json_error("not_found", 404)
-    conn.commit(); conn.close()
-    log_action(get_current_user()["id"], "assign", "ticket", ticket_id, f"to={user_id}")
+    log_action(get_current_user()["id"], "assign", "ticket", ticket_id,
+               audit_log.changes({"assigned_to": row[0]}, {"assigned_to": user_id}, ("assigned_to",)))
+    conn.commit()
+    c.execute('SELECT id,title,description,status,priority,created_at,updated_at,assigned_to,user_id FROM tickets WHERE id=?', (ticket_id,))
+    publish("assigned", row_to_ticket(c.fetchone())); conn.close()
     return jsonify({"ok": True})
 
 @app.put("/api/tickets/<int:ticket_id>/close")
@@ -329,12 +563,135 @@ def api_close(ticket_id):
     if not is_admin_or_tech(): return json_error("forbidden", 403)
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     conn = db(); c = conn.cursor()
+    c.execute('SELECT status FROM tickets WHERE id=?', (ticket_id,))
+    row = c.fetchone()
+    if not row: conn.close(); return json_error("not_found", 404)
     c.execute('UPDATE tickets SET status="Closed", updated_at=? WHERE id=?', (now, ticket_id))
-    if c.rowcount == 0: conn.close(); return json_error("not_found", 404)
-    conn.commit(); conn.close()
-    log_action(get_current_user()["id"], "close", "ticket", ticket_id, "")
+    log_action(get_current_user()["id"], "close", "ticket", ticket_id,
+               audit_log.changes({"status": row[0]}, {"status": "Closed"}, ("status",)))
+    conn.commit()
+    c.execute('SELECT id,title,description,status,priority,created_at,updated_at,assigned_to,user_id FROM tickets WHERE id=?', (ticket_id,))
+    publish("closed", row_to_ticket(c.fetchone())); conn.close()
     return jsonify({"ok": True})
 
+# One ticket's audit trail, newest first and keyset-paged like /api/audit. Served from the
+# (entity, entity_id, id) index of each audit_log table, so the cost doesn't grow with the
+# log; update/assign/close/bulk rows carry {field: [old, new]} as `changes`.
+@app.get("/api/tickets/<int:ticket_id>/history")
+@login_required_json
+def api_ticket_history(ticket_id):
+    u = get_current_user()
+    try:
+        size = min(max(int(request.args.get("size", 50)), 1), 100)
+    except ValueError:
+        return json_error("bad_paging", 400)
+    before_id = None
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            before_id = int(audit_cursor_signer().loads(cursor))
+        except (BadSignature, ValueError, TypeError):
+            return json_error("bad_cursor", 400)
+    conn = db(); c = conn.cursor()
+    c.execute('SELECT user_id FROM tickets WHERE id=?', (ticket_id,))
+    row = c.fetchone()
+    # Admins and techs can still read the history of a deleted ticket
+    if not is_admin_or_tech():
+        if not row: conn.close(); return json_error("not_found", 404)
+        if row[0] != u["id"]: conn.close(); return json_error("forbidden", 403)
+    items = audit_log.fetch_page(conn, {"entity": "ticket", "entity_id": ticket_id}, before_id, size + 1)
+    conn.close()
+    if not row and not items: return json_error("not_found", 404)
+    next_cursor = audit_cursor_signer().dumps(items[size - 1]["id"]) if len(items) > size else None
+    return jsonify({"items": [audit_log.timeline_entry(i) for i in items[:size]], "size": size, "next_cursor": next_cursor})
+
+# Close/reopen/assign/reprioritize up to bulk.MAX_IDS tickets in one transaction: one SELECT
+# for permissions, one UPDATE ... WHERE id IN (...), batched audit rows. Per-id results.
+@app.post("/api/tickets/bulk")
+@login_required_json
+def api_bulk_tickets():
+    u = get_current_user()
+    try:
+        op, ids, value = bulk.parse(request.get_json(force=True))
+    except bulk.BulkError as e:
+        return json_error(str(e), 400)
+    conn = db(); c = conn.cursor()
+    if op == "assign":
+        if not is_admin_or_tech():
+            conn.close(); return json_error("forbidden", 403)
+        c.execute('SELECT 1 FROM users WHERE id=?', (value,))
+        if not c.fetchone():
+            conn.close(); return json_error("unknown_user", 400)
+    c.execute(bulk.select_sql(op, ids), ids)
+    rows = c.fetchall()
+    change, results = bulk.plan(op, ids, value, rows, u, is_admin_or_tech())
+    before = {r[0]: r[2] for r in rows}
+    changed = []
+    if change:
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        c.execute(bulk.update_sql(op, change, "id,title,description,status,priority,created_at,updated_at,assigned_to,user_id"),
+                  [value, now] + change)
+        changed = [row_to_ticket(r) for r in c.fetchall()]
+        for t in changed:
+            results[t["id"]] = {"id": t["id"], "ok": True, "changed": True}
+        log_actions([(now, u["id"], bulk.OPS[op][1], "ticket", t["id"], bulk.audit_details(op, before[t["id"]], value)) for t in changed])
+        conn.commit()
+    conn.close()
+    for t in changed:
+        publish(bulk.OPS[op][2], t)
+    return jsonify(bulk.summary(op, ids, results))
+
+# Whole-table export without pagination: NDJSON (default) or CSV of the tickets the caller may
+# read, in id order, filtered by status/priority. Rows are fetched and sent in batches.
+@app.get("/api/tickets/export")
+@login_required_json
+def api_export_tickets():
+    u = get_current_user()
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ticket_io.FORMATS: return json_error("bad_format", 400)
+    owner = request.args.get("user_id", type=int) if is_admin_or_tech() else u["id"]
+    where, params = ticket_io.filters(request.args.get("status"), request.args.get("priority"), owner)
+    def generate():
+        # Own connection: the request's one goes back to the pool before the body is sent
+        conn = pool.getconn()
+        try:
+            yield from ticket_io.encode(ticket_io.export_rows(conn, False, where, params), fmt)
+        finally:
+            pool.putconn(conn)
+    return app.response_class(generate(), mimetype=ticket_io.FORMATS[fmt], headers={
+        "Content-Disposition": f'attachment; filename="tickets.{fmt}"', "X-Accel-Buffering": "no"})
+
+# Import NDJSON or CSV (export's columns) from the request body as it streams in; records
+# without user_id belong to ?owner= or the importing admin. Bad records are skipped and listed.
+@app.post("/api/tickets/import")
+@admin_required_json
+def api_import_tickets():
+    u = get_current_user()
+    fmt = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "ndjson")
+    if fmt not in ticket_io.FORMATS: return json_error("bad_format", 400)
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    try:
+        result = ticket_io.import_tickets(db(), ticket_io.read_records(stream, fmt),
+                                          owner=request.args.get("owner", type=int) or u["id"], actor_id=u["id"])
+    except UnicodeDecodeError:
+        return json_error("bad_encoding", 400)
+    if result["imported"]:
+        hub.dispatch({"type": "resync"})
+    return jsonify(result)
+
+# Server-Sent Events: one ticket.* event per change the user may see, ": ping" comments
+# while idle. The stream ends after SSE_MAX_SECONDS; EventSource reconnects with
+# Last-Event-ID, which replays what it missed (or sends "resync") and re-checks the session.
+@app.get("/api/events")
+@login_required_json
+def api_events():
+    u = get_current_user()
+    subscriber = events.ThreadSubscriber({"id": u["id"], "role": u["role"]}, hub.queue_size)
+    replay = hub.subscribe(subscriber, request.headers.get("Last-Event-ID"))
+    if replay is None: return json_error("too_many_listeners", 503)
+    return app.response_class(events.stream_lines(hub, subscriber, replay, max_age=SSE_MAX_SECONDS),
+                              mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/api/password/request")
 def api_pwd_request():
     data = request.get_json(force=True)
@@ -361,8 +718,9 @@ def api_pwd_reset():
     except BadSignature:
         return json_error("bad_token", 400)
     conn = db(); c = conn.cursor()
-    c.execute('UPDATE users SET password=? WHERE id=?', (generate_password_hash(newpw), uid))
+    c.execute('UPDATE users SET password=? WHERE id=?', (passwords.hash(newpw), uid))
     conn.commit(); conn.close()
+    invalidate_user(uid)
     return jsonify({"ok": True})
 
 @app.post("/api/tickets/<int:ticket_id>/attachments")
@@ -382,18 +740,17 @@ def api_attach(ticket_id):
     if not is_admin_or_tech() and owner_id != u["id"]:
         conn.close(); return json_error("forbidden", 403)
     safe = secure_filename(f.filename)
-    rid = secrets.token_hex(8)
-    stored = f"{rid}_{safe}"
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored)
-    f.save(filepath)
-    size = os.path.getsize(filepath)
-    mime = mimetypes.guess_type(filepath)[0] or "application/octet-stream"
+    # The body was already streamed into f.stream (a storage.LocalSink) while parsing;
+    # identical content is stored once under blobs/ and reference counted
+    stored = blobstore.store_upload(conn, f.stream)
+    size, sha256 = f.stream.size, f.stream.sha256
+    mime = mimetypes.guess_type(safe)[0] or "application/octet-stream"
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute('INSERT INTO attachments(ticket_id,filename,stored_path,mime,size,uploaded_at,uploader_id) VALUES(?,?,?,?,?,?,?)',
-              (ticket_id, safe, stored, mime, size, now, u["id"]))
-    conn.commit(); conn.close()
+    c.execute('INSERT INTO attachments(ticket_id,filename,stored_path,mime,size,uploaded_at,uploader_id,sha256) VALUES(?,?,?,?,?,?,?,?)',
+              (ticket_id, safe, stored, mime, size, now, u["id"], sha256))
     log_action(u["id"], "attach", "ticket", ticket_id, safe)
-    return jsonify({"ok": True, "filename": safe, "size": size, "mime": mime})
+    conn.commit(); conn.close()
+    return jsonify({"ok": True, "filename": safe, "size": size, "mime": mime, "sha256": sha256})
 
 @app.get("/api/tickets/<int:ticket_id>/attachments")
 @login_required_json
@@ -405,34 +762,108 @@ def api_list_attachments(ticket_id):
     if not row: conn.close(); return json_error("not_found", 404)
     if not is_admin_or_tech() and row[0] != u["id"]:
         conn.close(); return json_error("forbidden", 403)
-    c.execute('SELECT id,filename,stored_path,mime,size,uploaded_at,uploader_id FROM attachments WHERE ticket_id=? ORDER BY id DESC', (ticket_id,))
-    items = [{"id":r[0], "filename":r[1], "path":r[2], "mime":r[3], "size":r[4],
-              "uploaded_at":r[5], "uploader_id":r[6]} for r in c.fetchall()]
+    c.execute('SELECT id,filename,stored_path,mime,size,uploaded_at,uploader_id,sha256 FROM attachments WHERE ticket_id=? ORDER BY id DESC', (ticket_id,))
+    items = [{"id":r[0], "filename":r[1], "path":r[2], "url":f"/uploads/{r[0]}", "mime":r[3], "size":r[4],
+              "uploaded_at":r[5], "uploader_id":r[6], "sha256":r[7]} for r in c.fetchall()]
     conn.close()
     return jsonify(items)
 
-@app.get("/uploads/<path:name>")
+# Blobs never change, so their hash is a strong ETag and they can be cached indefinitely.
+# UPLOADS_ACCEL_PREFIX (e.g. /protected-uploads/) hands the byte transfer to an nginx
+# internal location aliasing the upload folder instead of streaming from the worker.
+UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "")
+
+def blob_cache_headers(resp, etag):
+    resp.set_etag(etag)
+    resp.cache_control.no_cache = None
+    resp.cache_control.private = True
+    resp.cache_control.max_age = 365 * 24 * 3600
+    resp.cache_control.immutable = True
+    return resp
+
+# Downloads are addressed by attachment id: deduplicated attachments share a blob but
+# each keeps its own filename and MIME type
+@app.get("/uploads/<int:attachment_id>")
 @login_required_json
-def serve_upload(name):
-    if ".." in name or name.startswith("/"):
+def serve_upload(attachment_id):
+    u = get_current_user()
+    conn = db(); c = conn.cursor()
+    c.execute('SELECT a.filename, a.mime, a.stored_path, a.sha256, t.user_id FROM attachments a '
+              'JOIN tickets t ON t.id = a.ticket_id WHERE a.id=?', (attachment_id,))
+    row = c.fetchone(); conn.close()
+    if not row: return json_error("not_found", 404)
+    filename, mime, name, etag, owner_id = row
+    if not is_admin_or_tech() and owner_id != u["id"]:
         return json_error("forbidden", 403)
-    return send_from_directory(app.config['UPLOAD_FOLDER'], name)
-
+    if etag and request.if_none_match.contains_weak(etag):
+        return blob_cache_headers(app.response_class(status=304), etag)
+    if UPLOADS_ACCEL_PREFIX:
+        resp = app.response_class(mimetype=mime)
+        resp.headers["X-Accel-Redirect"] = UPLOADS_ACCEL_PREFIX.rstrip("/") + "/" + name
+        resp.headers["Content-Disposition"] = f'inline; filename="{filename}"'
+    else:
+        # conditional=True answers Range (206), If-Range and If-Modified-Since
+        resp = send_from_directory(app.config['UPLOAD_FOLDER'], name, mimetype=mime, download_name=filename,
+                                   etag=etag or True, conditional=True)
+        resp.headers["Accept-Ranges"] = "bytes"
+    if etag:
+        blob_cache_headers(resp, etag)
+    return resp
+
+# Newest first, keyset-paged on id; filters: actor_id, action, entity, entity_id, since, until
 @app.get("/api/audit")
 @login_required_json
 def api_audit_list():
     if not is_admin_or_tech(): return json_error("forbidden", 403)
-    page = max(int(request.args.get("page", 1)), 1)
-    size = min(max(int(request.args.get("size", 20)), 1), 100)
-    offset = (page - 1) * size
-    conn = db(); c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM audit_log")
-    total = c.fetchone()[0]
-    c.execute('SELECT id,ts,actor_id,action,entity,entity_id,details FROM audit_log ORDER BY id DESC LIMIT ? OFFSET ?', (size, offset))
-    items = [{"id":r[0],"ts":r[1],"actor_id":r[2],"action":r[3],"entity":r[4],
-              "entity_id":r[5],"details":r[6]} for r in c.fetchall()]
+    try:
+        size = min(max(int(request.args.get("size", 20)), 1), 100)
+    except ValueError:
+        return json_error("bad_paging", 400)
+    try:
+        filters = audit_log.parse_filters(request.args)
+    except ValueError as e:
+        return json_error(str(e), 400)
+    before_id = None
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            before_id = int(audit_cursor_signer().loads(cursor))
+        except (BadSignature, ValueError, TypeError):
+            return json_error("bad_cursor", 400)
+    conn = db()
+    items = audit_log.fetch_page(conn, filters, before_id, size + 1)
     conn.close()
-    return jsonify({"items": items, "page": page, "size": size, "total": total})
+    next_cursor = audit_cursor_signer().dumps(items[size - 1]["id"]) if len(items) > size else None
+    return jsonify({"items": items[:size], "size": size, "next_cursor": next_cursor})
+
+def audit_cursor_signer():
+    return URLSafeSerializer(app.secret_key, salt="audit-cursor")
+
+@app.get("/api/stats/pool")
+@admin_required_json
+def api_pool_stats():
+    return jsonify(pool.stats())
+
+@app.get("/api/stats/audit")
+@admin_required_json
+def api_audit_stats():
+    if not audit_writer: return jsonify({"mode": AUDIT_MODE})
+    return jsonify(dict(audit_writer.stats(), mode=AUDIT_MODE))
+
+@app.get("/api/stats/response-cache")
+@admin_required_json
+def api_response_cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.get("/api/stats/events")
+@admin_required_json
+def api_events_stats():
+    return jsonify(hub.stats())
+
+@app.get("/api/stats/hashing")
+@admin_required_json
+def api_hashing_stats():
+    return jsonify(passwords.stats())
 
 @app.get("/")
 def root():
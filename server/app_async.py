@@ -0,0 +1,666 @@
+"""
+ASGI entry point: async ticket routes in front of the production Flask app
+
+    gunicorn -k uvicorn.workers.UvicornWorker -b 0.0.0.0:8080 -w 4 app_async:app
+
+The WSGI deployment (gunicorn app_production:app) keeps working unchanged. Under an ASGI server the
+ticket endpoints below run as coroutines on an asyncpg/aiosqlite pool, and the
+S3 check in attachments/complete uses aiobotocore, so a request waiting on the
+database or S3 suspends instead of holding a whole worker. Every other path
+falls through to app_production.app via a2wsgi's thread pool. GET /api/events
+streams ticket changes to the browser (see events.py).
+
+Both apps share the signed session cookie (including server-side sessions),
+CSRF tokens, rate limits, the user cache and audit_log. Outbound email is
+already queued in email_outbox, so no request here talks to SMTP.
+"""
+import os
+import json
+import asyncio
+import base64
+import hmac
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime, timezone
+
+import limits
+from a2wsgi import WSGIMiddleware
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
+from itsdangerous import URLSafeSerializer, URLSafeTimedSerializer, BadSignature
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import aio_db
+import audit
+import audit_log
+import blobstore
+import bulk
+import counters
+import db_pool
+import events
+import http_cache
+import search
+import sessions
+import app_production as wsgi
+from cache import TTLCache
+
+flask_app = wsgi.app
+logger = wsgi.logger
+POSTGRES = wsgi.DATABASE_URL.startswith('postgresql://')
+TICKET_COLUMNS = "id,title,description,status,priority,created_at,updated_at,assigned_to,user_id"
+TRACKED_FIELDS = ("title", "description", "status", "priority")  # old/new values recorded on update
+
+db = aio_db.database_from_env(wsgi.DATABASE_URL)
+rate_limits = [limits.parse(l) for l in wsgi.DEFAULT_RATE_LIMITS]
+ticket_count_cache = TTLCache(maxsize=1024, ttl=float(os.getenv('TICKET_COUNT_CACHE_TTL', '30')))
+response_cache = http_cache.cache_from_env()  # shared through aredis when REDIS_URL is set
+hub = events.hub_from_env()
+EVENTS_BACKEND = events.backend_from_env(POSTGRES, wsgi.REDIS_URL)
+SSE_MAX_SECONDS = float(os.getenv('SSE_MAX_SECONDS', '300'))
+s3 = None     # aiobotocore client, opened in lifespan()
+aredis = None  # redis.asyncio client for RedisSessionStore lookups, the response cache and event publishing
+
+
+class HTTPError(Exception):
+    def __init__(self, msg, code):
+        self.msg = msg
+        self.code = code
+
+
+def json_error(msg, code=400, user_id=None):
+    logger.error("API error", error=msg, code=code, user_id=user_id)
+    return JSONResponse({"error": msg}, status_code=code)
+
+
+def not_modified(tag):
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": http_cache.CACHE_CONTROL})
+
+
+def tagged(response, tag):
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = http_cache.CACHE_CONTROL
+    return response
+
+
+def _now():
+    return datetime.now() if POSTGRES else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def row_to_ticket(row):
+    if not row: return None
+    return dict(row, created_at=str(row['created_at']), updated_at=str(row['updated_at']))
+
+
+# Flask session cookie: read it, and re-sign it like Flask does for permanent sessions
+def session_serializer():
+    return flask_app.session_interface.get_signing_serializer(flask_app)
+
+
+def load_session(request):
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return {}
+    try:
+        return session_serializer().loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+def refresh_session_cookie(response, sess):
+    if not sess.get("_permanent") or not flask_app.config['SESSION_REFRESH_EACH_REQUEST']:
+        return
+    response.set_cookie(
+        flask_app.config['SESSION_COOKIE_NAME'], session_serializer().dumps(sess),
+        expires=datetime.now(timezone.utc) + flask_app.permanent_session_lifetime,
+        path=flask_app.config['SESSION_COOKIE_PATH'] or flask_app.config['APPLICATION_ROOT'],
+        domain=flask_app.config['SESSION_COOKIE_DOMAIN'] or None,
+        secure=flask_app.config['SESSION_COOKIE_SECURE'], httponly=flask_app.config['SESSION_COOKIE_HTTPONLY'],
+        samesite=flask_app.config['SESSION_COOKIE_SAMESITE'])
+
+
+def check_csrf(request, sess):
+    """Same check as Flask-WTF's CSRFProtect, against the X-CSRFToken header"""
+    if not flask_app.config.get('WTF_CSRF_ENABLED', True):
+        return
+    token = request.headers.get("X-CSRFToken") or request.headers.get("X-CSRF-Token")
+    if not token or "csrf_token" not in sess:
+        raise HTTPError("csrf_failed", 400)
+    try:
+        expected = URLSafeTimedSerializer(flask_app.secret_key, salt="wtf-csrf-token").loads(
+            token, max_age=flask_app.config.get('WTF_CSRF_TIME_LIMIT', 3600))
+    except BadSignature:
+        raise HTTPError("csrf_failed", 400)
+    if not hmac.compare_digest(sess["csrf_token"], expected):
+        raise HTTPError("csrf_failed", 400)
+
+
+async def check_rate_limit(request, endpoint):
+    """Apply DEFAULT_RATE_LIMITS through the Flask limiter's storage (Redis or memory)"""
+    if not flask_app.config.get('RATELIMIT_ENABLED', True):
+        return
+    ip = request.client.host if request.client else "127.0.0.1"
+    for item in rate_limits:
+        try:
+            allowed = await run_in_threadpool(wsgi.limiter.limiter.hit, item, ip, endpoint)
+        except Exception as e:
+            logger.warning("Rate limit storage unavailable", error=str(e))
+            return
+        if not allowed:
+            raise HTTPError("rate_limited", 429)
+
+
+async def current_user(conn, sess):
+    """Async counterpart of app_production.get_current_user"""
+    if "user_id" not in sess:
+        return None
+    store, sid = wsgi.session_store, sess.get("sid")
+    if store and sid:
+        if isinstance(store, sessions.RedisSessionStore):
+            try:
+                raw = await aredis.getex(store.key(sid), ex=store.ttl)
+                return json.loads(raw) if raw else None
+            except Exception as e:
+                logger.warning("Session store unavailable", error=str(e))
+        else:
+            row = await conn.fetchrow("SELECT user_id, username, role, expires_at FROM user_sessions WHERE sid=?", sid)
+            if not row:
+                return None
+            expires_at = store.decode_ts(row['expires_at'])
+            now = datetime.now()
+            if expires_at <= now:
+                return None
+            if expires_at - now < store.ttl / 2:
+                async with conn.transaction():
+                    await conn.execute("UPDATE user_sessions SET expires_at=? WHERE sid=?",
+                                       store.encode_ts(now + store.ttl), sid)
+            return {"id": row['user_id'], "username": row['username'], "role": row['role']}
+    uid = sess["user_id"]
+    u, generation = None, None
+    if wsgi.user_cache.enabled:
+        generation = await user_generation(uid)
+        u = wsgi.cached_user(uid, generation)
+    if u is None:
+        u = await conn.fetchrow("SELECT id, username, email, role FROM users WHERE id=?", uid)
+        if u:
+            wsgi.cache_user(uid, generation, u)
+    return u
+
+
+async def user_generation(uid):
+    """wsgi.shared_state's generation for uid, read without blocking the loop when Redis is shared"""
+    if aredis is None:
+        return wsgi.shared_state.get(wsgi.user_generation_key(uid))
+    try:
+        return await aredis.get(wsgi.user_generation_key(uid))
+    except Exception as e:
+        logger.warning("Redis unavailable, reading the user record", error=str(e))
+        # Matches no cached entry, so the users row is read
+        return object()
+
+
+def is_admin_or_tech(u):
+    return bool(u and u["role"] in ("admin", "tech"))
+
+
+async def log_action(conn, actor_id, action, entity, entity_id, details=""):
+    # Always in the caller's transaction: the background AuditWriter falls back to blocking writes
+    await conn.execute("INSERT INTO audit_log(ts,actor_id,action,entity,entity_id,details) VALUES(?,?,?,?,?,?)",
+                       _now(), actor_id, action, entity, entity_id, details)
+
+
+async def publish(conn, kind, tickets, actor_id):
+    """Announce committed ticket changes to every process's /api/events clients"""
+    batch = [events.make_event(kind, t, actor_id) for t in tickets]
+    try:
+        if EVENTS_BACKEND == "postgres":
+            await conn.execute("SELECT pg_notify(?, e) FROM unnest(CAST(? AS text[])) e",
+                               events.CHANNEL, [json.dumps(e) for e in batch])
+        elif EVENTS_BACKEND == "redis":
+            async with aredis.pipeline(transaction=False) as pipe:
+                for e in batch:
+                    pipe.publish(events.CHANNEL, json.dumps(e))
+                await pipe.execute()
+        else:
+            for e in batch:
+                hub.dispatch(e)
+    except Exception as e:
+        # The write is committed; clients miss a live update but still see it on their next reload
+        logger.warning("Ticket event not published", backend=EVENTS_BACKEND, error=str(e))
+
+
+def api_route(endpoint, unsafe=False):
+    """Session, CSRF, rate limiting and a pooled connection for an async JSON route
+
+    The handler is called as handler(request, conn, user) after the login check.
+    """
+    def decorator(handler):
+        async def wrapped(request):
+            sess = load_session(request)
+            try:
+                await check_rate_limit(request, endpoint)
+                if unsafe:
+                    check_csrf(request, sess)
+                async with db.acquire() as conn:
+                    u = await current_user(conn, sess)
+                    if not u:
+                        return json_error("auth_required", 401)
+                    response = await handler(request, conn, u)
+            except HTTPError as e:
+                return json_error(e.msg, e.code, sess.get("user_id"))
+            refresh_session_cookie(response, sess)
+            return response
+        return wrapped
+    return decorator
+
+
+async def json_body(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPError("bad_json", 400)
+    if not isinstance(data, dict):
+        raise HTTPError("bad_json", 400)
+    return data
+
+
+def cursor_signer():
+    return URLSafeSerializer(flask_app.secret_key, salt="tickets-cursor")
+
+
+@api_route("tickets.list")
+async def api_list_tickets(request, conn, u):
+    args = request.query_params
+    status = (args.get("status") or "").strip()
+    priority = (args.get("priority") or "").strip()
+    try:
+        page = max(int(args.get("page", 1)), 1)
+        size = min(max(int(args.get("size", 20)), 1), 100)
+        after_id = int(args["after_id"]) if args.get("after_id") else None
+    except ValueError:
+        return json_error("bad_paging", 400)
+    offset = (page - 1) * size
+    if args.get("cursor"):
+        try:
+            after_id = int(cursor_signer().loads(args["cursor"]))
+        except (BadSignature, ValueError, TypeError):
+            return json_error("bad_cursor", 400)
+    keyset = after_id is not None
+    count_mode = args.get("count", "none" if keyset else "exact")
+    if count_mode not in ("exact", "approx", "none"):
+        return json_error("bad_count", 400)
+
+    # Revalidation costs one lookup: the ETag only changes when a ticket in the caller's scope does
+    scope = http_cache.list_scope(u, is_admin_or_tech(u))
+    sql, params = http_cache.version_query(scope)
+    tag = http_cache.etag("tickets", scope, await conn.fetchval(sql, *params) or 0,
+                          sorted(args.multi_items()))
+    if http_cache.matches(request.headers.get("if-none-match"), tag):
+        return not_modified(tag)
+    body = await response_cache.aget(tag)
+    if body is not None:
+        return tagged(Response(body, media_type="application/json"), tag)
+
+    words = search.terms(args.get("q"))
+    where, params = [], []
+    if words and db.postgres:
+        source, rank = "tickets t", "rank DESC, "
+        where.append("t.search @@ to_tsquery('english', ?)"); params.append(search.tsquery(words))
+    elif words:
+        source, rank = "tickets_fts JOIN tickets t ON t.id = tickets_fts.rowid", "bm25(tickets_fts, 10.0, 1.0), "
+        where.append("tickets_fts MATCH ?"); params.append(search.fts5_query(words))
+    else:
+        source, rank = "tickets t", ""
+    if not is_admin_or_tech(u):
+        where.append("t.user_id=?"); params.append(u["id"])
+    if status in ("Open", "Closed"):
+        where.append("t.status=?"); params.append(status)
+    if priority in ("Low", "Normal", "High"):
+        where.append("t.priority=?"); params.append(priority)
+    where_sql = (" WHERE " + " AND ".join(where)) if where else ""
+    params_count = tuple(params)
+    if keyset:
+        page_sql = (" AND " if where else " WHERE ") + "t.id<? ORDER BY t.id DESC LIMIT ?"
+        params += [after_id, size + 1]
+    else:
+        page_sql = f" ORDER BY {rank}t.id DESC LIMIT ? OFFSET ?"
+        params += [size + 1, offset]
+
+    total = None
+    if count_mode == "approx":
+        total = ticket_count_cache.get((where_sql, params_count))
+    if count_mode == "exact" or (count_mode == "approx" and total is None):
+        total = await conn.fetchval(f"SELECT COUNT(*) FROM {source}{where_sql}", *params_count)
+        ticket_count_cache.set((where_sql, params_count), total)
+
+    cols = ",".join("t." + c for c in TICKET_COLUMNS.split(","))
+    if words and db.postgres:
+        # ts_headline re-parses the text, so run it over the page only, not every match
+        query = "to_tsquery('english', ?)"
+        sql = (f"SELECT p.*, ts_headline('english', p.title, {query}, ?) AS hl_title, "
+               f"ts_headline('english', p.description, {query}, ?) AS hl_description "
+               f"FROM (SELECT {cols}, ts_rank_cd(t.search, {query}) AS rank FROM {source}{where_sql}{page_sql}) p "
+               f"ORDER BY {'' if keyset else 'p.rank DESC, '}p.id DESC")
+        params = [search.tsquery(words), search.PG_HEADLINE_TITLE, search.tsquery(words), search.PG_HEADLINE_SNIPPET,
+                  search.tsquery(words)] + params
+    elif words:
+        sql = (f"SELECT {cols}, highlight(tickets_fts, 0, ?, ?) AS hl_title, "
+               f"snippet(tickets_fts, 1, ?, ?, '…', 16) AS hl_description FROM {source}{where_sql}{page_sql}")
+        params = [search.MARK_START, search.MARK_END] * 2 + params
+    else:
+        sql = f"SELECT {cols} FROM {source}{where_sql}{page_sql}"
+    rows = []
+    for r in await conn.fetch(sql, *params):
+        t = row_to_ticket(r)
+        if words:
+            t.pop("rank", None)
+            t["highlight"] = {"title": search.mark(t.pop("hl_title")), "description": search.mark(t.pop("hl_description"))}
+        rows.append(t)
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        # Ranked search pages are not in id order, so they page with page= instead of a cursor
+        if keyset or not words:
+            next_cursor = cursor_signer().dumps(rows[-1]["id"])
+    resp = JSONResponse({"items": rows, "page": page, "size": size, "total": total, "next_cursor": next_cursor})
+    await response_cache.aset(tag, resp.body)
+    return tagged(resp, tag)
+
+
+@api_route("tickets.stats")
+async def api_ticket_stats(request, conn, u):
+    owner = request.query_params.get("user_id") if is_admin_or_tech(u) else u["id"]
+    try:
+        owner = int(owner) if owner else None
+    except ValueError:
+        return json_error("bad_user_id", 400)
+    stats = counters.summarize([(r["status"], r["priority"], r["n"]) for r in await conn.fetch(
+        counters.SELECT_SCOPE, *(("owner", str(owner)) if owner else ("all", "")))])
+    if is_admin_or_tech(u):
+        stats["by_assignee"] = counters.assignees([tuple(r.values()) for r in await conn.fetch(counters.SELECT_ASSIGNEES)])
+    return JSONResponse(stats)
+
+
+@api_route("tickets.create", unsafe=True)
+async def api_create_ticket(request, conn, u):
+    data = await json_body(request)
+    title = (data.get("title") or "").strip()
+    description = (data.get("description") or "").strip()
+    priority = (data.get("priority") or "Normal").strip()
+    if not title or not description:
+        return json_error("missing_fields", 400)
+    if len(title) > 160: return json_error("title_too_long", 400)
+    if len(description) > 10000: return json_error("description_too_long", 400)
+    if priority not in ("Low", "Normal", "High"): return json_error("bad_priority", 400)
+    now = _now()
+    async with conn.transaction():
+        created = await conn.fetchrow(
+            f"INSERT INTO tickets(title,description,status,priority,created_at,updated_at,user_id) "
+            f"VALUES(?,?,'Open',?,?,?,?) RETURNING {TICKET_COLUMNS}",
+            title, description, priority, now, now, u["id"])
+        await log_action(conn, u["id"], "create", "ticket", created["id"], f"title={title}")
+    created = row_to_ticket(created)
+    await publish(conn, "created", [created], u["id"])
+    return JSONResponse(created, status_code=201)
+
+
+async def load_ticket(conn, ticket_id, u, with_version=False):
+    if with_version:
+        cols = ",".join("t." + c for c in TICKET_COLUMNS.split(","))
+        t = await conn.fetchrow(f"SELECT {cols}, v.version FROM tickets t LEFT JOIN ticket_versions v "
+                                f"ON v.scope = {http_cache.owner_scope_sql('t')} WHERE t.id=?", ticket_id)
+    else:
+        t = await conn.fetchrow(f"SELECT {TICKET_COLUMNS} FROM tickets WHERE id=?", ticket_id)
+    if not t:
+        raise HTTPError("not_found", 404)
+    if not is_admin_or_tech(u) and t["user_id"] != u["id"]:
+        raise HTTPError("forbidden", 403)
+    return t
+
+
+@api_route("tickets.get")
+async def api_get_ticket(request, conn, u):
+    t = await load_ticket(conn, request.path_params["ticket_id"], u, with_version=True)
+    tag = http_cache.etag("ticket", t["id"], t.pop("version") or 0)
+    if http_cache.matches(request.headers.get("if-none-match"), tag):
+        return not_modified(tag)
+    return tagged(JSONResponse(row_to_ticket(t)), tag)
+
+
+@api_route("tickets.update", unsafe=True)
+async def api_update_ticket(request, conn, u):
+    ticket_id = request.path_params["ticket_id"]
+    data = await json_body(request)
+    t = await load_ticket(conn, ticket_id, u)
+    title = (data.get("title", t["title"]) or "").strip()
+    description = (data.get("description", t["description"]) or "").strip()
+    priority = (data.get("priority", t["priority"]) or "").strip()
+    status = data.get("status", t["status"])
+    if len(title) == 0 or len(title) > 160: return json_error("bad_title", 400)
+    if len(description) == 0 or len(description) > 10000: return json_error("bad_description", 400)
+    if priority not in ("Low", "Normal", "High"): return json_error("bad_priority", 400)
+    if status not in ("Open", "Closed"): return json_error("bad_status", 400)
+    async with conn.transaction():
+        updated = await conn.fetchrow(
+            f"UPDATE tickets SET title=?, description=?, priority=?, status=?, updated_at=? WHERE id=? RETURNING {TICKET_COLUMNS}",
+            title, description, priority, status, _now(), ticket_id)
+        await log_action(conn, u["id"], "update", "ticket", ticket_id, audit_log.changes(
+            t, {"title": title, "description": description, "priority": priority, "status": status}, TRACKED_FIELDS))
+    updated = row_to_ticket(updated)
+    await publish(conn, "closed" if status == "Closed" and t["status"] != "Closed" else "updated", [updated], u["id"])
+    return JSONResponse(updated)
+
+
+@api_route("tickets.bulk", unsafe=True)
+async def api_bulk_tickets(request, conn, u):
+    """Close/reopen/assign/reprioritize many tickets in one transaction (see bulk.py)"""
+    try:
+        op, ids, value = bulk.parse(await json_body(request))
+    except bulk.BulkError as e:
+        return json_error(str(e), 400)
+    if op == "assign":
+        if not is_admin_or_tech(u):
+            return json_error("forbidden", 403)
+        if await conn.fetchval("SELECT 1 FROM users WHERE id=?", value) is None:
+            return json_error("unknown_user", 400)
+    changed = []
+    async with conn.transaction():
+        rows = [tuple(r.values()) for r in await conn.fetch(bulk.select_sql(op, ids), *ids)]
+        change, results = bulk.plan(op, ids, value, rows, u, is_admin_or_tech(u))
+        before = {r[0]: r[2] for r in rows}
+        if change:
+            now = _now()
+            changed = [row_to_ticket(r) for r in await conn.fetch(bulk.update_sql(op, change, TICKET_COLUMNS), value, now, *change)]
+            audit_rows = [(now, u["id"], bulk.OPS[op][1], "ticket", t["id"], bulk.audit_details(op, before[t["id"]], value)) for t in changed]
+            for chunk, params in audit.chunks(audit_rows):
+                await conn.execute(audit.insert_sql(len(chunk)), *params)
+    for t in changed:
+        results[t["id"]] = {"id": t["id"], "ok": True, "changed": True}
+    if changed:
+        await publish(conn, bulk.OPS[op][2], changed, u["id"])
+    return JSONResponse(bulk.summary(op, ids, results))
+
+
+@api_route("tickets.history")
+async def api_ticket_history(request, conn, u):
+    """One ticket's audit trail, newest first; see app.py's route of the same name"""
+    ticket_id = request.path_params["ticket_id"]
+    try:
+        size = min(max(int(request.query_params.get("size", 50)), 1), 100)
+    except ValueError:
+        return json_error("bad_paging", 400)
+    before_id = None
+    if request.query_params.get("cursor"):
+        try:
+            before_id = int(URLSafeSerializer(flask_app.secret_key, salt="audit-cursor").loads(request.query_params["cursor"]))
+        except (BadSignature, ValueError, TypeError):
+            return json_error("bad_cursor", 400)
+    t = await conn.fetchrow("SELECT user_id FROM tickets WHERE id=?", ticket_id)
+    # Admins and techs can still read the history of a deleted ticket
+    if not is_admin_or_tech(u):
+        if not t:
+            return json_error("not_found", 404)
+        if t["user_id"] != u["id"]:
+            return json_error("forbidden", 403)
+    filters = {"entity": "ticket", "entity_id": ticket_id}
+    months = [] if POSTGRES else audit_log.month_tables([r["name"] for r in await conn.fetch(audit_log.SQLITE_TABLES)])
+    tables = audit_log.tables_for(months, filters)
+    where, params = audit_log.where_clause(filters, before_id)
+    sql, args = audit_log.union_query(tables, where, params, size + 1)
+    items = audit_log.page_items(await conn.fetch(sql, *args))
+    if not t and not items:
+        return json_error("not_found", 404)
+    next_cursor = None
+    if len(items) > size:
+        next_cursor = URLSafeSerializer(flask_app.secret_key, salt="audit-cursor").dumps(items[size - 1]["id"])
+    return JSONResponse({"items": [audit_log.timeline_entry(i) for i in items[:size]], "size": size,
+                         "next_cursor": next_cursor})
+
+
+@api_route("attachments.list")
+async def api_list_attachments(request, conn, u):
+    ticket_id = request.path_params["ticket_id"]
+    await load_ticket(conn, ticket_id, u)
+    rows = await conn.fetch("SELECT id,filename,stored_path,s3_key,mime,size,uploaded_at,uploader_id,sha256 "
+                            "FROM attachments WHERE ticket_id=? ORDER BY id DESC", ticket_id)
+    items = []
+    for r in rows:
+        # Presigning is local HMAC work and cached, so the sync helper is fine here
+        url = (wsgi.get_file_url(f"s3://{wsgi.S3_BUCKET}/{r['s3_key']}") if r['s3_key'] and wsgi.S3_BUCKET
+               else f"/uploads/{r['id']}")
+        items.append({"id": r['id'], "filename": r['filename'], "path": r['stored_path'], "url": url,
+                      "mime": r['mime'], "size": r['size'], "uploaded_at": str(r['uploaded_at']),
+                      "uploader_id": r['uploader_id'], "sha256": r['sha256']})
+    return JSONResponse(items)
+
+
+@api_route("attachments.complete", unsafe=True)
+async def api_attach_complete(request, conn, u):
+    """Async version of app_production.api_attach_complete (HEAD via aiobotocore)"""
+    ticket_id = request.path_params["ticket_id"]
+    data = await json_body(request)
+    try:
+        meta = wsgi.direct_upload_signer().loads(data.get("token") or "", max_age=3600)
+    except BadSignature:
+        return json_error("bad_token", 400)
+    if meta["t"] != ticket_id or meta["u"] != u["id"]:
+        return json_error("bad_token", 400)
+    if s3 is None:
+        return json_error("direct_upload_unavailable", 400)
+    try:
+        head = await s3.head_object(Bucket=wsgi.S3_BUCKET, Key=blobstore.blob_path(meta["h"]), ChecksumMode='ENABLED')
+    except ClientError:
+        return json_error("upload_missing", 400)
+    expected = base64.b64encode(bytes.fromhex(meta["h"])).decode()
+    if head['ContentLength'] != meta["s"] or head.get('ChecksumSHA256', expected) != expected:
+        return json_error("content_mismatch", 400)
+
+    await load_ticket(conn, ticket_id, u)
+    key = blobstore.blob_path(meta["h"])
+    async with conn.transaction():
+        await conn.execute("""INSERT INTO blobs(sha256, size, stored_path, refcount, created_at) VALUES(?, ?, ?, 1, ?)
+                              ON CONFLICT(sha256) DO UPDATE SET refcount = blobs.refcount + 1""",
+                           meta["h"], meta["s"], key, _now())
+        await conn.execute("INSERT INTO attachments(ticket_id,filename,stored_path,s3_key,mime,size,uploaded_at,uploader_id,sha256) "
+                           "VALUES(?,?,?,?,?,?,?,?,?)",
+                           ticket_id, meta["f"], key, key, meta["m"], meta["s"], _now(), u["id"], meta["h"])
+        await log_action(conn, u["id"], "attach", "ticket", ticket_id, meta["f"])
+    logger.info("Direct upload completed", ticket_id=ticket_id, sha256=meta["h"], size=meta["s"])
+    return JSONResponse({"ok": True, "filename": meta["f"], "size": meta["s"], "mime": meta["m"],
+                         "sha256": meta["h"]}, status_code=201)
+
+
+async def api_events(request):
+    """Server-Sent Events feed of ticket changes the caller may see
+
+    Not an api_route: the connection is only held to resolve the user, not
+    for the life of the stream. Streams end after SSE_MAX_SECONDS and the
+    browser reconnects (with Last-Event-ID), which re-checks the session.
+    """
+    sess = load_session(request)
+    try:
+        await check_rate_limit(request, "events")
+        async with db.acquire() as conn:
+            u = await current_user(conn, sess)
+    except HTTPError as e:
+        return json_error(e.msg, e.code, sess.get("user_id"))
+    if not u:
+        return json_error("auth_required", 401)
+    subscriber = events.AsyncSubscriber({"id": u["id"], "role": u["role"]}, hub.queue_size, asyncio.get_running_loop())
+    replay = hub.subscribe(subscriber, request.headers.get("last-event-id"))
+    if replay is None:
+        return json_error("too_many_listeners", 503)
+    response = StreamingResponse(events.astream_lines(hub, subscriber, replay, max_age=SSE_MAX_SECONDS),
+                                 media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    refresh_session_cookie(response, sess)
+    return response
+
+
+async def async_health(request):
+    try:
+        async with db.acquire() as conn:
+            await conn.fetchval("SELECT 1")
+    except Exception as e:
+        logger.error("Health check failed", error=str(e))
+        return JSONResponse({"status": "unhealthy", "error": str(e), "async_db": db.stats()}, status_code=503)
+    return JSONResponse({"status": "healthy", "timestamp": datetime.now().isoformat(), "async_db": db.stats(),
+                         "response_cache": response_cache.stats(), "events": dict(hub.stats(), backend=EVENTS_BACKEND)})
+
+
+async def handle_pool_timeout(request, exc):
+    logger.error("Async database pool exhausted", **db.stats())
+    return json_error("db_unavailable", 503)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global s3, aredis
+    async with AsyncExitStack() as stack:
+        await db.open()
+        stack.push_async_callback(db.close)
+        if wsgi.S3_BUCKET:
+            from aiobotocore.session import get_session
+            s3 = await stack.enter_async_context(get_session().create_client(
+                's3', region_name=wsgi.S3_REGION, config=BotoConfig(signature_version='s3v4'),
+                aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+                aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')))
+        if wsgi.REDIS_URL and (isinstance(wsgi.session_store, sessions.RedisSessionStore) or response_cache.enabled
+                               or EVENTS_BACKEND == "redis"):
+            import redis.asyncio
+            aredis = redis.asyncio.from_url(wsgi.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+            stack.push_async_callback(aredis.aclose)
+            response_cache.redis = aredis
+        if EVENTS_BACKEND == "postgres":
+            listener = asyncio.create_task(events.listen_postgres(hub, wsgi.DATABASE_URL, logger))
+        elif EVENTS_BACKEND == "redis":
+            listener = asyncio.create_task(events.listen_redis(hub, wsgi.REDIS_URL, logger))
+        else:
+            listener = None
+        try:
+            yield
+        finally:
+            if listener:
+                listener.cancel()
+
+
+app = Starlette(
+    routes=[
+        Route("/api/tickets", api_list_tickets, methods=["GET"]),
+        Route("/api/tickets", api_create_ticket, methods=["POST"]),
+        Route("/api/tickets/stats", api_ticket_stats, methods=["GET"]),
+        Route("/api/tickets/bulk", api_bulk_tickets, methods=["POST"]),
+        Route("/api/tickets/{ticket_id:int}", api_get_ticket, methods=["GET"]),
+        Route("/api/tickets/{ticket_id:int}", api_update_ticket, methods=["PUT"]),
+        Route("/api/tickets/{ticket_id:int}/history", api_ticket_history, methods=["GET"]),
+        Route("/api/tickets/{ticket_id:int}/attachments", api_list_attachments, methods=["GET"]),
+        Route("/api/tickets/{ticket_id:int}/attachments/complete", api_attach_complete, methods=["POST"]),
+        Route("/api/events", api_events, methods=["GET"]),
+        Route("/health/async", async_health, methods=["GET"]),
+        # Everything else (auth, password reset, presign, /health, ...) is the Flask app
+        Mount("/", app=WSGIMiddleware(flask_app, workers=int(os.getenv('ASGI_WSGI_THREADS', '10')))),
+    ],
+    exception_handlers={db_pool.PoolTimeout: handle_pool_timeout},
+    lifespan=lifespan,
+)
@@ -1,4 +1,7 @@
+import io
 import os
+import base64
+import hashlib
 import secrets
 import mimetypes
 from datetime import datetime, timedelta
@@ -7,16 +10,33 @@ import structlog
 import sentry_sdk
 from sentry_sdk.integrations.flask import FlaskIntegration
 
-from flask import Flask, request, jsonify, session, send_from_directory
+from flask import Flask, request, jsonify, session, send_from_directory, redirect, g
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from flask_wtf.csrf import CSRFProtect
-from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_wtf.csrf import CSRFProtect, generate_csrf
+from itsdangerous import URLSafeSerializer, URLSafeTimedSerializer, BadSignature, SignatureExpired
 from werkzeug.utils import secure_filename
 import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
 from email_validator import validate_email, EmailNotValidError
+import redis
+
+import audit
+import audit_log
+import blobstore
+import counters
+import db_pool
+import hashing
+import http_cache
+import mailer
+import search
+import sessions
+import storage
+import ticket_io
+from cache import TTLCache
+from shared_state import SharedState
 
 # Initialize structured logging
 structlog.configure(
@@ -65,11 +85,22 @@ app.config.update(
 allowed_origins = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:5173').split(',')
 CORS(app, supports_credentials=True, origins=allowed_origins)
 
-# Rate limiting
+# Shared cross-worker state; the limiter reuses its Redis connection pool
+REDIS_URL = os.getenv('REDIS_URL')
+shared_state = SharedState(REDIS_URL, max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', '20')), logger=logger)
+
+# Rate limiting - counters live in Redis so every worker and container enforces the same
+# budget; while Redis is unreachable each worker falls back to in-memory counting
+DEFAULT_RATE_LIMITS = ["1000 per day", "100 per hour"]
+app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
 limiter = Limiter(
-    app,
-    key_func=get_remote_address,
-    default_limits=["1000 per day", "100 per hour"]
+    get_remote_address,
+    app=app,
+    default_limits=DEFAULT_RATE_LIMITS,
+    storage_uri=REDIS_URL or "memory://",
+    storage_options={"connection_pool": shared_state.pool} if shared_state.pool else {},
+    in_memory_fallback_enabled=bool(REDIS_URL),
+    swallow_errors=True,
 )
 
 # CSRF Protection
@@ -81,12 +112,19 @@ if DATABASE_URL.startswith('postgresql://'):
     import psycopg2
     from psycopg2.extras import RealDictCursor
     
-    def get_db_connection():
+    def _connect():
         return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
 else:
     import sqlite3
-    def get_db_connection():
-        return sqlite3.connect("tickets.db")
+    def _connect():
+        return sqlite3.connect("tickets.db", check_same_thread=False)
+
+# One pool per gunicorn worker; a request reuses a single connection via flask.g
+pool = db_pool.pool_from_env(_connect)
+db_pool.init_app(app, pool)
+
+def get_db_connection():
+    return db_pool.request_connection(pool)
 
 # S3 Configuration for file storage
 S3_BUCKET = os.getenv('S3_BUCKET')
@@ -95,22 +133,37 @@ if S3_BUCKET:
     s3_client = boto3.client(
         's3',
         region_name=S3_REGION,
+        # SigV4 so presigned PUTs can sign the x-amz-checksum-sha256 header
+        config=BotoConfig(signature_version='s3v4'),
         aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
         aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
     )
 
-# Email configuration
+# Email configuration (delivery settings are read by mailer.sender_from_env)
 SMTP_SERVER = os.getenv('SMTP_SERVER')
-SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
-SMTP_USERNAME = os.getenv('SMTP_USERNAME')
-SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
-SMTP_FROM = os.getenv('SMTP_FROM', 'noreply@helpdesk.local')
+# "thread" delivers from every app worker; "off" when `python mailer.py` runs separately
+MAIL_WORKER = os.getenv('MAIL_WORKER', 'thread')
+mail_worker = None
+if SMTP_SERVER and MAIL_WORKER == 'thread':
+    mail_worker = mailer.worker_from_env(pool, postgres=DATABASE_URL.startswith('postgresql://'), logger=logger)
+
+    @app.before_request
+    def start_mail_worker():
+        mail_worker.start_thread()
 
 # Local uploads fallback
 app.config['UPLOAD_FOLDER'] = os.path.abspath('./uploads')
-app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10 MB
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 512 * 1024 * 1024))
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Stream uploaded files straight to S3 multipart / the upload folder while parsing;
+# api_attach() then commits the sink under the blob key
+if S3_BUCKET:
+    S3_PART_SIZE = int(os.getenv('S3_MULTIPART_PART_SIZE', 8 * 1024 * 1024))
+    storage.init_app(app, lambda: storage.S3MultipartSink(s3_client, S3_BUCKET, part_size=S3_PART_SIZE))
+else:
+    storage.init_app(app, lambda: storage.LocalSink(app.config['UPLOAD_FOLDER']))
+
 def init_db():
     """Initialize database with proper schema"""
     conn = get_db_connection()
@@ -142,15 +195,8 @@ def init_db():
             FOREIGN KEY (user_id) REFERENCES users(id)
         )''')
         
-        c.execute('''CREATE TABLE IF NOT EXISTS audit_log(
-            id SERIAL PRIMARY KEY,
-            ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            actor_id INTEGER,
-            action VARCHAR(50),
-            entity VARCHAR(50),
-            entity_id INTEGER,
-            details TEXT
-        )''')
+        # Partitioned by month on ts; see audit_log.py
+        audit_log.init(c, postgres=True)
         
         c.execute('''CREATE TABLE IF NOT EXISTS attachments(
             id SERIAL PRIMARY KEY,
@@ -161,7 +207,17 @@ def init_db():
             mime VARCHAR(100),
             size INTEGER,
             uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            uploader_id INTEGER
+            uploader_id INTEGER,
+            sha256 VARCHAR(64)
+        )''')
+        c.execute("ALTER TABLE attachments ADD COLUMN IF NOT EXISTS sha256 VARCHAR(64)")
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS blobs(
+            sha256 VARCHAR(64) PRIMARY KEY,
+            size BIGINT,
+            stored_path VARCHAR(500),
+            refcount INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )''')
         
         c.execute('''CREATE TABLE IF NOT EXISTS password_reset_tokens(
@@ -172,6 +228,28 @@ def init_db():
             used BOOLEAN DEFAULT FALSE,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )''')
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS email_outbox(
+            id SERIAL PRIMARY KEY,
+            to_email VARCHAR(255) NOT NULL,
+            subject VARCHAR(255),
+            body TEXT,
+            status VARCHAR(20) DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at TIMESTAMP,
+            claimed_at TIMESTAMP,
+            sent_at TIMESTAMP,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''')
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS user_sessions(
+            sid VARCHAR(64) PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            username VARCHAR(50),
+            role VARCHAR(20),
+            expires_at TIMESTAMP
+        )''')
     else:
         # SQLite schema (fallback)
         c.execute('''CREATE TABLE IF NOT EXISTS users(
@@ -217,7 +295,19 @@ def init_db():
             mime TEXT,
             size INTEGER,
             uploaded_at TEXT,
-            uploader_id INTEGER
+            uploader_id INTEGER,
+            sha256 TEXT
+        )''')
+        c.execute("PRAGMA table_info(attachments)")
+        if "sha256" not in [r[1] for r in c.fetchall()]:
+            c.execute("ALTER TABLE attachments ADD COLUMN sha256 TEXT")
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS blobs(
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER,
+            stored_path TEXT,
+            refcount INTEGER DEFAULT 0,
+            created_at TEXT
         )''')
         
         c.execute('''CREATE TABLE IF NOT EXISTS password_reset_tokens(
@@ -228,7 +318,58 @@ def init_db():
             used BOOLEAN DEFAULT FALSE,
             created_at TEXT
         )''')
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS email_outbox(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            to_email TEXT NOT NULL,
+            subject TEXT,
+            body TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at TEXT,
+            claimed_at TEXT,
+            sent_at TEXT,
+            last_error TEXT,
+            created_at TEXT
+        )''')
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS user_sessions(
+            sid TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            role TEXT,
+            expires_at TEXT
+        )''')
     
+    # Same DDL on both backends; keep in sync with migrations/versions/002_listing_indexes.py
+    for stmt in (
+        "CREATE INDEX IF NOT EXISTS ix_tickets_user_status_priority_id ON tickets(user_id, status, priority, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tickets_user_priority_id ON tickets(user_id, priority, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tickets_status_priority_id ON tickets(status, priority, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tickets_priority_id ON tickets(priority, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tickets_assigned_status_id ON tickets(assigned_to, status, id)",
+        "CREATE INDEX IF NOT EXISTS ix_attachments_ticket_id ON attachments(ticket_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_audit_log_entity ON audit_log(entity, entity_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_password_reset_tokens_user_expires ON password_reset_tokens(user_id, expires_at)",
+        "CREATE INDEX IF NOT EXISTS ix_email_outbox_status_next ON email_outbox(status, next_attempt_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_attachments_stored_path ON attachments(stored_path)",
+        "CREATE INDEX IF NOT EXISTS ix_user_sessions_user_id ON user_sessions(user_id)",
+    ):
+        c.execute(stmt)
+
+    # Full-text index over title/description
+    if DATABASE_URL.startswith('postgresql://'):
+        for stmt in search.POSTGRES_DDL:
+            c.execute(stmt)
+    else:
+        search.init_sqlite(c)
+    # Dashboard counters, kept current by triggers on tickets
+    counters.init(c, postgres=DATABASE_URL.startswith('postgresql://'))
+    # Per-scope versions behind ticket ETags
+    http_cache.init(c, postgres=DATABASE_URL.startswith('postgresql://'))
+    if not DATABASE_URL.startswith('postgresql://'):
+        audit_log.init(c)
+
     conn.commit()
     conn.close()
 
@@ -252,79 +393,199 @@ def row_to_ticket(row):
                 "priority": row[4], "created_at": row[5], "updated_at": row[6],
                 "assigned_to": row[7], "user_id": row[8]}
 
+# Cross-request cache of user records (USER_CACHE_TTL seconds, 0 disables). Entries carry
+# the user's generation from shared_state; invalidate_user() bumps it, so with REDIS_URL
+# every worker drops its copy on the next request (one Redis GET instead of a users query).
+user_cache = TTLCache(maxsize=4096, ttl=float(os.getenv('USER_CACHE_TTL', '0')))
+# Generation keys expire a day after a user's first invalidation (not extended); an entry
+# that outlives its key is at worst served until its own USER_CACHE_TTL runs out
+USER_GENERATION_TTL = 24 * 3600
+
+def user_generation_key(user_id):
+    return f"user-gen:{user_id}"
+
+def cached_user(user_id, generation):
+    """The cached record of a user if it was stored under generation, else None
+
+    Callers read the generation (shared_state / app_async's aredis) before
+    loading the users row and pass the same value to cache_user(), so an
+    invalidation in between is not lost.
+    """
+    cached = user_cache.get(user_id)
+    return cached[1] if cached and cached[0] == generation else None
+
+def cache_user(user_id, generation, u):
+    user_cache.set(user_id, (generation, u))
+
+# Server-side sessions: SESSION_BACKEND=redis (needs REDIS_URL) or db store {id, username, role}
+# per session so auth checks are one lookup; "cookie" (default) resolves user_id from the users table
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cookie')
+session_store = None
+if SESSION_BACKEND == 'redis' and shared_state.client is not None:
+    session_store = sessions.RedisSessionStore(shared_state.client, app.permanent_session_lifetime)
+elif SESSION_BACKEND == 'db':
+    session_store = sessions.DBSessionStore(get_db_connection, app.permanent_session_lifetime,
+                                            postgres=DATABASE_URL.startswith('postgresql://'))
+
 def get_current_user():
+    """Resolve the session user once per request"""
     if "user_id" not in session: return None
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE id=%s" if DATABASE_URL.startswith('postgresql://') else "SELECT * FROM users WHERE id=?", (session["user_id"],))
-    u = row_to_user(c.fetchone())
-    conn.close()
+    if "current_user" in g: return g.current_user
+    if session_store and "sid" in session:
+        try:
+            g.current_user = session_store.get(session["sid"])
+            return g.current_user
+        except redis.RedisError as e:
+            # Redis outage: fall back to the users table rather than logging everyone out
+            logger.warning("Session store unavailable", error=str(e))
+    uid = session["user_id"]
+    u, generation = None, None
+    if user_cache.enabled:
+        generation = shared_state.get(user_generation_key(uid))
+        u = cached_user(uid, generation)
+    if u is None:
+        conn = get_db_connection()
+        c = conn.cursor()
+        c.execute("SELECT * FROM users WHERE id=%s" if DATABASE_URL.startswith('postgresql://') else "SELECT * FROM users WHERE id=?", (uid,))
+        u = row_to_user(c.fetchone())
+        conn.close()
+        if u:
+            cache_user(uid, generation, u)
+    g.current_user = u
     return u
 
+def invalidate_user(user_id, role=None):
+    """Drop cached copies of a user; a new role is written into their sessions, otherwise they are revoked"""
+    user_cache.invalidate(user_id)
+    if user_cache.enabled:
+        shared_state.incr(user_generation_key(user_id), ttl=USER_GENERATION_TTL)
+    if session_store:
+        try:
+            if role:
+                session_store.update_user(user_id, role=role)
+            else:
+                session_store.revoke_user(user_id)
+        except redis.RedisError as e:
+            logger.error("Failed to update sessions", user_id=user_id, error=str(e))
+    if g.get("current_user") and g.current_user["id"] == user_id:
+        g.pop("current_user")
+
 def json_error(msg, code=400):
     logger.error("API error", error=msg, code=code, user_id=session.get('user_id'))
     return jsonify({"error": msg}), code
 
+@app.errorhandler(db_pool.PoolTimeout)
+def handle_pool_timeout(e):
+    logger.error("Database pool exhausted", **pool.stats())
+    return json_error("db_unavailable", 503)
+
+# Password hashing runs on a bounded process pool so login bursts cannot starve other requests
+passwords = hashing.hasher_from_env()
+
+@app.errorhandler(hashing.HashingBusy)
+def handle_hashing_busy(e):
+    logger.warning("Password hashing queue full", **passwords.stats())
+    return json_error("busy", 503)
+
+# AUDIT_MODE=transaction (default) inserts on the request's connection so the row commits
+# with the change it describes (call before conn.commit()); AUDIT_MODE=async batches
+# rows on a background writer.
+AUDIT_MODE = os.getenv('AUDIT_MODE', 'transaction')
+audit_writer = (audit.writer_from_env(pool, placeholder="%s" if DATABASE_URL.startswith('postgresql://') else "?", logger=logger)
+                if AUDIT_MODE == 'async' else None)
+
 def log_action(actor_id, action, entity, entity_id, details=""):
+    if DATABASE_URL.startswith('postgresql://'):
+        ts = datetime.now()
+    else:
+        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if audit_writer:
+        audit_writer.submit((ts, actor_id, action, entity, entity_id, details))
+        return
     conn = get_db_connection()
     c = conn.cursor()
     if DATABASE_URL.startswith('postgresql://'):
-        c.execute("INSERT INTO audit_log(actor_id,action,entity,entity_id,details) VALUES(%s,%s,%s,%s,%s)",
-                  (actor_id, action, entity, entity_id, details))
+        c.execute("INSERT INTO audit_log(ts,actor_id,action,entity,entity_id,details) VALUES(%s,%s,%s,%s,%s,%s)",
+                  (ts, actor_id, action, entity, entity_id, details))
     else:
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         c.execute("INSERT INTO audit_log(ts,actor_id,action,entity,entity_id,details) VALUES(?,?,?,?,?,?)",
                   (ts, actor_id, action, entity, entity_id, details))
-    conn.commit()
     conn.close()
 
 def send_email(to_email, subject, body):
-    """Send email using SMTP or fallback to logging"""
+    """Queue an email in the outbox; the mail worker delivers it"""
     if not SMTP_SERVER:
         logger.info("Email would be sent", to=to_email, subject=subject)
         return
+    if not to_email:
+        logger.warning("No email address on file", subject=subject)
+        return
     
-    try:
-        import smtplib
-        from email.mime.text import MIMEText
-        from email.mime.multipart import MIMEMultipart
-        
-        msg = MIMEMultipart()
-        msg['From'] = SMTP_FROM
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-        
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        if SMTP_USERNAME:
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-        logger.info("Email sent successfully", to=to_email, subject=subject)
-    except Exception as e:
-        logger.error("Failed to send email", error=str(e), to=to_email)
+    conn = get_db_connection()
+    mailer.enqueue_email(conn, to_email, subject, body, postgres=DATABASE_URL.startswith('postgresql://'))
+    conn.commit()
+    conn.close()
+    logger.info("Email queued", to=to_email, subject=subject)
+
+def upload_file_to_s3(conn, file):
+    """Store an uploaded file at its content address in S3 or the local upload folder
 
-def upload_file_to_s3(file, key):
-    """Upload file to S3 or return local path"""
+    The bytes go under blobstore.blob_path(sha256) and the blob row is referenced
+    in conn (caller commits); content that is already stored is not written
+    again. Files parsed by StreamingRequest are already in their sink, so
+    committing only renames (local) or completes/moves the multipart upload
+    (S3). Returns (key, sha256, size).
+    """
+    postgres = DATABASE_URL.startswith('postgresql://')
+    if isinstance(file.stream, storage.UploadSink):
+        try:
+            key = blobstore.store_upload(conn, file.stream, postgres)
+        except Exception as e:
+            logger.error("Upload commit failed", error=str(e))
+            raise
+        return key, file.stream.sha256, file.stream.size
+    
+    digest, size = hashlib.sha256(), 0
+    for chunk in iter(lambda: file.stream.read(1024 * 1024), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    file.stream.seek(0)
+    sha256 = digest.hexdigest()
+    key = blobstore.blob_path(sha256)
+    if blobstore.acquire(conn, sha256, size, postgres) > 1:
+        return key, sha256, size
+    
     if S3_BUCKET:
         try:
-            s3_client.upload_fileobj(file, S3_BUCKET, key)
-            return f"s3://{S3_BUCKET}/{key}"
+            s3_client.upload_fileobj(file.stream, S3_BUCKET, key)
         except Exception as e:
             logger.error("S3 upload failed", error=str(e))
             raise
+        return key, sha256, size
     
     # Fallback to local storage
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], key)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
     file.save(filepath)
-    return filepath
+    return key, sha256, size
+
+# Presigned GET URLs are shared across requests and re-signed PRESIGN_REFRESH_MARGIN
+# seconds before they expire, so a URL handed out is always valid for at least that long.
+PRESIGN_EXPIRES = int(os.getenv('S3_PRESIGN_EXPIRES', '3600'))
+PRESIGN_REFRESH_MARGIN = int(os.getenv('S3_PRESIGN_REFRESH_MARGIN', '300'))
+presigned_url_cache = TTLCache(maxsize=int(os.getenv('S3_PRESIGN_CACHE_SIZE', '10000')),
+                               ttl=max(PRESIGN_EXPIRES - PRESIGN_REFRESH_MARGIN, 0))
 
 def get_file_url(s3_key_or_path):
     """Get URL for file (S3 signed URL or local path)"""
     if s3_key_or_path.startswith('s3://'):
-        bucket, key = s3_key_or_path[5:].split('/', 1)
-        return s3_client.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': key}, ExpiresIn=3600)
+        url = presigned_url_cache.get(s3_key_or_path)
+        if url is None:
+            bucket, key = s3_key_or_path[5:].split('/', 1)
+            url = s3_client.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': key},
+                                                   ExpiresIn=PRESIGN_EXPIRES)
+            presigned_url_cache.set(s3_key_or_path, url)
+        return url
     return s3_key_or_path
 
 # Security decorators
@@ -350,6 +611,11 @@ def is_admin_or_tech():
     return bool(u and u["role"] in ("admin", "tech"))
 
 # API Routes with enhanced security
+@app.get("/api/csrf")
+def api_csrf():
+    """Token for the X-CSRFToken header that CSRFProtect expects on POST/PUT/DELETE"""
+    return jsonify({"csrf_token": generate_csrf()})
+
 @app.post("/api/register")
 @limiter.limit("5 per minute")
 def api_register():
@@ -373,10 +639,10 @@ def api_register():
     try:
         if DATABASE_URL.startswith('postgresql://'):
             c.execute("INSERT INTO users(username,email,password) VALUES(%s,%s,%s)",
-                      (username, email or None, generate_password_hash(password)))
+                      (username, email or None, passwords.hash(password)))
         else:
             c.execute("INSERT INTO users(username,email,password) VALUES(?,?,?)",
-                      (username, email or None, generate_password_hash(password)))
+                      (username, email or None, passwords.hash(password)))
         conn.commit()
         logger.info("User registered", username=username, email=email)
         return jsonify({"ok": True}), 201
@@ -400,9 +666,24 @@ def api_login():
     user = row_to_user(c.fetchone())
     conn.close()
     
-    if user and check_password_hash(user["password"], password):
+    if user and passwords.verify(user["password"], password):
+        # Upgrade hashes made with an older PASSWORD_HASH_METHOD while the plaintext is at hand
+        new_hash = passwords.rehash(user["password"], password)
+        if new_hash:
+            conn = get_db_connection()
+            c = conn.cursor()
+            c.execute("UPDATE users SET password=%s WHERE id=%s" if DATABASE_URL.startswith('postgresql://') else "UPDATE users SET password=? WHERE id=?", (new_hash, user["id"]))
+            conn.commit()
+            conn.close()
+            logger.info("Password hash upgraded", user_id=user["id"], method=passwords.method)
         session.permanent = True
         session["user_id"] = user["id"]
+        session.pop("sid", None)
+        if session_store:
+            try:
+                session["sid"] = session_store.create(user)
+            except redis.RedisError as e:
+                logger.warning("Session store unavailable", error=str(e))
         logger.info("User logged in", user_id=user["id"], username=username)
         return jsonify({"ok": True, "user": {"id": user["id"], "username": user["username"], "role": user["role"]}})
     
@@ -477,18 +758,326 @@ def api_pwd_reset():
     
     # Update password and mark token as used
     if DATABASE_URL.startswith('postgresql://'):
-        c.execute("UPDATE users SET password=%s WHERE id=%s", (generate_password_hash(newpw), user_id))
+        c.execute("UPDATE users SET password=%s WHERE id=%s", (passwords.hash(newpw), user_id))
         c.execute("UPDATE password_reset_tokens SET used=TRUE WHERE token=%s", (token,))
     else:
-        c.execute("UPDATE users SET password=? WHERE id=?", (generate_password_hash(newpw), user_id))
+        c.execute("UPDATE users SET password=? WHERE id=?", (passwords.hash(newpw), user_id))
         c.execute("UPDATE password_reset_tokens SET used=1 WHERE token=?", (token,))
     
     conn.commit()
     conn.close()
+    invalidate_user(user_id)
     
     logger.info("Password reset completed", user_id=user_id)
     return jsonify({"ok": True})
 
+ALLOWED_EXTS = {"png","jpg","jpeg","pdf","txt","log","csv","mp4"}
+def allowed_file(name):
+    return "." in name and name.rsplit(".",1)[1].lower() in ALLOWED_EXTS
+
+def direct_upload_signer():
+    return URLSafeTimedSerializer(app.secret_key, salt="direct-upload")
+
+def check_ticket_access(c, ticket_id, user):
+    """Return None if user may touch the ticket, else an error response"""
+    c.execute("SELECT user_id FROM tickets WHERE id=%s" if DATABASE_URL.startswith('postgresql://') else "SELECT user_id FROM tickets WHERE id=?", (ticket_id,))
+    row = c.fetchone()
+    if not row:
+        return json_error("not_found", 404)
+    owner_id = row['user_id'] if DATABASE_URL.startswith('postgresql://') else row[0]
+    if not is_admin_or_tech() and owner_id != user["id"]:
+        return json_error("forbidden", 403)
+    return None
+
+def record_attachment(conn, ticket_id, user, filename, mime, size, sha256, referenced=False):
+    """Reference the blob and insert the attachment row (caller commits)
+
+    referenced=True when the caller already took the blob reference (upload_file_to_s3).
+    """
+    postgres = DATABASE_URL.startswith('postgresql://')
+    key = blobstore.blob_path(sha256)
+    if not referenced:
+        blobstore.acquire(conn, sha256, size, postgres)
+    c = conn.cursor()
+    if postgres:
+        c.execute("INSERT INTO attachments(ticket_id,filename,stored_path,s3_key,mime,size,uploader_id,sha256) VALUES(%s,%s,%s,%s,%s,%s,%s,%s)",
+                  (ticket_id, filename, key, key if S3_BUCKET else None, mime, size, user["id"], sha256))
+    else:
+        c.execute("INSERT INTO attachments(ticket_id,filename,stored_path,s3_key,mime,size,uploaded_at,uploader_id,sha256) VALUES(?,?,?,?,?,?,?,?,?)",
+                  (ticket_id, filename, key, key if S3_BUCKET else None, mime, size,
+                   datetime.now().strftime("%Y-%m-%d %H:%M:%S"), user["id"], sha256))
+    log_action(user["id"], "attach", "ticket", ticket_id, filename)
+    return key
+
+@app.post("/api/tickets/<int:ticket_id>/attachments")
+@login_required_json
+def api_attach(ticket_id):
+    """Multipart upload through the app; the body was streamed into its sink while parsing"""
+    u = get_current_user()
+    if 'file' not in request.files:
+        return json_error("missing_file", 400)
+    f = request.files['file']
+    filename = secure_filename(f.filename or "")
+    if not filename or not allowed_file(filename):
+        return json_error("ext_not_allowed", 400)
+    mime = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    
+    conn = get_db_connection()
+    c = conn.cursor()
+    denied = check_ticket_access(c, ticket_id, u)
+    if denied:
+        conn.close()
+        return denied
+    _, sha256, size = upload_file_to_s3(conn, f)
+    record_attachment(conn, ticket_id, u, filename, mime, size, sha256, referenced=True)
+    conn.commit()
+    conn.close()
+    logger.info("Attachment uploaded", ticket_id=ticket_id, sha256=sha256, size=size)
+    return jsonify({"ok": True, "filename": filename, "size": size, "mime": mime, "sha256": sha256}), 201
+
+@app.get("/api/tickets/<int:ticket_id>/attachments")
+@login_required_json
+def api_list_attachments(ticket_id):
+    u = get_current_user()
+    conn = get_db_connection()
+    c = conn.cursor()
+    denied = check_ticket_access(c, ticket_id, u)
+    if denied:
+        conn.close()
+        return denied
+    if DATABASE_URL.startswith('postgresql://'):
+        c.execute("SELECT id,filename,stored_path,s3_key,mime,size,uploaded_at,uploader_id,sha256 FROM attachments WHERE ticket_id=%s ORDER BY id DESC", (ticket_id,))
+        rows = [dict(r) for r in c.fetchall()]
+    else:
+        c.execute("SELECT id,filename,stored_path,s3_key,mime,size,uploaded_at,uploader_id,sha256 FROM attachments WHERE ticket_id=? ORDER BY id DESC", (ticket_id,))
+        cols = ["id", "filename", "stored_path", "s3_key", "mime", "size", "uploaded_at", "uploader_id", "sha256"]
+        rows = [dict(zip(cols, r)) for r in c.fetchall()]
+    conn.close()
+    items = []
+    for r in rows:
+        url = get_file_url(f"s3://{S3_BUCKET}/{r['s3_key']}") if r['s3_key'] and S3_BUCKET else f"/uploads/{r['id']}"
+        items.append({"id": r['id'], "filename": r['filename'], "path": r['stored_path'], "url": url,
+                      "mime": r['mime'], "size": r['size'], "uploaded_at": str(r['uploaded_at']),
+                      "uploader_id": r['uploader_id'], "sha256": r['sha256']})
+    return jsonify(items)
+
+# Blobs never change, so their hash is a strong ETag and they can be cached indefinitely.
+# UPLOADS_ACCEL_PREFIX (e.g. /protected-uploads/) hands the byte transfer to an nginx
+# internal location aliasing the upload folder instead of streaming from the worker.
+UPLOADS_ACCEL_PREFIX = os.getenv('UPLOADS_ACCEL_PREFIX', '')
+
+def blob_cache_headers(resp, etag):
+    resp.set_etag(etag)
+    resp.cache_control.no_cache = None
+    resp.cache_control.private = True
+    resp.cache_control.max_age = 365 * 24 * 3600
+    resp.cache_control.immutable = True
+    return resp
+
+# Downloads are addressed by attachment id: deduplicated attachments share a blob but
+# each keeps its own filename and MIME type
+@app.get("/uploads/<int:attachment_id>")
+@login_required_json
+def serve_upload(attachment_id):
+    u = get_current_user()
+    conn = get_db_connection()
+    c = conn.cursor()
+    if DATABASE_URL.startswith('postgresql://'):
+        c.execute("SELECT a.filename, a.mime, a.stored_path, a.s3_key, a.sha256, t.user_id FROM attachments a "
+                  "JOIN tickets t ON t.id = a.ticket_id WHERE a.id=%s", (attachment_id,))
+        row = c.fetchone()
+        row = tuple(row.values()) if row else None
+    else:
+        c.execute("SELECT a.filename, a.mime, a.stored_path, a.s3_key, a.sha256, t.user_id FROM attachments a "
+                  "JOIN tickets t ON t.id = a.ticket_id WHERE a.id=?", (attachment_id,))
+        row = c.fetchone()
+    conn.close()
+    if not row:
+        return json_error("not_found", 404)
+    filename, mime, name, s3_key, etag, owner_id = row
+    if not is_admin_or_tech() and owner_id != u["id"]:
+        return json_error("forbidden", 403)
+    if s3_key and S3_BUCKET:
+        return redirect(get_file_url(f"s3://{S3_BUCKET}/{s3_key}"))
+    if etag and request.if_none_match.contains_weak(etag):
+        return blob_cache_headers(app.response_class(status=304), etag)
+    if UPLOADS_ACCEL_PREFIX:
+        resp = app.response_class(mimetype=mime)
+        resp.headers["X-Accel-Redirect"] = UPLOADS_ACCEL_PREFIX.rstrip("/") + "/" + name
+        resp.headers["Content-Disposition"] = f'inline; filename="{filename}"'
+    else:
+        # conditional=True answers Range (206), If-Range and If-Modified-Since
+        resp = send_from_directory(app.config['UPLOAD_FOLDER'], name, mimetype=mime, download_name=filename,
+                                   etag=etag or True, conditional=True)
+        resp.headers["Accept-Ranges"] = "bytes"
+    if etag:
+        blob_cache_headers(resp, etag)
+    return resp
+
+@app.post("/api/tickets/<int:ticket_id>/attachments/presign")
+@login_required_json
+def api_attach_presign(ticket_id):
+    """Start a direct-to-S3 upload; the browser PUTs the bytes itself
+
+    The client sends filename, size and the hex SHA-256 of the file. Content
+    the caller can already read is attached immediately without any upload.
+    Otherwise the response carries a presigned PUT whose signed
+    x-amz-checksum-sha256 header makes S3 reject bytes that don't match, plus a
+    token for /attachments/complete.
+    """
+    if not S3_BUCKET:
+        return json_error("direct_upload_unavailable", 400)
+    u = get_current_user()
+    data = request.get_json(force=True)
+    filename = secure_filename(data.get("filename") or "")
+    sha256 = (data.get("sha256") or "").lower()
+    try:
+        size = int(data.get("size"))
+    except (TypeError, ValueError):
+        return json_error("bad_size", 400)
+    if not filename or not allowed_file(filename):
+        return json_error("ext_not_allowed", 400)
+    if size < 0 or size > app.config['MAX_CONTENT_LENGTH']:
+        return json_error("file_too_large", 400)
+    if len(sha256) != 64 or any(ch not in "0123456789abcdef" for ch in sha256):
+        return json_error("bad_sha256", 400)
+    mime = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    
+    conn = get_db_connection()
+    c = conn.cursor()
+    denied = check_ticket_access(c, ticket_id, u)
+    if denied:
+        conn.close()
+        return denied
+    # A hash alone is no proof of possession: only skip the upload for content the caller
+    # can already read, i.e. attached to a ticket they own or uploaded themselves (staff
+    # see every ticket). The size comes from the stored blob, never from the client.
+    p = "%s" if DATABASE_URL.startswith('postgresql://') else "?"
+    sql = f"SELECT b.size FROM blobs b WHERE b.sha256={p} AND b.refcount > 0"
+    params = (sha256,)
+    if not is_admin_or_tech():
+        sql += (f" AND EXISTS (SELECT 1 FROM attachments a JOIN tickets t ON t.id = a.ticket_id"
+                f" WHERE a.sha256 = b.sha256 AND (t.user_id={p} OR a.uploader_id={p}))")
+        params += (u["id"], u["id"])
+    c.execute(sql, params)
+    row = c.fetchone()
+    if row:
+        size = row['size'] if DATABASE_URL.startswith('postgresql://') else row[0]
+        record_attachment(conn, ticket_id, u, filename, mime, size, sha256)
+        conn.commit()
+        conn.close()
+        return jsonify({"ok": True, "uploaded": True, "deduplicated": True,
+                        "filename": filename, "size": size, "mime": mime, "sha256": sha256}), 201
+    conn.close()
+    
+    checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+    url = s3_client.generate_presigned_url('put_object', Params={
+        'Bucket': S3_BUCKET, 'Key': blobstore.blob_path(sha256), 'ContentType': mime,
+        'ContentLength': size, 'ChecksumSHA256': checksum}, ExpiresIn=900)
+    token = direct_upload_signer().dumps({"t": ticket_id, "u": u["id"], "f": filename, "s": size, "h": sha256, "m": mime})
+    return jsonify({"ok": True, "uploaded": False, "url": url, "method": "PUT",
+                    "headers": {"Content-Type": mime, "x-amz-checksum-sha256": checksum}, "token": token})
+
+@app.post("/api/tickets/<int:ticket_id>/attachments/complete")
+@login_required_json
+def api_attach_complete(ticket_id):
+    u = get_current_user()
+    data = request.get_json(force=True)
+    try:
+        meta = direct_upload_signer().loads(data.get("token") or "", max_age=3600)
+    except BadSignature:
+        return json_error("bad_token", 400)
+    if meta["t"] != ticket_id or meta["u"] != u["id"]:
+        return json_error("bad_token", 400)
+    try:
+        head = s3_client.head_object(Bucket=S3_BUCKET, Key=blobstore.blob_path(meta["h"]), ChecksumMode='ENABLED')
+    except ClientError:
+        return json_error("upload_missing", 400)
+    expected = base64.b64encode(bytes.fromhex(meta["h"])).decode()
+    if head['ContentLength'] != meta["s"] or head.get('ChecksumSHA256', expected) != expected:
+        return json_error("content_mismatch", 400)
+    
+    conn = get_db_connection()
+    c = conn.cursor()
+    denied = check_ticket_access(c, ticket_id, u)
+    if denied:
+        conn.close()
+        return denied
+    record_attachment(conn, ticket_id, u, meta["f"], meta["m"], meta["s"], meta["h"])
+    conn.commit()
+    conn.close()
+    logger.info("Direct upload completed", ticket_id=ticket_id, sha256=meta["h"], size=meta["s"])
+    return jsonify({"ok": True, "filename": meta["f"], "size": meta["s"], "mime": meta["m"], "sha256": meta["h"]}), 201
+
+# Whole-table export without pagination: NDJSON (default) or CSV of the tickets the caller may
+# read, in id order, filtered by status/priority. Postgres streams from a named (server-side)
+# cursor, so worker memory stays flat for any table size.
+@app.get("/api/tickets/export")
+@login_required_json
+def api_export_tickets():
+    u = get_current_user()
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ticket_io.FORMATS:
+        return json_error("bad_format", 400)
+    postgres = DATABASE_URL.startswith('postgresql://')
+    owner = request.args.get("user_id", type=int) if is_admin_or_tech() else u["id"]
+    where, params = ticket_io.filters(request.args.get("status"), request.args.get("priority"), owner, postgres)
+    def generate():
+        # Own connection: the request's one goes back to the pool before the body is sent
+        conn = pool.getconn()
+        try:
+            yield from ticket_io.encode(ticket_io.export_rows(conn, postgres, where, params), fmt)
+        finally:
+            pool.putconn(conn)
+    logger.info("Ticket export started", user_id=u["id"], format=fmt)
+    return app.response_class(generate(), mimetype=ticket_io.FORMATS[fmt], headers={
+        "Content-Disposition": f'attachment; filename="tickets.{fmt}"', "X-Accel-Buffering": "no"})
+
+# Import NDJSON or CSV (export's columns) from the request body as it streams in, COPY on
+# Postgres. Records without user_id belong to ?owner= or the importing admin.
+@app.post("/api/tickets/import")
+@admin_required_json
+def api_import_tickets():
+    u = get_current_user()
+    fmt = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "ndjson")
+    if fmt not in ticket_io.FORMATS:
+        return json_error("bad_format", 400)
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    try:
+        result = ticket_io.import_tickets(get_db_connection(), ticket_io.read_records(stream, fmt),
+                                          postgres=DATABASE_URL.startswith('postgresql://'),
+                                          owner=request.args.get("owner", type=int) or u["id"], actor_id=u["id"])
+    except UnicodeDecodeError:
+        return json_error("bad_encoding", 400)
+    logger.info("Tickets imported", user_id=u["id"], format=fmt, imported=result["imported"], skipped=result["skipped"])
+    return jsonify(result)
+
+# Audit trail, newest first and keyset-paged on id. A time range (since/until) limits the
+# scan to the months it covers; the other filters use the per-partition indexes.
+@app.get("/api/audit")
+@login_required_json
+def api_audit_list():
+    if not is_admin_or_tech():
+        return json_error("forbidden", 403)
+    size = min(max(request.args.get("size", 20, type=int), 1), 100)
+    try:
+        filters = audit_log.parse_filters(request.args)
+    except ValueError as e:
+        return json_error(str(e), 400)
+    before_id = None
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            before_id = int(URLSafeSerializer(app.secret_key, salt="audit-cursor").loads(cursor))
+        except (BadSignature, ValueError, TypeError):
+            return json_error("bad_cursor", 400)
+    items = audit_log.fetch_page(get_db_connection(), filters, before_id, size + 1,
+                                 postgres=DATABASE_URL.startswith('postgresql://'))
+    next_cursor = None
+    if len(items) > size:
+        next_cursor = URLSafeSerializer(app.secret_key, salt="audit-cursor").dumps(items[size - 1]["id"])
+    return jsonify({"items": items[:size], "size": size, "next_cursor": next_cursor})
+
 # Health check endpoint
 @app.get("/health")
 def health_check():
@@ -496,11 +1085,17 @@ def health_check():
         conn = get_db_connection()
         c = conn.cursor()
         c.execute("SELECT 1")
+        outbox = mailer.outbox_depth(conn, DATABASE_URL.startswith('postgresql://'))
         conn.close()
-        return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+        return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat(),
+                        "db_pool": pool.stats(),
+                        "audit": audit_writer.stats() if audit_writer else {"mode": AUDIT_MODE},
+                        "email_outbox": outbox,
+                        "shared_state": shared_state.stats(),
+                        "password_hashing": passwords.stats()})
     except Exception as e:
         logger.error("Health check failed", error=str(e))
-        return jsonify({"status": "unhealthy", "error": str(e)}), 503
+        return jsonify({"status": "unhealthy", "error": str(e), "db_pool": pool.stats()}), 503
 
 # Add all other routes from original app.py with similar security enhancements...
 # (I'll continue with the remaining routes in the next part)
@@ -0,0 +1,154 @@
+"""
+Batched background writer for audit_log rows
+
+Events are queued in-process and a daemon thread flushes them with multi-row
+INSERTs once batch_size events are waiting or flush_interval seconds have
+passed. The queue is bounded: when it is full, submit() waits put_timeout
+seconds and then writes the event itself, so a slow database pushes back on
+the request instead of dropping audit rows. Pending events are flushed when
+the worker exits.
+"""
+import os
+import time
+import queue
+import atexit
+import threading
+
+COLUMNS = ("ts", "actor_id", "action", "entity", "entity_id", "details")
+# 6 columns x 100 rows stays under SQLite's default 999 bound-parameter limit
+ROWS_PER_STATEMENT = 100
+
+
+def insert_sql(rows, placeholder="?"):
+    group = "(" + ",".join([placeholder] * len(COLUMNS)) + ")"
+    return f"INSERT INTO audit_log({','.join(COLUMNS)}) VALUES " + ",".join([group] * rows)
+
+
+def chunks(events):
+    """(chunk, params) for multi-row INSERTs of a list of event tuples, ROWS_PER_STATEMENT at a time;
+    build the statement with insert_sql(len(chunk))
+    """
+    for i in range(0, len(events), ROWS_PER_STATEMENT):
+        chunk = events[i:i + ROWS_PER_STATEMENT]
+        yield chunk, [v for event in chunk for v in event]
+
+
+class AuditWriter:
+    def __init__(self, pool, placeholder="?", batch_size=200, flush_interval=1.0,
+                 max_queue=10000, put_timeout=0.5, logger=None):
+        self.pool = pool
+        self.placeholder = placeholder
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stats = {"written": 0, "batches": 0, "direct_writes": 0, "failed": 0}
+        atexit.register(self.stop)
+
+    def _ensure_started(self):
+        # Threads don't survive fork(), so each gunicorn worker starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, event):
+        """Queue one (ts, actor_id, action, entity, entity_id, details) tuple"""
+        self._ensure_started()
+        try:
+            self._queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            self._count("direct_writes", 1)
+            self._write([event])
+
+    def _count(self, key, n):
+        with self._lock:
+            self._stats[key] += n
+
+    def _write(self, batch):
+        try:
+            conn = self.pool.getconn()
+        except Exception as e:
+            self._count("failed", len(batch))
+            if self.logger:
+                self.logger.error("Audit batch write failed", error=str(e), events=len(batch))
+            return
+        try:
+            c = conn.cursor()
+            for chunk, params in chunks(batch):
+                c.execute(insert_sql(len(chunk), self.placeholder), params)
+            conn.commit()
+            self._count("written", len(batch))
+            self._count("batches", 1)
+        except Exception as e:
+            self._count("failed", len(batch))
+            if self.logger:
+                self.logger.error("Audit batch write failed", error=str(e), events=len(batch))
+        finally:
+            self.pool.putconn(conn)
+
+    def _drain(self, batch, limit):
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        if self._pid != os.getpid():
+            return
+        while True:
+            batch = self._drain([], self.batch_size)
+            if not batch:
+                return
+            self._write(batch)
+
+    def stop(self, timeout=5.0):
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        depth = self._queue.qsize() if self._pid == os.getpid() else 0
+        return dict(self._stats, queued=depth, max_queue=self.max_queue,
+                    batch_size=self.batch_size, flush_interval=self.flush_interval)
+
+
+def writer_from_env(pool, placeholder="?", logger=None):
+    """AuditWriter configured by AUDIT_BATCH_SIZE / AUDIT_FLUSH_INTERVAL / AUDIT_QUEUE_SIZE"""
+    return AuditWriter(
+        pool, placeholder=placeholder, logger=logger,
+        batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "200")),
+        flush_interval=float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0")),
+        max_queue=int(os.getenv("AUDIT_QUEUE_SIZE", "10000")),
+    )
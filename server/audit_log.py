@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+audit_log storage: monthly partitions, filtered reads and archival
+
+Postgres: audit_log is range-partitioned on ts, one partition per month
+(audit_log_pYYYYMM) plus audit_log_default for rows outside them. Queries
+with a time range only touch the matching months, and retiring a month is a
+DETACH + DROP rather than a DELETE over millions of rows.
+
+SQLite has no partitions, so writes keep going to audit_log and `maintain`
+rotates finished months into audit_log_pYYYYMM tables; reads merge the
+tables that a query's time range can touch.
+
+Every partition is indexed on (entity, entity_id, id), (actor_id, id),
+(action, id) and (ts). Pages are newest first and keyed on id, so a filtered
+page is a few index seeks however much history is kept.
+
+    python audit_log.py maintain      # next months' partitions / rotate; daily from cron
+    python audit_log.py archive --dest /var/backups/audit [--keep-months 12]
+
+archive writes each month older than the retention window to
+<dest>/audit_log_pYYYYMM.csv.gz, reads the file back to check the row count,
+appends it to <dest>/manifest.jsonl and only then drops the partition.
+"""
+import os
+import csv
+import gzip
+import json
+import hashlib
+import argparse
+from datetime import date, datetime
+
+COLUMNS = ("id", "ts", "actor_id", "action", "entity", "entity_id", "details")
+PREFIX = "audit_log_p"
+DEFAULT_PARTITION = "audit_log_default"
+INDEXES = {"entity": "entity, entity_id, id", "actor": "actor_id, id", "action": "action, id", "ts": "ts"}
+
+# Keep in sync with migrations/versions/010_audit_log_partitions.py
+POSTGRES_TABLE = """CREATE TABLE IF NOT EXISTS audit_log(
+    id BIGSERIAL,
+    ts TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    actor_id INTEGER,
+    action VARCHAR(50),
+    entity VARCHAR(50),
+    entity_id INTEGER,
+    details TEXT,
+    PRIMARY KEY (id, ts)
+) PARTITION BY RANGE (ts)"""
+
+SQLITE_TABLES = "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'audit_log_p%'"
+
+SQLITE_MONTH_TABLE = """CREATE TABLE IF NOT EXISTS {name}(
+    id INTEGER PRIMARY KEY,
+    ts TEXT,
+    actor_id INTEGER,
+    action TEXT,
+    entity TEXT,
+    entity_id INTEGER,
+    details TEXT
+)"""
+
+
+def index_ddl(table):
+    # On Postgres, indexes on the parent cascade to every partition
+    return [f"CREATE INDEX IF NOT EXISTS ix_{table}_{name} ON {table}({cols})" for name, cols in INDEXES.items()]
+
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def add_months(month, n):
+    years, m = divmod(month.month - 1 + n, 12)
+    return date(month.year + years, m + 1, 1)
+
+
+def partition_name(month):
+    return f"{PREFIX}{month:%Y%m}"
+
+
+def partition_month(name):
+    return datetime.strptime(name[len(PREFIX):], "%Y%m").date()
+
+
+def _tuple(row):
+    # RealDictCursor rows on Postgres, plain tuples on SQLite
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def _partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname='audit_log' AND relkind='p'")
+    return cursor.fetchone() is not None
+
+
+def init(cursor, postgres=False, today=None):
+    """Create audit_log (partitioned on Postgres) with its indexes and upcoming partitions"""
+    if postgres:
+        cursor.execute(POSTGRES_TABLE)
+        if not _partitioned(cursor):
+            # A pre-partitioning table; migration 010 converts it
+            for stmt in index_ddl("audit_log"):
+                cursor.execute(stmt)
+            return
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF audit_log DEFAULT")
+        for stmt in index_ddl("audit_log"):
+            cursor.execute(stmt)
+        ensure_partitions(cursor, today)
+    else:
+        for stmt in index_ddl("audit_log"):
+            cursor.execute(stmt)
+
+
+def partitions(cursor, postgres=False):
+    """Month partition (or rotated table) names, oldest first"""
+    if postgres:
+        cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                       "WHERE i.inhparent = 'audit_log'::regclass")
+    else:
+        cursor.execute(SQLITE_TABLES)
+    return month_tables(n for (n,) in map(_tuple, cursor.fetchall()))
+
+
+def month_tables(names):
+    return sorted(n for n in names if n.startswith(PREFIX) and n[len(PREFIX):].isdigit())
+
+
+def ensure_partitions(cursor, today=None, ahead=2):
+    """Postgres: create partitions through `ahead` months from now, and for any month
+    that rows in the default partition belong to (moving them in); returns the new names
+    """
+    existing = set(partitions(cursor, postgres=True))
+    first = month_start(today or date.today())
+    months = {add_months(first, i) for i in range(ahead + 1)}
+    cursor.execute(f"SELECT DISTINCT CAST(date_trunc('month', ts) AS DATE) FROM {DEFAULT_PARTITION}")
+    months.update(m for (m,) in map(_tuple, cursor.fetchall()))
+    created = []
+    for month in sorted(months):
+        name = partition_name(month)
+        if name in existing:
+            continue
+        lo, hi = month, add_months(month, 1)
+        # Built outside the table and attached, so rows parked in the default partition can move first
+        cursor.execute(f"CREATE TABLE {name} (LIKE audit_log INCLUDING DEFAULTS)")
+        cursor.execute(f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE ts >= %s AND ts < %s RETURNING *) "
+                       f"INSERT INTO {name} SELECT * FROM moved", (lo, hi))
+        cursor.execute(f"ALTER TABLE audit_log ATTACH PARTITION {name} FOR VALUES FROM ('{lo}') TO ('{hi}')")
+        created.append(name)
+    return created
+
+
+def rotate(conn, today=None):
+    """SQLite: move rows of finished months from audit_log into their month tables; returns {table: rows}"""
+    boundary = month_start(today or date.today()).isoformat()
+    c = conn.cursor()
+    c.execute("SELECT DISTINCT substr(ts, 1, 7) FROM audit_log WHERE ts < ?", (boundary,))
+    moved = {}
+    for (ym,) in sorted(r for r in c.fetchall() if r[0]):
+        month = datetime.strptime(ym, "%Y-%m").date()
+        name, lo, hi = partition_name(month), month.isoformat(), add_months(month, 1).isoformat()
+        c.execute(SQLITE_MONTH_TABLE.format(name=name))
+        for stmt in index_ddl(name):
+            c.execute(stmt)
+        c.execute(f"INSERT INTO {name} SELECT {','.join(COLUMNS)} FROM audit_log WHERE ts >= ? AND ts < ?", (lo, hi))
+        moved[name] = c.rowcount
+        c.execute("DELETE FROM audit_log WHERE ts >= ? AND ts < ?", (lo, hi))
+        conn.commit()
+    return moved
+
+
+def maintain(conn, postgres=False, today=None):
+    if postgres:
+        created = ensure_partitions(conn.cursor(), today)
+        conn.commit()
+        return {"created": created}
+    return {"rotated": rotate(conn, today)}
+
+
+def _parse_time(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"bad_{name}")
+
+
+def parse_filters(args):
+    """Filters from request args; raises ValueError with an API error code"""
+    filters = {}
+    for key in ("actor_id", "entity_id"):
+        if args.get(key):
+            try:
+                filters[key] = int(args[key])
+            except ValueError:
+                raise ValueError(f"bad_{key}")
+    for key in ("entity", "action"):
+        if args.get(key):
+            filters[key] = args[key]
+    for key in ("since", "until"):
+        if args.get(key):
+            filters[key] = _parse_time(args[key], key)
+    return filters
+
+
+def where_clause(filters, before_id=None, postgres=False):
+    p = "%s" if postgres else "?"
+    where, params = [], []
+    for key in ("actor_id", "entity", "entity_id", "action"):
+        if key in filters:
+            where.append(f"{key}={p}"); params.append(filters[key])
+    for key, op in (("since", ">="), ("until", "<")):
+        if key in filters:
+            where.append(f"ts {op} {p}")
+            params.append(filters[key] if postgres else filters[key].strftime("%Y-%m-%d %H:%M:%S"))
+    if before_id is not None:
+        where.append(f"id < {p}"); params.append(before_id)
+    return (" WHERE " + " AND ".join(where) if where else ""), params
+
+
+def _overlaps(name, since, until):
+    lo = datetime.combine(partition_month(name), datetime.min.time())
+    hi = datetime.combine(add_months(lo, 1), datetime.min.time())
+    return (since is None or hi > since) and (until is None or lo < until)
+
+
+def tables_for(months, filters):
+    """SQLite: the hot table, then the rotated months a query's time range can touch, newest first"""
+    return ["audit_log"] + [t for t in reversed(months) if _overlaps(t, filters.get("since"), filters.get("until"))]
+
+
+def union_query(tables, where, params, limit, postgres=False):
+    """(sql, params) for one newest-first page over several tables, each cut to `limit` by its own index scan"""
+    p = "%s" if postgres else "?"
+    select = f"SELECT {','.join(COLUMNS)} FROM {{}}{where} ORDER BY id DESC LIMIT {p}"
+    if len(tables) == 1:
+        return select.format(tables[0]), list(params) + [limit]
+    sql = " UNION ALL ".join(f"SELECT * FROM ({select.format(t)})" for t in tables) + f" ORDER BY id DESC LIMIT {p}"
+    return sql, (list(params) + [limit]) * len(tables) + [limit]
+
+
+def page_items(rows):
+    """Rows selected by union_query() as dicts with a string ts"""
+    return [dict(zip(COLUMNS, r), ts=str(r[1]) if r[1] is not None else None) for r in map(_tuple, rows)]
+
+
+def fetch_page(conn, filters, before_id=None, limit=50, postgres=False):
+    """Up to `limit` rows matching filters with id < before_id, newest first, as dicts"""
+    c = conn.cursor()
+    where, params = where_clause(filters, before_id, postgres)
+    # On Postgres, partition pruning on ts and per-partition index scans merged by id happen in the planner
+    tables = ["audit_log"] if postgres else tables_for(partitions(c), filters)
+    sql, args = union_query(tables, where, params, limit, postgres)
+    c.execute(sql, args)
+    return page_items(c.fetchall())
+
+
+def changes(before, after, fields):
+    """Structured audit details: JSON {field: [old, new]} for the fields that differ"""
+    return json.dumps({f: [before.get(f), after.get(f)] for f in fields if before.get(f) != after.get(f)},
+                      default=str, ensure_ascii=False)
+
+
+def timeline_entry(item):
+    """An audit row as a history entry; JSON details come back parsed as `changes`"""
+    details, diff = item["details"], None
+    if details and details.startswith("{"):
+        try:
+            diff = json.loads(details)
+        except ValueError:
+            pass
+    return {"id": item["id"], "ts": item["ts"], "actor_id": item["actor_id"], "action": item["action"],
+            "changes": diff, "details": None if diff is not None else details}
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def archive(conn, dest, keep_months=12, postgres=False, today=None):
+    """Move months before the newest keep_months (current included) to gzipped CSV files in dest; returns manifest entries"""
+    os.makedirs(dest, exist_ok=True)
+    cutoff = add_months(month_start(today or date.today()), -(max(keep_months, 1) - 1))
+    c = conn.cursor()
+    archived = []
+    for name in partitions(c, postgres):
+        if add_months(partition_month(name), 1) > cutoff:
+            continue
+        path = os.path.join(dest, f"{name}.csv.gz")
+        tmp = path + ".tmp"
+        if postgres:
+            # Nothing may land in the month between the copy and the drop
+            c.execute(f"LOCK TABLE {name} IN SHARE MODE")
+        c.execute(f"SELECT COUNT(*) FROM {name}")
+        expected = _tuple(c.fetchone())[0]
+        with gzip.open(tmp, "wt", newline="", encoding="utf-8") as f:
+            if postgres:
+                c.copy_expert(f"COPY (SELECT {','.join(COLUMNS)} FROM {name} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)", f)
+            else:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+                c.execute(f"SELECT {','.join(COLUMNS)} FROM {name} ORDER BY id")
+                for batch in iter(lambda: c.fetchmany(5000), []):
+                    writer.writerows(batch)
+        with gzip.open(tmp, "rt", newline="", encoding="utf-8") as f:
+            written = sum(1 for _ in csv.reader(f)) - 1
+        if written != expected:
+            os.remove(tmp)
+            conn.rollback()
+            raise RuntimeError(f"{name}: wrote {written} rows, expected {expected}; partition kept")
+        os.replace(tmp, path)
+        if postgres:
+            c.execute(f"ALTER TABLE audit_log DETACH PARTITION {name}")
+        c.execute(f"DROP TABLE {name}")
+        conn.commit()
+        entry = {"partition": name, "month": partition_month(name).strftime("%Y-%m"), "rows": expected,
+                 "file": os.path.basename(path), "bytes": os.path.getsize(path), "sha256": _sha256(path),
+                 "archived_at": datetime.now().isoformat(timespec="seconds")}
+        with open(os.path.join(dest, "manifest.jsonl"), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        archived.append(entry)
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit log partition maintenance")
+    parser.add_argument("command", choices=["maintain", "archive"])
+    parser.add_argument("--dest", help="archive directory")
+    parser.add_argument("--keep-months", type=int, default=int(os.getenv("AUDIT_KEEP_MONTHS", "12")),
+                        help="months kept in the database, counting the current one")
+    args = parser.parse_args()
+    if args.command == "archive" and not args.dest:
+        parser.error("archive needs --dest")
+
+    postgres = os.getenv('DATABASE_URL', '').startswith('postgresql://')
+    if postgres:
+        import app_production as helpdesk
+    else:
+        import app as helpdesk
+    conn = helpdesk.pool.getconn()
+    try:
+        # Rows still sitting in audit_log / the default partition get their month first
+        result = maintain(conn, postgres)
+        for name, n in result.get("rotated", {}).items():
+            print(f"Rotated {n} rows into {name}")
+        for name in result.get("created", []):
+            print(f"Created partition {name}")
+        if args.command == "archive":
+            for entry in archive(conn, args.dest, args.keep_months, postgres):
+                print(f"Archived {entry['partition']}: {entry['rows']} rows, {entry['bytes']} bytes -> {entry['file']}")
+    finally:
+        helpdesk.pool.putconn(conn)
+
+
+if __name__ == "__main__":
+    main()
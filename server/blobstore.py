@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Content-addressed attachment storage
+
+Attachment bytes are stored once per SHA-256 under blobs/<aa>/<sha256> (in the
+upload folder or as an S3 key) and tracked in the blobs table with a
+reference count; attachments rows point at the blob. Uploading a file that is
+already stored only bumps the count, and deleting an attachment decrements
+it. Blobs whose count reaches zero are removed by the garbage collector:
+
+    python blobstore.py gc [--grace 3600]
+    python blobstore.py migrate        # move legacy {hex}_{name} files into blobs/
+
+The upsert in store_upload() and the delete in collect_garbage() both take
+the blob row's lock, so a blob being re-uploaded is never collected under it.
+"""
+import os
+import time
+import hashlib
+import argparse
+from datetime import datetime
+
+BLOB_DIR = "blobs"
+
+
+def blob_path(sha256):
+    return f"{BLOB_DIR}/{sha256[:2]}/{sha256}"
+
+
+def _now(postgres):
+    return datetime.now() if postgres else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def acquire(conn, sha256, size, postgres=False):
+    """Insert or reference the blob row; returns the refcount after this reference"""
+    p = "%s" if postgres else "?"
+    c = conn.cursor()
+    c.execute(f"""INSERT INTO blobs(sha256, size, stored_path, refcount, created_at)
+                  VALUES({p}, {p}, {p}, 1, {p})
+                  ON CONFLICT(sha256) DO UPDATE SET refcount = blobs.refcount + 1
+                  RETURNING refcount""",
+              (sha256, size, blob_path(sha256), _now(postgres)))
+    row = c.fetchone()
+    return row['refcount'] if postgres else row[0]
+
+
+def store_upload(conn, sink, postgres=False):
+    """Put a streamed upload at its content address; returns the blob's stored path
+
+    The first reference writes the bytes; later ones discard the sink.
+    The caller commits the transaction.
+    """
+    path = blob_path(sink.sha256)
+    if acquire(conn, sink.sha256, sink.size, postgres) == 1:
+        sink.commit(path)
+    else:
+        sink.abort()
+    return path
+
+
+def release(conn, ticket_id, postgres=False):
+    """Drop the blob references held by a ticket's attachments and delete those rows"""
+    p = "%s" if postgres else "?"
+    c = conn.cursor()
+    c.execute(f"SELECT sha256 FROM attachments WHERE ticket_id={p} AND sha256 IS NOT NULL", (ticket_id,))
+    hashes = [r['sha256'] if postgres else r[0] for r in c.fetchall()]
+    for sha256 in hashes:
+        c.execute(f"UPDATE blobs SET refcount = refcount - 1 WHERE sha256={p}", (sha256,))
+    c.execute(f"DELETE FROM attachments WHERE ticket_id={p}", (ticket_id,))
+    return len(hashes)
+
+
+def collect_garbage(conn, folder=None, s3_client=None, bucket=None, postgres=False, grace=3600):
+    """Delete unreferenced blobs, plus orphaned blob files or objects and stale partial uploads older than grace"""
+    p = "%s" if postgres else "?"
+    c = conn.cursor()
+    c.execute("SELECT sha256, stored_path, size FROM blobs WHERE refcount <= 0")
+    candidates = [(r['sha256'], r['stored_path'], r['size']) if postgres else r for r in c.fetchall()]
+    removed, freed = 0, 0
+    for sha256, stored_path, size in candidates:
+        c.execute(f"DELETE FROM blobs WHERE sha256={p} AND refcount <= 0", (sha256,))
+        if c.rowcount != 1:
+            conn.commit()
+            continue
+        if s3_client is not None:
+            s3_client.delete_object(Bucket=bucket, Key=stored_path)
+        else:
+            try:
+                os.remove(os.path.join(folder, stored_path))
+            except FileNotFoundError:
+                pass
+        # Commit after the file or object is gone so a concurrent upload of the same content
+        # waits on the row lock and then writes it again
+        conn.commit()
+        removed += 1
+        freed += size or 0
+
+    orphans = 0
+    c.execute("SELECT sha256 FROM blobs")
+    known = {r['sha256'] if postgres else r[0] for r in c.fetchall()}
+    conn.rollback()
+    cutoff = time.time() - grace
+    if s3_client is not None:
+        # Presigned PUTs that never reached /attachments/complete leave objects without a
+        # row. Their completion tokens expire within an hour, so the default grace is safe.
+        pages = s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=BLOB_DIR + "/")
+        for page in pages:
+            for obj in page.get('Contents', []):
+                if obj['Key'].rsplit("/", 1)[-1] in known or obj['LastModified'].timestamp() >= cutoff:
+                    continue
+                s3_client.delete_object(Bucket=bucket, Key=obj['Key'])
+                freed += obj['Size']
+                orphans += 1
+        pages = s3_client.get_paginator('list_multipart_uploads').paginate(Bucket=bucket, Prefix=BLOB_DIR + "/")
+        for page in pages:
+            for upload in page.get('Uploads', []):
+                if upload['Initiated'].timestamp() < cutoff:
+                    s3_client.abort_multipart_upload(Bucket=bucket, Key=upload['Key'], UploadId=upload['UploadId'])
+    if folder:
+        for root, _, files in os.walk(folder):
+            for name in files:
+                full = os.path.join(root, name)
+                in_blobs = os.path.relpath(root, folder).split(os.sep)[0] == BLOB_DIR
+                stale_part = name.startswith(".upload-") and name.endswith(".part")
+                if not ((in_blobs and name not in known) or stale_part):
+                    continue
+                try:
+                    if os.path.getmtime(full) < cutoff:
+                        freed += os.path.getsize(full)
+                        os.remove(full)
+                        orphans += 1
+                except FileNotFoundError:
+                    pass
+    return {"removed_blobs": removed, "removed_orphans": orphans, "freed_bytes": freed}
+
+
+def migrate_legacy(conn, folder, postgres=False):
+    """Move pre-blob attachments ({hex}_{name} files) into content-addressed storage"""
+    p = "%s" if postgres else "?"
+    c = conn.cursor()
+    c.execute(f"SELECT id, stored_path FROM attachments WHERE stored_path NOT LIKE {p}", (BLOB_DIR + "/%",))
+    rows = [(r['id'], r['stored_path']) if postgres else r for r in c.fetchall()]
+    moved = 0
+    for att_id, stored in rows:
+        src = os.path.join(folder, stored or "")
+        if not stored or not os.path.isfile(src):
+            continue
+        h = hashlib.sha256()
+        with open(src, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        sha256 = h.hexdigest()
+        path = blob_path(sha256)
+        if acquire(conn, sha256, os.path.getsize(src), postgres) == 1:
+            os.makedirs(os.path.dirname(os.path.join(folder, path)), exist_ok=True)
+            os.replace(src, os.path.join(folder, path))
+        else:
+            os.remove(src)
+        c.execute(f"UPDATE attachments SET stored_path={p}, sha256={p} WHERE id={p}", (path, sha256, att_id))
+        conn.commit()
+        moved += 1
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attachment blob maintenance")
+    parser.add_argument("command", choices=["gc", "migrate"])
+    parser.add_argument("--grace", type=int, default=3600, help="seconds before orphaned files are removed")
+    args = parser.parse_args()
+
+    postgres = os.getenv('DATABASE_URL', '').startswith('postgresql://')
+    if postgres:
+        import app_production as helpdesk
+    else:
+        import app as helpdesk
+    s3_bucket = getattr(helpdesk, "S3_BUCKET", None)
+    conn = helpdesk.pool.getconn()
+    try:
+        if args.command == "gc":
+            result = collect_garbage(conn, folder=None if s3_bucket else helpdesk.app.config['UPLOAD_FOLDER'],
+                                     s3_client=getattr(helpdesk, "s3_client", None) if s3_bucket else None,
+                                     bucket=s3_bucket, postgres=postgres, grace=args.grace)
+            print(f"Removed {result['removed_blobs']} blobs and {result['removed_orphans']} orphaned files, "
+                  f"freed {result['freed_bytes']} bytes")
+        else:
+            print(f"Migrated {migrate_legacy(conn, helpdesk.app.config['UPLOAD_FOLDER'], postgres)} attachments")
+    finally:
+        helpdesk.pool.putconn(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Bulk ticket operations (POST /api/tickets/bulk)
+
+    {"op": "close", "ids": [12, 15, 19]}
+    {"op": "reopen", "ids": [...]}
+    {"op": "assign", "ids": [...], "user_id": 7}
+    {"op": "priority", "ids": [...], "priority": "High"}
+
+A request is one transaction with a fixed number of statements whatever the
+number of ids: one SELECT for existence, ownership and current values, one
+UPDATE ... WHERE id IN (...) RETURNING over the tickets that actually change,
+and multi-row audit_log INSERTs. Permissions match the single-ticket routes:
+assign needs an admin or tech, the other operations are also open to the
+ticket's owner. The response carries a result per requested id:
+
+    {"id": 12, "ok": true, "changed": true}
+    {"id": 15, "ok": true, "changed": false}    already in that state
+    {"id": 19, "error": "forbidden"}            or "not_found"
+"""
+import audit_log
+
+MAX_IDS = 500  # one IN list, inside SQLite's 999 bound-parameter limit
+PRIORITIES = ("Low", "Normal", "High")
+
+# op -> (column, audit action, change feed event, privileged only)
+OPS = {
+    "close": ("status", "close", "closed", False),
+    "reopen": ("status", "update", "updated", False),
+    "assign": ("assigned_to", "assign", "assigned", True),
+    "priority": ("priority", "update", "updated", False),
+}
+
+
+class BulkError(ValueError):
+    """Invalid request as a whole; str(e) is the API error code"""
+
+
+def parse(data):
+    """Validate a request body; returns (op, ids, new value)"""
+    if not isinstance(data, dict):
+        raise BulkError("bad_json")
+    op = data.get("op")
+    if op not in OPS:
+        raise BulkError("bad_op")
+    ids = data.get("ids")
+    if not isinstance(ids, list) or not ids:
+        raise BulkError("missing_ids")
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise BulkError("bad_ids")
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_IDS:
+        raise BulkError("too_many_ids")
+    if op == "close":
+        value = "Closed"
+    elif op == "reopen":
+        value = "Open"
+    elif op == "assign":
+        value = data.get("user_id")
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise BulkError("missing_user_id")
+    else:
+        value = data.get("priority")
+        if value not in PRIORITIES:
+            raise BulkError("bad_priority")
+    return op, ids, value
+
+
+def in_list(ids):
+    return ",".join("?" * len(ids))
+
+
+def select_sql(op, ids):
+    return f"SELECT id, user_id, {OPS[op][0]} FROM tickets WHERE id IN ({in_list(ids)})"
+
+
+def update_sql(op, ids, columns):
+    """SET the op's column and updated_at; params are (value, updated_at, *ids)"""
+    return f"UPDATE tickets SET {OPS[op][0]}=?, updated_at=? WHERE id IN ({in_list(ids)}) RETURNING {columns}"
+
+
+def plan(op, ids, value, rows, user, privileged):
+    """Split ids by outcome from (id, user_id, current value) rows
+
+    Returns (ids to UPDATE, {id: result}); results of updated ids are filled in
+    by the caller from what the UPDATE returned.
+    """
+    found = {r[0]: r for r in rows}
+    results, change = {}, []
+    for i in ids:
+        row = found.get(i)
+        if row is None:
+            results[i] = {"id": i, "error": "not_found"}
+        elif not privileged and (OPS[op][3] or row[1] != user["id"]):
+            results[i] = {"id": i, "error": "forbidden"}
+        elif row[2] == value:
+            results[i] = {"id": i, "ok": True, "changed": False}
+        else:
+            change.append(i)
+    return change, results
+
+
+def audit_details(op, old, new):
+    """Same {column: [old, new]} details as the single-ticket routes record"""
+    column = OPS[op][0]
+    return audit_log.changes({column: old}, {column: new}, (column,))
+
+
+def summary(op, ids, results):
+    items = [results[i] for i in ids]
+    return {"op": op, "results": items, "changed": sum(1 for r in items if r.get("changed")),
+            "failed": sum(1 for r in items if "error" in r)}
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Materialized ticket counters for dashboards (GET /api/tickets/stats)
+
+ticket_counts holds one row per (dim, val, status, priority) with the number
+of tickets in it, for three dimensions:
+
+    all       val ''             every ticket
+    owner     val user_id        tickets a user opened
+    assignee  val assigned_to    '' for unassigned tickets
+
+Triggers on tickets adjust the rows inside the transaction that creates,
+updates, closes, assigns or deletes a ticket, so every write path (including
+bulk updates) keeps them exact and reading stats never scans tickets.
+
+A ticket write applies its -1/+1 deltas in one upsert that sums them per key,
+skips keys whose deltas cancel and locks the remaining rows in key order. Two
+opposite transitions (Open->Closed and Closed->Open) therefore wait on each
+other instead of deadlocking. Rows are still locked until commit, so
+concurrent writers of tickets with the same status/priority queue on the
+'all' row; an append-only delta log would avoid that at the cost of summing
+on read.
+
+Counters can only drift through writes that bypass triggers (restores,
+manual fixes), so a periodic job recomputes them from tickets:
+
+    python counters.py reconcile       # e.g. nightly from cron
+"""
+import os
+import argparse
+
+DIMENSIONS = {"all": "''", "owner": "user_id", "assignee": "assigned_to"}
+
+CREATE_TABLE = """CREATE TABLE IF NOT EXISTS ticket_counts(
+    dim VARCHAR(10) NOT NULL,
+    val VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    priority VARCHAR(20) NOT NULL,
+    n INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dim, val, status, priority)
+)"""
+
+
+def _cols(dim, ref):
+    col = DIMENSIONS[dim]
+    val = col if col == "''" else f"coalesce(CAST({ref}.{col} AS TEXT), '')"
+    return [f"'{dim}'", val, f"coalesce({ref}.status, '')", f"coalesce({ref}.priority, '')"]
+
+
+def _key(dim, ref):
+    return ", ".join(_cols(dim, ref))
+
+
+def _apply(*sides):
+    """Upsert for (ref, sign) sides, one row per key in primary-key order"""
+    names = ("dim", "val", "status", "priority", "n")
+    deltas = " UNION ALL ".join(
+        "SELECT " + ", ".join(f"{expr} AS {name}" for expr, name in zip(_cols(dim, ref) + [str(sign)], names))
+        for ref, sign in sides for dim in DIMENSIONS)
+    # WHERE true: SQLite needs it to parse an upsert from a SELECT
+    return (f"INSERT INTO ticket_counts(dim, val, status, priority, n) "
+            f"SELECT dim, val, status, priority, SUM(n) FROM ({deltas}) AS d WHERE true "
+            f"GROUP BY dim, val, status, priority HAVING SUM(n) <> 0 ORDER BY dim, val, status, priority "
+            f"ON CONFLICT (dim, val, status, priority) DO UPDATE SET n = ticket_counts.n + excluded.n;")
+
+
+_CHANGED = " OR ".join(f"{{old}}.{c} IS {{op}} {{new}}.{c}" for c in ("status", "priority", "assigned_to", "user_id"))
+
+SQLITE_DDL = [
+    CREATE_TABLE,
+    # Recreated so databases created before the single-upsert form pick it up
+    "DROP TRIGGER IF EXISTS ticket_counts_ai",
+    f"CREATE TRIGGER ticket_counts_ai AFTER INSERT ON tickets BEGIN {_apply(('new', 1))} END",
+    "DROP TRIGGER IF EXISTS ticket_counts_ad",
+    f"CREATE TRIGGER ticket_counts_ad AFTER DELETE ON tickets BEGIN {_apply(('old', -1))} END",
+    "DROP TRIGGER IF EXISTS ticket_counts_au",
+    f"""CREATE TRIGGER ticket_counts_au AFTER UPDATE OF status, priority, assigned_to, user_id ON tickets
+        WHEN {_CHANGED.format(old='old', new='new', op='NOT')} BEGIN {_apply(('old', -1), ('new', 1))} END""",
+]
+
+# Keep in sync with migrations/versions/008_ticket_counts.py and 011_ticket_counts_single_upsert.py
+POSTGRES_DDL = [
+    CREATE_TABLE,
+    f"""CREATE OR REPLACE FUNCTION ticket_counts_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN {_apply(('NEW', 1))}
+        ELSIF TG_OP = 'DELETE' THEN {_apply(('OLD', -1))}
+        ELSE {_apply(('OLD', -1), ('NEW', 1))}
+        END IF;
+        RETURN NULL;
+    END $$""",
+    "DROP TRIGGER IF EXISTS ticket_counts_insert_delete ON tickets",
+    """CREATE TRIGGER ticket_counts_insert_delete AFTER INSERT OR DELETE ON tickets
+        FOR EACH ROW EXECUTE FUNCTION ticket_counts_apply()""",
+    "DROP TRIGGER IF EXISTS ticket_counts_update ON tickets",
+    f"""CREATE TRIGGER ticket_counts_update AFTER UPDATE OF status, priority, assigned_to, user_id ON tickets
+        FOR EACH ROW WHEN ({_CHANGED.format(old='OLD', new='NEW', op='DISTINCT FROM')})
+        EXECUTE FUNCTION ticket_counts_apply()""",
+]
+
+# Current counts computed from tickets, in ticket_counts column order
+ACTUAL_COUNTS = " UNION ALL ".join(
+    f"SELECT {_key(dim, 't')}, COUNT(*) FROM tickets t GROUP BY 2, 3, 4" for dim in DIMENSIONS)
+
+# Reads for the stats endpoint (? placeholders)
+SELECT_SCOPE = "SELECT status, priority, n FROM ticket_counts WHERE dim=? AND val=? AND n<>0"
+SELECT_ASSIGNEES = ("SELECT val, status, SUM(n) FROM ticket_counts WHERE dim='assignee' AND n<>0 "
+                    "GROUP BY val, status ORDER BY val")
+
+
+def _tuple(row):
+    # RealDictCursor rows on Postgres, plain tuples on SQLite
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def init(cursor, postgres=False):
+    """Create the counters and their triggers, backfilling them the first time"""
+    if postgres:
+        cursor.execute("SELECT to_regclass('ticket_counts') IS NOT NULL")
+        exists = _tuple(cursor.fetchone())[0]
+    else:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name='ticket_counts'")
+        exists = cursor.fetchone() is not None
+    for stmt in POSTGRES_DDL if postgres else SQLITE_DDL:
+        cursor.execute(stmt)
+    if not exists:
+        cursor.execute(f"INSERT INTO ticket_counts(dim, val, status, priority, n) {ACTUAL_COUNTS}")
+
+
+def summarize(rows):
+    """Totals from (status, priority, n) rows of one scope"""
+    by_status, by_priority, by_status_priority = {}, {}, {}
+    for status, priority, n in rows:
+        by_status[status] = by_status.get(status, 0) + n
+        by_priority[priority] = by_priority.get(priority, 0) + n
+        by_status_priority.setdefault(status, {})[priority] = n
+    return {"total": sum(by_status.values()), "by_status": by_status, "by_priority": by_priority,
+            "by_status_priority": by_status_priority}
+
+
+def assignees(rows):
+    """Per-assignee status totals from SELECT_ASSIGNEES rows; user_id None is the unassigned pool"""
+    result = {}
+    for val, status, n in rows:
+        entry = result.setdefault(val, {"user_id": int(val) if val else None, "total": 0, "by_status": {}})
+        entry["by_status"][status] = n
+        entry["total"] += n
+    return list(result.values())
+
+
+def reconcile(conn, postgres=False):
+    """Recompute every counter from tickets; returns the rows that had drifted.
+
+    Ticket writes are blocked (reads are not) while the tickets table is
+    counted, so no trigger update can slip in between the count and the swap.
+    """
+    c = conn.cursor()
+    if postgres:
+        c.execute("LOCK TABLE tickets IN SHARE ROW EXCLUSIVE MODE")
+    else:
+        conn.commit()
+        c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute(ACTUAL_COUNTS)
+        actual = {r[:4]: r[4] for r in map(_tuple, c.fetchall())}
+        c.execute("SELECT dim, val, status, priority, n FROM ticket_counts")
+        stored = {r[:4]: r[4] for r in map(_tuple, c.fetchall())}
+        drift = [key + (stored.get(key, 0), actual.get(key, 0)) for key in sorted(set(actual) | set(stored))
+                 if stored.get(key, 0) != actual.get(key, 0)]
+        c.execute("DELETE FROM ticket_counts")
+        c.execute(f"INSERT INTO ticket_counts(dim, val, status, priority, n) {ACTUAL_COUNTS}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ticket counter maintenance")
+    parser.add_argument("command", choices=["reconcile"])
+    parser.parse_args()
+
+    postgres = os.getenv('DATABASE_URL', '').startswith('postgresql://')
+    if postgres:
+        import app_production as helpdesk
+    else:
+        import app as helpdesk
+    conn = helpdesk.pool.getconn()
+    try:
+        drift = reconcile(conn, postgres)
+    finally:
+        helpdesk.pool.putconn(conn)
+    for dim, val, status, priority, stored, actual in drift:
+        print(f"{dim} {val or '-'} {status}/{priority}: {stored} -> {actual}")
+    print(f"Reconciled ticket counters, {len(drift)} rows corrected")
+
+
+if __name__ == "__main__":
+    main()
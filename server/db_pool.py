@@ -0,0 +1,234 @@
+"""
+Database connection pool shared by app.py and app_production.py
+
+One pool exists per process. Gunicorn forks its workers after importing the
+app, so the pool notices a PID change and starts over instead of sharing the
+parent's sockets. Inside a request the first db() call checks a connection
+out and stores it on flask.g; every later call in the same request gets the
+same connection back, and it is returned to the pool on app-context teardown.
+"""
+import os
+import time
+import threading
+from collections import deque
+
+from flask import g, has_app_context
+
+
+class PoolTimeout(Exception):
+    """No connection became available before the checkout timeout"""
+
+
+class PooledConnection:
+    """Proxy around a DB-API connection that returns it to the pool on close()
+
+    Request-scoped proxies ignore close() so the helpers that still call it
+    (log_action, get_current_user, ...) don't give the connection away before
+    the request is finished.
+    """
+
+    def __init__(self, pool, conn, shared=False):
+        self._pool = pool
+        self._conn = conn
+        self._shared = shared
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise RuntimeError("connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def close(self):
+        if not self._shared:
+            self.release()
+
+    def release(self):
+        if self._conn is not None:
+            self._pool.putconn(self._conn)
+            self._conn = None
+
+
+class ConnectionPool:
+    """Thread-safe pool with min/max size, checkout timeout and health checks"""
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=5.0,
+                 ping_after=30.0, max_idle=300.0, ping_sql="SELECT 1"):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.max_idle = max_idle
+        self.ping_sql = ping_sql
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = deque()  # (conn, returned_at)
+        self._in_use = 0
+        self._warm = False
+        self._counters = {"created": 0, "closed": 0, "checkouts": 0, "waits": 0,
+                          "timeouts": 0, "failed_pings": 0}
+
+    def _check_pid(self):
+        # Connections inherited across fork() belong to the parent; drop them unclosed.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._counters["closed"] += 1
+
+    def _healthy(self, conn, returned_at):
+        if getattr(conn, "closed", 0):
+            return False
+        if time.monotonic() - returned_at < self.ping_after:
+            return True
+        try:
+            c = conn.cursor()
+            c.execute(self.ping_sql)
+            c.fetchone()
+            c.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _warm_up(self):
+        self._warm = True
+        while self._in_use + len(self._idle) < self.min_size:
+            try:
+                conn = self._connect()
+            except Exception:
+                return
+            self._counters["created"] += 1
+            self._idle.append((conn, time.monotonic()))
+
+    def _prune(self):
+        # Drop connections idle for longer than max_idle, keeping min_size around.
+        now = time.monotonic()
+        stale = []
+        while (self._idle and len(self._idle) + self._in_use > self.min_size
+               and now - self._idle[0][1] > self.max_idle):
+            stale.append(self._idle.popleft()[0])
+        return stale
+
+    def getconn(self, timeout=None):
+        """Check out a raw connection, waiting up to timeout seconds for a free slot"""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            candidate = None
+            with self._cond:
+                self._check_pid()
+                if not self._warm:
+                    self._warm_up()
+                stale = self._prune()
+                while True:
+                    if self._idle:
+                        # LIFO keeps the most recently used connections hot
+                        candidate = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._in_use < self.max_size:
+                        self._in_use += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(f"no connection available within {self.timeout}s")
+                    self._counters["waits"] += 1
+                    self._cond.wait(remaining)
+            for conn in stale:
+                self._close(conn)
+
+            if candidate is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._give_back_slot()
+                    raise
+                with self._cond:
+                    self._counters["created"] += 1
+                    self._counters["checkouts"] += 1
+                return conn
+
+            conn, returned_at = candidate
+            if self._healthy(conn, returned_at):
+                with self._cond:
+                    self._counters["checkouts"] += 1
+                return conn
+            with self._cond:
+                self._counters["failed_pings"] += 1
+            self._close(conn)
+            self._give_back_slot()
+
+    def _give_back_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def putconn(self, conn, discard=False):
+        """Return a connection; uncommitted work is rolled back"""
+        if self._pid != os.getpid():
+            return
+        if not discard and not getattr(conn, "closed", 0):
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        else:
+            discard = True
+        if discard:
+            self._close(conn)
+            self._give_back_slot()
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._in_use -= 1
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            self._check_pid()
+            return dict(self._counters, pid=self._pid, min_size=self.min_size,
+                        max_size=self.max_size, idle=len(self._idle),
+                        in_use=self._in_use, size=len(self._idle) + self._in_use)
+
+
+def pool_from_env(connect, prefix="DB_POOL_"):
+    """Build a ConnectionPool sized by DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE / DB_POOL_TIMEOUT"""
+    return ConnectionPool(
+        connect,
+        min_size=int(os.getenv(prefix + "MIN_SIZE", "1")),
+        max_size=int(os.getenv(prefix + "MAX_SIZE", "10")),
+        timeout=float(os.getenv(prefix + "TIMEOUT", "5")),
+    )
+
+
+def request_connection(pool):
+    """Connection for the current request, or a private one outside of Flask"""
+    if not has_app_context():
+        return PooledConnection(pool, pool.getconn())
+    conn = g.get("_db_conn")
+    if conn is None:
+        conn = g._db_conn = PooledConnection(pool, pool.getconn(), shared=True)
+    return conn
+
+
+def init_app(app, pool):
+    """Return the request's connection to the pool when the app context ends"""
+    @app.teardown_appcontext
+    def _release_db_connection(exc):
+        conn = g.pop("_db_conn", None)
+        if conn is not None:
+            conn.release()
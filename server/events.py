@@ -0,0 +1,274 @@
+"""
+Ticket change feed for Server-Sent Events (GET /api/events)
+
+Mutation routes publish a small event after their commit; each process keeps
+a single upstream subscription and fans events out to its connected
+clients, so open browser tabs cost a queue each rather than a poll loop or
+a database connection:
+
+    postgres  NOTIFY/LISTEN on the ticket_events channel (one LISTEN connection)
+    redis     PUBLISH/SUBSCRIBE on the same channel name (needs REDIS_URL)
+    local     in-process only; fine for one worker or the dev server
+
+Clients only receive events for tickets they may read. Event ids are
+"<process epoch>-<seq>"; a reconnect with Last-Event-ID replays what was
+missed from a small buffer, or sends a "resync" event (reload everything)
+when the gap is gone or the client reconnected to another process.
+"""
+import os
+import json
+import time
+import queue
+import secrets
+import asyncio
+import threading
+from collections import deque
+
+CHANNEL = "ticket_events"
+BACKENDS = ("postgres", "redis", "local")
+
+
+def make_event(kind, ticket, actor_id=None):
+    """Event payload; small enough for pg_notify's 8000-byte limit"""
+    return {"type": f"ticket.{kind}", "id": ticket["id"], "title": ticket.get("title"),
+            "status": ticket.get("status"), "priority": ticket.get("priority"),
+            "assigned_to": ticket.get("assigned_to"), "user_id": ticket.get("user_id"),
+            "updated_at": str(ticket.get("updated_at")) if ticket.get("updated_at") else None,
+            "actor_id": actor_id}
+
+
+def visible(event, user):
+    """Same rule as ticket reads: admins and techs see everything, users their own tickets"""
+    return event["type"] == "resync" or user["role"] in ("admin", "tech") or event.get("user_id") == user["id"]
+
+
+def format_sse(event_id, name, data):
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Overflow(Exception):
+    """A subscriber fell too far behind; it is disconnected and catches up when it reconnects"""
+
+
+class _Subscriber:
+    def __init__(self, user, maxsize):
+        self.user = user
+        self.maxsize = maxsize
+        self.overflowed = False
+
+
+class AsyncSubscriber(_Subscriber):
+    def __init__(self, user, maxsize, loop):
+        super().__init__(user, maxsize)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def offer(self, item):
+        self.loop.call_soon_threadsafe(self._put, item)
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        if self.overflowed:
+            raise Overflow()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ThreadSubscriber(_Subscriber):
+    def __init__(self, user, maxsize):
+        super().__init__(user, maxsize)
+        self.queue = queue.Queue(maxsize)
+
+    def offer(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        if self.overflowed:
+            raise Overflow()
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Hub:
+    """Per-process fan-out of ticket events to SSE subscribers
+
+    dispatch() is thread-safe and may be called from the upstream listener,
+    request threads or the event loop. Subscribers get (event_id, event)
+    tuples for events they are allowed to see.
+    """
+
+    def __init__(self, buffer_size=1000, queue_size=100, max_clients=1000):
+        self.epoch = secrets.token_hex(4)
+        self.buffer = deque(maxlen=buffer_size)  # (seq, event)
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self._seq = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.dispatched = 0
+        self.overflows = 0
+
+    def dispatch(self, event):
+        with self._lock:
+            self._seq += 1
+            self.buffer.append((self._seq, event))
+            subscribers = list(self._subscribers)
+            event_id = f"{self.epoch}-{self._seq}"
+        self.dispatched += 1
+        for sub in subscribers:
+            if visible(event, sub.user):
+                sub.offer((event_id, event))
+
+    def subscribe(self, subscriber, last_event_id=None):
+        """Register a subscriber; returns the events to send first, or None when the hub is full
+
+        Missed events come back from the buffer; if they are gone (or the id is
+        from another process) the client gets a single resync event instead.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return None
+            self._subscribers.add(subscriber)
+            if not last_event_id:
+                return []
+            epoch, _, seq = last_event_id.partition("-")
+            oldest = self.buffer[0][0] if self.buffer else self._seq + 1
+            if epoch != self.epoch or not seq.isdigit() or int(seq) + 1 < oldest:
+                return [(f"{self.epoch}-{self._seq}", {"type": "resync"})]
+            return [(f"{self.epoch}-{s}", e) for s, e in self.buffer
+                    if s > int(seq) and visible(e, subscriber.user)]
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+        if subscriber.overflowed:
+            self.overflows += 1
+
+    def stats(self):
+        return {"clients": len(self._subscribers), "max_clients": self.max_clients, "dispatched": self.dispatched,
+                "buffered": len(self.buffer), "overflows": self.overflows, "epoch": self.epoch}
+
+
+def stream_lines(hub, subscriber, replay, heartbeat=15.0, max_age=300.0):
+    """Blocking SSE body for a ThreadSubscriber (Flask); ends after max_age so the client re-authenticates"""
+    try:
+        yield "retry: 3000\n\n"
+        for event_id, event in replay:
+            yield format_sse(event_id, event["type"], event)
+        deadline = time.monotonic() + max_age
+        while time.monotonic() < deadline:
+            try:
+                item = subscriber.get(min(heartbeat, deadline - time.monotonic()))
+            except Overflow:
+                return
+            if item is None:
+                yield ": ping\n\n"
+                continue
+            yield format_sse(item[0], item[1]["type"], item[1])
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+async def astream_lines(hub, subscriber, replay, heartbeat=15.0, max_age=300.0):
+    """Async twin of stream_lines for the ASGI app"""
+    try:
+        yield "retry: 3000\n\n"
+        for event_id, event in replay:
+            yield format_sse(event_id, event["type"], event)
+        deadline = time.monotonic() + max_age
+        while time.monotonic() < deadline:
+            try:
+                item = await subscriber.get(min(heartbeat, deadline - time.monotonic()))
+            except Overflow:
+                return
+            if item is None:
+                yield ": ping\n\n"
+                continue
+            yield format_sse(item[0], item[1]["type"], item[1])
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+async def listen_postgres(hub, url, logger=None, retry=5.0):
+    """Keep one LISTEN connection open and dispatch notifications until cancelled"""
+    import asyncpg
+
+    def on_notify(conn, pid, channel, payload):
+        try:
+            hub.dispatch(json.loads(payload))
+        except ValueError:
+            pass
+
+    while True:
+        try:
+            conn = await asyncpg.connect(url)
+            try:
+                await conn.add_listener(CHANNEL, on_notify)
+                # asyncpg delivers notifications in the background; just watch the connection
+                while not conn.is_closed():
+                    await asyncio.sleep(retry)
+                    await conn.execute("SELECT 1")
+            finally:
+                await conn.close()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if logger:
+                logger.warning("Ticket event listener disconnected", backend="postgres", error=str(e))
+            # Anything published meanwhile is lost; tell clients to reload
+            hub.dispatch({"type": "resync"})
+            await asyncio.sleep(retry)
+
+
+async def listen_redis(hub, url, logger=None, retry=5.0):
+    """Subscribe on Redis and dispatch messages until cancelled"""
+    import redis.asyncio
+    # Own client: the shared one has a sub-second socket_timeout, and a quiet channel is normal here
+    client = redis.asyncio.from_url(url, health_check_interval=30)
+    while True:
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        try:
+                            hub.dispatch(json.loads(message["data"]))
+                        except ValueError:
+                            pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if logger:
+                logger.warning("Ticket event listener disconnected", backend="redis", error=str(e))
+            hub.dispatch({"type": "resync"})
+            await asyncio.sleep(retry)
+
+
+def hub_from_env():
+    return Hub(buffer_size=int(os.getenv("EVENTS_BUFFER", "1000")),
+               queue_size=int(os.getenv("EVENTS_QUEUE_SIZE", "100")),
+               max_clients=int(os.getenv("EVENTS_MAX_CLIENTS", "1000")))
+
+
+def backend_from_env(postgres, redis_url):
+    """EVENTS_BACKEND, or the best the deployment has: Postgres NOTIFY, Redis pub/sub, in-process"""
+    backend = os.getenv("EVENTS_BACKEND", "auto").lower()
+    if backend == "auto":
+        return "postgres" if postgres else "redis" if redis_url else "local"
+    if backend not in BACKENDS:
+        raise ValueError(f"EVENTS_BACKEND must be one of {', '.join(BACKENDS)} or auto, not {backend!r}")
+    if backend == "postgres" and not postgres or backend == "redis" and not redis_url:
+        raise ValueError(f"EVENTS_BACKEND={backend} needs {'a PostgreSQL DATABASE_URL' if backend == 'postgres' else 'REDIS_URL'}")
+    return backend
@@ -0,0 +1,128 @@
+"""
+Password hashing off the request thread
+
+scrypt/pbkdf2 are meant to be slow, so a burst of logins can occupy every
+gunicorn worker and starve ticket traffic. PasswordHasher runs Werkzeug's
+hashing in a small process pool (PASSWORD_HASH_WORKERS, 0 hashes inline)
+and admits at most max_pending jobs; callers beyond that wait up to
+queue_timeout and then get HashingBusy, which the apps turn into a 503.
+
+The method string (e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000") sets
+the algorithm and cost. Stored hashes made with other parameters are
+reported by needs_rehash() so login can upgrade them transparently.
+"""
+import os
+import time
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue stays full for queue_timeout seconds"""
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class PasswordHasher:
+    def __init__(self, method="scrypt", salt_length=16, workers=0, max_pending=None, queue_timeout=2.0,
+                 samples=1000):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self.max_pending = max_pending or max(workers, 1) * 4
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._prefix = None
+        self._samples = deque(maxlen=samples)  # (wait, compute) seconds
+        self.calls = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    def _pool(self):
+        # A forked gunicorn worker must not share its parent's pool processes
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(self.workers,
+                                                         mp_context=multiprocessing.get_context("spawn"))
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        queued = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise HashingBusy()
+        try:
+            if self.workers > 0:
+                result, compute = self._pool().submit(_timed, fn, *args).result()
+            else:
+                result, compute = _timed(fn, *args)
+        finally:
+            self._slots.release()
+        total = time.perf_counter() - queued
+        with self._lock:
+            self.calls += 1
+            self._samples.append((total - compute, compute))
+        return result
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if pwhash was made with a different algorithm or cost than self.method"""
+        if self._prefix is None:
+            # Werkzeug fills in default cost parameters, so take the prefix from a real hash
+            self._prefix = generate_password_hash("", self.method, 1).split("$", 1)[0]
+        return pwhash.split("$", 1)[0] != self._prefix
+
+    def rehash(self, pwhash, password):
+        """New hash for a just-verified password if pwhash uses outdated parameters, else None"""
+        if not self.needs_rehash(pwhash):
+            return None
+        self.rehashed += 1
+        return self.hash(password)
+
+    def stats(self):
+        with self._lock:
+            samples = list(self._samples)
+        waits = sorted(s[0] for s in samples)
+        computes = sorted(s[1] for s in samples)
+
+        def pct(values, q):
+            return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2) if values else None
+
+        return {"method": self.method, "workers": self.workers, "max_pending": self.max_pending,
+                "calls": self.calls, "rejected": self.rejected, "rehashed": self.rehashed,
+                "wait_ms_p50": pct(waits, 0.5), "wait_ms_p95": pct(waits, 0.95),
+                "hash_ms_p50": pct(computes, 0.5), "hash_ms_p95": pct(computes, 0.95),
+                "hash_ms_max": pct(computes, 1.0)}
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._pid = None
+
+
+def hasher_from_env():
+    return PasswordHasher(
+        method=os.getenv("PASSWORD_HASH_METHOD", "scrypt"),
+        workers=int(os.getenv("PASSWORD_HASH_WORKERS", "0")),
+        max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "0")) or None,
+        queue_timeout=float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "2")),
+    )
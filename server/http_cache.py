@@ -0,0 +1,184 @@
+"""
+Conditional GETs and a response cache for ticket reads
+
+ticket_versions holds a counter per owner, bumped by triggers on tickets in
+the transaction that writes the ticket:
+
+    owner:<id>   one of that user's tickets changed (their lists and tickets)
+
+Lists seen by admins and techs (scope "all") use the sum of every owner
+counter: each ticket write adds at least one to it, so it changes whenever
+any ticket does. A dedicated 'all' row would be one hot row whose lock every
+ticket write holds until commit, serializing writers across all users. The
+sum instead costs the admin list an aggregate over the whole table (one row
+per ticket owner) on every request, revalidations included: about 0.7 ms per
+10,000 owners on SQLite, growing linearly.
+
+ETags combine the scope's version with whatever else shapes the body (query
+string, ticket id), so a client revalidating with If-None-Match gets a 304
+after a single primary-key lookup, before the list query runs or any row is
+serialized. ResponseCache entries are keyed by the same ETag: a write bumps
+the version, so older entries are never read again and simply expire.
+"""
+import os
+import json
+import hashlib
+
+import redis
+
+from cache import TTLCache
+
+CACHE_CONTROL = "private, no-cache"
+
+CREATE_TABLE = """CREATE TABLE IF NOT EXISTS ticket_versions(
+    scope VARCHAR(32) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+)"""
+
+
+def owner_scope_sql(ref):
+    return f"'owner:' || coalesce(CAST({ref}.user_id AS TEXT), '')"
+
+
+def _bump(scope):
+    return (f"INSERT INTO ticket_versions(scope, version) VALUES ({scope}, 1) "
+            f"ON CONFLICT (scope) DO UPDATE SET version = ticket_versions.version + 1;")
+
+
+SQLITE_DDL = [
+    CREATE_TABLE,
+    # Recreated so databases from before the per-owner sum stop bumping an 'all' row
+    "DROP TRIGGER IF EXISTS ticket_versions_ai",
+    f"""CREATE TRIGGER ticket_versions_ai AFTER INSERT ON tickets BEGIN
+        {_bump(owner_scope_sql('new'))} END""",
+    "DROP TRIGGER IF EXISTS ticket_versions_au",
+    f"""CREATE TRIGGER ticket_versions_au AFTER UPDATE ON tickets BEGIN
+        {_bump(owner_scope_sql('old'))}
+        INSERT INTO ticket_versions(scope, version) SELECT {owner_scope_sql('new')}, 1
+            WHERE new.user_id IS NOT old.user_id
+            ON CONFLICT (scope) DO UPDATE SET version = ticket_versions.version + 1; END""",
+    "DROP TRIGGER IF EXISTS ticket_versions_ad",
+    f"""CREATE TRIGGER ticket_versions_ad AFTER DELETE ON tickets BEGIN
+        {_bump(owner_scope_sql('old'))} END""",
+    "DELETE FROM ticket_versions WHERE scope = 'all'",
+]
+
+# Keep in sync with migrations/versions/009_ticket_versions.py and 012_ticket_versions_no_all_row.py
+POSTGRES_DDL = [
+    CREATE_TABLE,
+    f"""CREATE OR REPLACE FUNCTION ticket_versions_bump() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN {_bump(owner_scope_sql('OLD'))} END IF;
+        IF TG_OP = 'INSERT' THEN {_bump(owner_scope_sql('NEW'))}
+        ELSIF TG_OP = 'UPDATE' THEN
+            IF NEW.user_id IS DISTINCT FROM OLD.user_id THEN {_bump(owner_scope_sql('NEW'))} END IF;
+        END IF;
+        RETURN NULL;
+    END $$""",
+    "DROP TRIGGER IF EXISTS ticket_versions_bump ON tickets",
+    """CREATE TRIGGER ticket_versions_bump AFTER INSERT OR UPDATE OR DELETE ON tickets
+        FOR EACH ROW EXECUTE FUNCTION ticket_versions_bump()""",
+    "DELETE FROM ticket_versions WHERE scope = 'all'",
+]
+
+SELECT_VERSION = "SELECT version FROM ticket_versions WHERE scope=?"
+SELECT_ALL_VERSION = "SELECT SUM(version) FROM ticket_versions"
+
+
+def init(cursor, postgres=False):
+    """Create ticket_versions and the triggers that bump it"""
+    for stmt in POSTGRES_DDL if postgres else SQLITE_DDL:
+        cursor.execute(stmt)
+
+
+def list_scope(user, privileged):
+    return "all" if privileged else f"owner:{user['id']}"
+
+
+def version_query(scope):
+    """(sql, params) reading the version behind a list scope's ETag (? placeholders)"""
+    if scope == "all":
+        return SELECT_ALL_VERSION, ()
+    return SELECT_VERSION, (scope,)
+
+
+def etag(*parts):
+    """Weak ETag over the scope version and request details; the body is the same for equal parts"""
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def matches(if_none_match, tag):
+    """If-None-Match check with the weak comparison RFC 9110 prescribes for GET"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = tag[2:] if tag.startswith("W/") else tag
+    return any((t.strip()[2:] if t.strip().startswith("W/") else t.strip()) == bare for t in if_none_match.split(","))
+
+
+class ResponseCache:
+    """Serialized JSON bodies keyed by ETag
+
+    In-process by default; give it a redis.asyncio client (app_async with
+    REDIS_URL set) and entries are shared by every worker. A ttl of 0 turns it off.
+    """
+
+    def __init__(self, ttl=0.0, maxsize=2048, redis_client=None, prefix="resp:"):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis = redis_client
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _count(self, body):
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def get(self, key):
+        return self._count(self.local.get(key)) if self.enabled else None
+
+    def set(self, key, body):
+        self.local.set(key, body)
+
+    async def aget(self, key):
+        if not self.enabled:
+            return None
+        if self.redis is None:
+            return self.get(key)
+        try:
+            return self._count(await self.redis.get(self.prefix + key))
+        except redis.RedisError:
+            # Redis down: serve from the database rather than fail the read
+            self.errors += 1
+            return self._count(None)
+
+    async def aset(self, key, body):
+        if not self.enabled:
+            return
+        if self.redis is None:
+            self.set(key, body)
+            return
+        try:
+            await self.redis.set(self.prefix + key, body, ex=max(int(self.ttl), 1))
+        except redis.RedisError:
+            self.errors += 1
+
+    def stats(self):
+        return {"enabled": self.enabled, "shared": self.redis is not None, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses, "errors": self.errors, "local_size": len(self.local)}
+
+
+def cache_from_env():
+    return ResponseCache(ttl=float(os.getenv("RESPONSE_CACHE_TTL", "0")),
+                         maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "2048")))
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Outbound email queue
+
+Requests only insert a row into email_outbox. A MailWorker, either a thread
+inside each app worker (MAIL_WORKER=thread) or a standalone process
+(`python mailer.py`), claims pending rows in batches, sends them over a
+long-lived SMTP connection and retries failures with exponential backoff.
+
+For local testing, run an SMTP stand-in and disable STARTTLS:
+
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_SERVER=localhost SMTP_PORT=8025 SMTP_STARTTLS=false python mailer.py
+"""
+import os
+import time
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+
+def _fmt(dt, postgres):
+    return dt if postgres else dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def enqueue_email(conn, to_email, subject, body, postgres=False):
+    """Insert a message into the outbox on the given connection (caller commits)"""
+    c = conn.cursor()
+    now = _fmt(datetime.now(), postgres)
+    if postgres:
+        c.execute("INSERT INTO email_outbox(to_email, subject, body, status, attempts, next_attempt_at, created_at) "
+                  "VALUES(%s, %s, %s, 'pending', 0, %s, %s)", (to_email, subject, body, now, now))
+    else:
+        c.execute("INSERT INTO email_outbox(to_email, subject, body, status, attempts, next_attempt_at, created_at) "
+                  "VALUES(?, ?, ?, 'pending', 0, ?, ?)", (to_email, subject, body, now, now))
+
+
+def outbox_depth(conn, postgres=False):
+    """Number of queued messages per status"""
+    c = conn.cursor()
+    c.execute("SELECT status, COUNT(*) AS n FROM email_outbox GROUP BY status")
+    rows = c.fetchall()
+    if postgres:
+        return {r['status']: r['n'] for r in rows}
+    return {r[0]: r[1] for r in rows}
+
+
+class SMTPSender:
+    """Keeps one SMTP session open between batches and reconnects when it goes stale"""
+
+    def __init__(self, host, port=587, username=None, password=None, sender='noreply@helpdesk.local',
+                 starttls=True, keepalive=60.0, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.starttls = starttls
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self._smtp = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    def _session(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.keepalive:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self.close()
+            except smtplib.SMTPException:
+                self.close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def send(self, to_email, subject, body):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+        try:
+            self._session().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server dropped an idle session; retry once on a fresh one
+            self.close()
+            self._session().send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.keepalive:
+            self.close()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+
+class MailWorker:
+    """Claims batches from email_outbox and delivers them with retry/backoff"""
+
+    def __init__(self, pool, sender, postgres=False, batch_size=50, poll_interval=2.0,
+                 max_attempts=6, backoff_base=30.0, backoff_max=3600.0, claim_timeout=600.0, logger=None):
+        self.pool = pool
+        self.sender = sender
+        self.postgres = postgres
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.claim_timeout = claim_timeout
+        self.logger = logger
+        self._stop = threading.Event()
+        self._pid = None
+        self.sent = 0
+        self.failed = 0
+
+    def _log(self, level, event, **kw):
+        if self.logger:
+            getattr(self.logger, level)(event, **kw)
+
+    def _claim(self, conn):
+        now = datetime.now()
+        # Rows stuck in 'sending' belong to a worker that died mid-batch
+        stale = now - timedelta(seconds=self.claim_timeout)
+        c = conn.cursor()
+        if self.postgres:
+            c.execute("""UPDATE email_outbox SET status='sending', claimed_at=%s
+                         WHERE id IN (SELECT id FROM email_outbox
+                                      WHERE (status='pending' AND next_attempt_at <= %s)
+                                         OR (status='sending' AND claimed_at < %s)
+                                      ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED)
+                         RETURNING id, to_email, subject, body, attempts""",
+                      (now, now, stale, self.batch_size))
+            rows = [(r['id'], r['to_email'], r['subject'], r['body'], r['attempts']) for r in c.fetchall()]
+        else:
+            c.execute("""UPDATE email_outbox SET status='sending', claimed_at=?
+                         WHERE id IN (SELECT id FROM email_outbox
+                                      WHERE (status='pending' AND next_attempt_at <= ?)
+                                         OR (status='sending' AND claimed_at < ?)
+                                      ORDER BY id LIMIT ?)
+                         RETURNING id, to_email, subject, body, attempts""",
+                      (_fmt(now, False), _fmt(now, False), _fmt(stale, False), self.batch_size))
+            rows = c.fetchall()
+        conn.commit()
+        return rows
+
+    def _finish(self, conn, msg_id, attempts, error=None):
+        p = "%s" if self.postgres else "?"
+        c = conn.cursor()
+        if error is None:
+            c.execute(f"UPDATE email_outbox SET status='sent', sent_at={p}, attempts={p}, last_error=NULL WHERE id={p}",
+                      (_fmt(datetime.now(), self.postgres), attempts, msg_id))
+            return
+        status = 'failed' if attempts >= self.max_attempts else 'pending'
+        delay = min(self.backoff_base * (2 ** (attempts - 1)), self.backoff_max)
+        retry_at = _fmt(datetime.now() + timedelta(seconds=delay), self.postgres)
+        c.execute(f"UPDATE email_outbox SET status={p}, attempts={p}, next_attempt_at={p}, last_error={p} WHERE id={p}",
+                  (status, attempts, retry_at, error[:500], msg_id))
+
+    def run_once(self):
+        """Deliver one batch; returns the number of messages claimed"""
+        conn = self.pool.getconn()
+        try:
+            batch = self._claim(conn)
+            for msg_id, to_email, subject, body, attempts in batch:
+                try:
+                    self.sender.send(to_email, subject, body)
+                    self._finish(conn, msg_id, attempts + 1)
+                    self.sent += 1
+                    self._log("info", "Email sent successfully", to=to_email, subject=subject)
+                except Exception as e:
+                    self._finish(conn, msg_id, attempts + 1, str(e))
+                    self.failed += 1
+                    self._log("error", "Failed to send email", error=str(e), to=to_email, attempt=attempts + 1)
+                conn.commit()
+            return len(batch)
+        finally:
+            self.pool.putconn(conn)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                self._log("error", "Mail worker iteration failed", error=str(e))
+                claimed = 0
+            if claimed == 0:
+                self.sender.close_if_idle()
+            if claimed < self.batch_size:
+                self._stop.wait(self.poll_interval)
+        self.sender.close()
+
+    def start_thread(self):
+        """Start the worker in a daemon thread, once per process"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stop = threading.Event()
+        threading.Thread(target=self.run, name="mail-worker", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def sender_from_env():
+    return SMTPSender(
+        os.getenv('SMTP_SERVER'),
+        port=int(os.getenv('SMTP_PORT', '587')),
+        username=os.getenv('SMTP_USERNAME'),
+        password=os.getenv('SMTP_PASSWORD'),
+        sender=os.getenv('SMTP_FROM', 'noreply@helpdesk.local'),
+        starttls=os.getenv('SMTP_STARTTLS', 'true').lower() == 'true',
+        keepalive=float(os.getenv('SMTP_KEEPALIVE', '60')),
+    )
+
+
+def worker_from_env(pool, postgres=False, logger=None):
+    return MailWorker(
+        pool, sender_from_env(), postgres=postgres, logger=logger,
+        batch_size=int(os.getenv('MAIL_BATCH_SIZE', '50')),
+        poll_interval=float(os.getenv('MAIL_POLL_INTERVAL', '2')),
+        max_attempts=int(os.getenv('MAIL_MAX_ATTEMPTS', '6')),
+    )
+
+
+if __name__ == "__main__":
+    import app_production
+    worker = worker_from_env(app_production.pool, postgres=app_production.DATABASE_URL.startswith('postgresql://'),
+                             logger=app_production.logger)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
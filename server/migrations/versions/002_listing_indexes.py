@@ -0,0 +1,43 @@
+"""Indexes for ticket, attachment and audit access patterns
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Ticket list for a regular user: WHERE user_id=? [AND status=?] [AND priority=?] ORDER BY id DESC
+    op.create_index('ix_tickets_user_status_priority_id', 'tickets', ['user_id', 'status', 'priority', 'id'])
+    op.create_index('ix_tickets_user_priority_id', 'tickets', ['user_id', 'priority', 'id'])
+    # Admin/tech list: WHERE [status=?] [AND priority=?] ORDER BY id DESC
+    op.create_index('ix_tickets_status_priority_id', 'tickets', ['status', 'priority', 'id'])
+    op.create_index('ix_tickets_priority_id', 'tickets', ['priority', 'id'])
+    # Assignee queues
+    op.create_index('ix_tickets_assigned_status_id', 'tickets', ['assigned_to', 'status', 'id'])
+    # Attachments of a ticket, newest first
+    op.create_index('ix_attachments_ticket_id', 'attachments', ['ticket_id', 'id'])
+    # Audit entries of one entity (ticket history)
+    op.create_index('ix_audit_log_entity', 'audit_log', ['entity', 'entity_id', 'id'])
+    # Reset tokens are looked up by token (already UNIQUE); this serves per-user cleanup
+    op.create_index('ix_password_reset_tokens_user_expires', 'password_reset_tokens', ['user_id', 'expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_password_reset_tokens_user_expires', table_name='password_reset_tokens')
+    op.drop_index('ix_audit_log_entity', table_name='audit_log')
+    op.drop_index('ix_attachments_ticket_id', table_name='attachments')
+    op.drop_index('ix_tickets_assigned_status_id', table_name='tickets')
+    op.drop_index('ix_tickets_priority_id', table_name='tickets')
+    op.drop_index('ix_tickets_status_priority_id', table_name='tickets')
+    op.drop_index('ix_tickets_user_priority_id', table_name='tickets')
+    op.drop_index('ix_tickets_user_status_priority_id', table_name='tickets')
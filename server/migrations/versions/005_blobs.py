@@ -0,0 +1,33 @@
+"""Content-addressed attachment blobs
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=True),
+        sa.Column('stored_path', sa.String(length=500), nullable=True),
+        sa.Column('refcount', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+    op.create_index('ix_attachments_stored_path', 'attachments', ['stored_path'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_attachments_stored_path', table_name='attachments')
+    op.drop_table('blobs')
@@ -0,0 +1,31 @@
+"""Full-text search column on tickets
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Generated column: Postgres keeps it current on every INSERT/UPDATE of title or description
+    op.execute(
+        "ALTER TABLE tickets ADD COLUMN search tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED"
+    )
+    op.execute("CREATE INDEX ix_tickets_search ON tickets USING GIN (search)")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tickets_search', table_name='tickets')
+    op.drop_column('tickets', 'search')
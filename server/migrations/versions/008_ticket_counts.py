@@ -0,0 +1,61 @@
+"""Materialized ticket counters
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+DIMENSIONS = (("all", "''"), ("owner", "user_id"), ("assignee", "assigned_to"))
+
+
+def _key(ref, col):
+    val = col if col == "''" else f"coalesce(CAST({ref}.{col} AS TEXT), '')"
+    return f"{val}, coalesce({ref}.status, ''), coalesce({ref}.priority, '')"
+
+
+def _apply(ref, sign):
+    rows = ", ".join(f"('{dim}', {_key(ref, col)}, {sign})" for dim, col in DIMENSIONS)
+    return (f"INSERT INTO ticket_counts(dim, val, status, priority, n) VALUES {rows} "
+            f"ON CONFLICT (dim, val, status, priority) DO UPDATE SET n = ticket_counts.n + excluded.n;")
+
+
+def upgrade() -> None:
+    op.create_table('ticket_counts',
+        sa.Column('dim', sa.String(length=10), nullable=False),
+        sa.Column('val', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('priority', sa.String(length=20), nullable=False),
+        sa.Column('n', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('dim', 'val', 'status', 'priority')
+    )
+    op.execute(f"""CREATE OR REPLACE FUNCTION ticket_counts_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN {_apply('OLD', -1)} END IF;
+        IF TG_OP <> 'DELETE' THEN {_apply('NEW', 1)} END IF;
+        RETURN NULL;
+    END $$""")
+    op.execute("""CREATE TRIGGER ticket_counts_insert_delete AFTER INSERT OR DELETE ON tickets
+        FOR EACH ROW EXECUTE FUNCTION ticket_counts_apply()""")
+    changed = " OR ".join(f"OLD.{c} IS DISTINCT FROM NEW.{c}" for c in ("status", "priority", "assigned_to", "user_id"))
+    op.execute(f"""CREATE TRIGGER ticket_counts_update AFTER UPDATE OF status, priority, assigned_to, user_id ON tickets
+        FOR EACH ROW WHEN ({changed}) EXECUTE FUNCTION ticket_counts_apply()""")
+    # Backfill from existing tickets
+    op.execute("INSERT INTO ticket_counts(dim, val, status, priority, n) " + " UNION ALL ".join(
+        f"SELECT '{dim}', {_key('t', col)}, COUNT(*) FROM tickets t GROUP BY 2, 3, 4" for dim, col in DIMENSIONS))
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS ticket_counts_update ON tickets")
+    op.execute("DROP TRIGGER IF EXISTS ticket_counts_insert_delete ON tickets")
+    op.execute("DROP FUNCTION IF EXISTS ticket_counts_apply()")
+    op.drop_table('ticket_counts')
@@ -0,0 +1,51 @@
+"""Per-scope ticket versions for ETags
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def _bump(scope):
+    return (f"INSERT INTO ticket_versions(scope, version) VALUES ({scope}, 1) "
+            f"ON CONFLICT (scope) DO UPDATE SET version = ticket_versions.version + 1;")
+
+
+def _owner(ref):
+    return f"'owner:' || coalesce(CAST({ref}.user_id AS TEXT), '')"
+
+
+def upgrade() -> None:
+    op.create_table('ticket_versions',
+        sa.Column('scope', sa.String(length=32), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('scope')
+    )
+    op.execute(f"""CREATE OR REPLACE FUNCTION ticket_versions_bump() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        {_bump("'all'")}
+        IF TG_OP <> 'INSERT' THEN {_bump(_owner('OLD'))} END IF;
+        IF TG_OP = 'INSERT' THEN {_bump(_owner('NEW'))}
+        ELSIF TG_OP = 'UPDATE' THEN
+            IF NEW.user_id IS DISTINCT FROM OLD.user_id THEN {_bump(_owner('NEW'))} END IF;
+        END IF;
+        RETURN NULL;
+    END $$""")
+    op.execute("""CREATE TRIGGER ticket_versions_bump AFTER INSERT OR UPDATE OR DELETE ON tickets
+        FOR EACH ROW EXECUTE FUNCTION ticket_versions_bump()""")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS ticket_versions_bump ON tickets")
+    op.execute("DROP FUNCTION IF EXISTS ticket_versions_bump()")
+    op.drop_table('ticket_versions')
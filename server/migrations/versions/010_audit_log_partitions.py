@@ -0,0 +1,77 @@
+"""Partition audit_log by month
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+# Same as audit_log.INDEXES
+INDEXES = {"entity": "entity, entity_id, id", "actor": "actor_id, id", "action": "action, id", "ts": "ts"}
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE audit_log RENAME TO audit_log_unpartitioned")
+    op.execute("ALTER TABLE audit_log_unpartitioned RENAME CONSTRAINT audit_log_pkey TO audit_log_unpartitioned_pkey")
+    op.execute("ALTER INDEX IF EXISTS ix_audit_log_entity RENAME TO ix_audit_log_unpartitioned_entity")
+    # Keep the id sequence so ids carry on from where they were
+    op.execute("ALTER SEQUENCE audit_log_id_seq OWNED BY NONE")
+    op.execute("ALTER SEQUENCE audit_log_id_seq AS BIGINT")
+    op.execute("""CREATE TABLE audit_log(
+        id BIGINT NOT NULL DEFAULT nextval('audit_log_id_seq'),
+        ts TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        actor_id INTEGER,
+        action VARCHAR(50),
+        entity VARCHAR(50),
+        entity_id INTEGER,
+        details TEXT,
+        PRIMARY KEY (id, ts)
+    ) PARTITION BY RANGE (ts)""")
+    op.execute("CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT")
+    for name, cols in INDEXES.items():
+        op.execute(f"CREATE INDEX ix_audit_log_{name} ON audit_log({cols})")
+    # One partition per month from the oldest row through two months ahead
+    op.execute("""DO $$
+    DECLARE
+        m DATE := date_trunc('month', coalesce((SELECT min(ts) FROM audit_log_unpartitioned), now()));
+        last DATE := date_trunc('month', now()) + interval '2 months';
+    BEGIN
+        WHILE m <= last LOOP
+            EXECUTE format('CREATE TABLE audit_log_p%s PARTITION OF audit_log FOR VALUES FROM (%L) TO (%L)',
+                           to_char(m, 'YYYYMM'), m, m + interval '1 month');
+            m := m + interval '1 month';
+        END LOOP;
+    END $$""")
+    op.execute("""INSERT INTO audit_log(id, ts, actor_id, action, entity, entity_id, details)
+        SELECT id, coalesce(ts, now()), actor_id, action, entity, entity_id, details FROM audit_log_unpartitioned""")
+    op.execute("ALTER SEQUENCE audit_log_id_seq OWNED BY audit_log.id")
+    op.execute("DROP TABLE audit_log_unpartitioned")
+
+
+def downgrade() -> None:
+    op.execute("ALTER SEQUENCE audit_log_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE audit_log RENAME TO audit_log_partitioned")
+    op.execute("""CREATE TABLE audit_log(
+        id INTEGER NOT NULL DEFAULT nextval('audit_log_id_seq'),
+        ts TIMESTAMP,
+        actor_id INTEGER,
+        action VARCHAR(50),
+        entity VARCHAR(50),
+        entity_id INTEGER,
+        details TEXT,
+        CONSTRAINT audit_log_pkey PRIMARY KEY (id)
+    )""")
+    op.execute("""INSERT INTO audit_log(id, ts, actor_id, action, entity, entity_id, details)
+        SELECT id, ts, actor_id, action, entity, entity_id, details FROM audit_log_partitioned""")
+    op.execute("ALTER SEQUENCE audit_log_id_seq OWNED BY audit_log.id")
+    # Drops every partition with it
+    op.execute("DROP TABLE audit_log_partitioned")
+    op.execute("CREATE INDEX ix_audit_log_entity ON audit_log(entity, entity_id, id)")
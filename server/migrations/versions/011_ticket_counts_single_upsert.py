@@ -0,0 +1,60 @@
+"""Apply ticket counter deltas in one key-ordered upsert
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+DIMENSIONS = (("all", "''"), ("owner", "user_id"), ("assignee", "assigned_to"))
+NAMES = ("dim", "val", "status", "priority", "n")
+
+
+def _cols(ref, dim, col):
+    val = col if col == "''" else f"coalesce(CAST({ref}.{col} AS TEXT), '')"
+    return [f"'{dim}'", val, f"coalesce({ref}.status, '')", f"coalesce({ref}.priority, '')"]
+
+
+def _apply(*sides):
+    # Same as counters._apply
+    deltas = " UNION ALL ".join(
+        "SELECT " + ", ".join(f"{expr} AS {name}" for expr, name in zip(_cols(ref, dim, col) + [str(sign)], NAMES))
+        for ref, sign in sides for dim, col in DIMENSIONS)
+    return (f"INSERT INTO ticket_counts(dim, val, status, priority, n) "
+            f"SELECT dim, val, status, priority, SUM(n) FROM ({deltas}) AS d WHERE true "
+            f"GROUP BY dim, val, status, priority HAVING SUM(n) <> 0 ORDER BY dim, val, status, priority "
+            f"ON CONFLICT (dim, val, status, priority) DO UPDATE SET n = ticket_counts.n + excluded.n;")
+
+
+def _apply_008(ref, sign):
+    rows = ", ".join(f"({', '.join(_cols(ref, dim, col))}, {sign})" for dim, col in DIMENSIONS)
+    return (f"INSERT INTO ticket_counts(dim, val, status, priority, n) VALUES {rows} "
+            f"ON CONFLICT (dim, val, status, priority) DO UPDATE SET n = ticket_counts.n + excluded.n;")
+
+
+def upgrade() -> None:
+    op.execute(f"""CREATE OR REPLACE FUNCTION ticket_counts_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN {_apply(('NEW', 1))}
+        ELSIF TG_OP = 'DELETE' THEN {_apply(('OLD', -1))}
+        ELSE {_apply(('OLD', -1), ('NEW', 1))}
+        END IF;
+        RETURN NULL;
+    END $$""")
+
+
+def downgrade() -> None:
+    op.execute(f"""CREATE OR REPLACE FUNCTION ticket_counts_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN {_apply_008('OLD', -1)} END IF;
+        IF TG_OP <> 'DELETE' THEN {_apply_008('NEW', 1)} END IF;
+        RETURN NULL;
+    END $$""")
@@ -0,0 +1,48 @@
+"""Stop bumping the 'all' ticket version; admin list ETags sum the owner versions
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def _bump(scope):
+    return (f"INSERT INTO ticket_versions(scope, version) VALUES ({scope}, 1) "
+            f"ON CONFLICT (scope) DO UPDATE SET version = ticket_versions.version + 1;")
+
+
+def _owner(ref):
+    return f"'owner:' || coalesce(CAST({ref}.user_id AS TEXT), '')"
+
+
+def _function(all_row):
+    return f"""CREATE OR REPLACE FUNCTION ticket_versions_bump() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        {_bump("'all'") if all_row else ''}
+        IF TG_OP <> 'INSERT' THEN {_bump(_owner('OLD'))} END IF;
+        IF TG_OP = 'INSERT' THEN {_bump(_owner('NEW'))}
+        ELSIF TG_OP = 'UPDATE' THEN
+            IF NEW.user_id IS DISTINCT FROM OLD.user_id THEN {_bump(_owner('NEW'))} END IF;
+        END IF;
+        RETURN NULL;
+    END $$"""
+
+
+def upgrade() -> None:
+    op.execute(_function(all_row=False))
+    op.execute("DELETE FROM ticket_versions WHERE scope = 'all'")
+
+
+def downgrade() -> None:
+    op.execute(_function(all_row=True))
+    op.execute("""INSERT INTO ticket_versions(scope, version)
+        SELECT 'all', coalesce(SUM(version), 0) FROM ticket_versions""")
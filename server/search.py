@@ -0,0 +1,76 @@
+"""
+Full-text search over ticket titles and descriptions
+
+SQLite keeps a tickets_fts FTS5 index in sync with triggers; Postgres uses
+a generated tickets.search tsvector (title weighted A, description B) with a
+GIN index. User input is reduced to word tokens, so neither engine ever sees
+raw query syntax, and every token is matched as a prefix ("prin" finds
+"printer"). Highlights come back wrapped in MARK_START/MARK_END and are
+turned into <mark> tags only after the ticket text has been HTML-escaped.
+"""
+import re
+import html
+
+MAX_TERMS = 8
+MARK_START, MARK_END = "\x02", "\x03"
+# ts_headline options: whole title, up to two short fragments of the description
+PG_HEADLINE_TITLE = f"StartSel={MARK_START}, StopSel={MARK_END}, HighlightAll=true"
+PG_HEADLINE_SNIPPET = (f"StartSel={MARK_START}, StopSel={MARK_END}, MinWords=6, MaxWords=16, "
+                       "MaxFragments=2, FragmentDelimiter=\" … \"")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# SQLite: external-content FTS5 table plus triggers; rebuild() backfills existing rows
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+        title, description, content='tickets', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS tickets_fts_ai AFTER INSERT ON tickets BEGIN
+        INSERT INTO tickets_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tickets_fts_ad AFTER DELETE ON tickets BEGIN
+        INSERT INTO tickets_fts(tickets_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tickets_fts_au AFTER UPDATE OF title, description ON tickets BEGIN
+        INSERT INTO tickets_fts(tickets_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tickets_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+# Postgres: keep in sync with migrations/versions/007_ticket_search.py
+POSTGRES_DDL = [
+    """ALTER TABLE tickets ADD COLUMN IF NOT EXISTS search tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_tickets_search ON tickets USING GIN (search)",
+]
+
+
+def init_sqlite(cursor):
+    """Create the FTS5 index and triggers, backfilling it the first time"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name='tickets_fts'")
+    exists = cursor.fetchone() is not None
+    for stmt in SQLITE_DDL:
+        cursor.execute(stmt)
+    if not exists:
+        cursor.execute("INSERT INTO tickets_fts(tickets_fts) VALUES ('rebuild')")
+
+
+def terms(q):
+    return _WORD.findall((q or "").lower())[:MAX_TERMS]
+
+
+def fts5_query(words):
+    # Quoted so FTS5 operators (AND, NEAR, column filters, ...) in user input are plain words
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def tsquery(words):
+    # \w+ tokens are safe inside to_tsquery; :* makes each one a prefix match
+    return " & ".join(f"{w}:*" for w in words)
+
+
+def mark(text):
+    """HTML-escape a highlighted fragment and turn the match markers into <mark> tags"""
+    if text is None:
+        return None
+    return html.escape(text).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
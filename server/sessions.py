@@ -0,0 +1,141 @@
+"""
+Server-side session store holding the resolved user context
+
+With SESSION_BACKEND=redis or db, login creates a server-side session
+{id, username, role} and the signed cookie carries its random sid next to
+user_id. Each request resolves the user with a single store lookup that also
+slides the expiry. Role changes rewrite the role in all of that user's
+sessions; a password reset revokes them. Cookies without a sid (issued
+before the backend was enabled) keep resolving through the users table.
+"""
+import json
+import secrets
+from datetime import datetime, timedelta
+
+
+def new_sid():
+    return secrets.token_urlsafe(32)
+
+
+class RedisSessionStore:
+    """sess:<sid> holds the JSON context; user_sess:<uid> indexes a user's sids"""
+
+    def __init__(self, client, ttl):
+        self.client = client
+        self.ttl = int(ttl.total_seconds()) if isinstance(ttl, timedelta) else int(ttl)
+
+    @staticmethod
+    def key(sid):
+        return f"sess:{sid}"
+
+    def create(self, user):
+        sid = new_sid()
+        ctx = {"id": user["id"], "username": user["username"], "role": user["role"]}
+        pipe = self.client.pipeline()
+        pipe.set(self.key(sid), json.dumps(ctx), ex=self.ttl)
+        pipe.sadd(f"user_sess:{user['id']}", sid)
+        pipe.expire(f"user_sess:{user['id']}", self.ttl)
+        pipe.execute()
+        return sid
+
+    def get(self, sid):
+        if not sid:
+            return None
+        raw = self.client.getex(self.key(sid), ex=self.ttl)
+        return json.loads(raw) if raw else None
+
+    def delete(self, sid, user_id=None):
+        pipe = self.client.pipeline()
+        pipe.delete(self.key(sid))
+        if user_id is not None:
+            pipe.srem(f"user_sess:{user_id}", sid)
+        pipe.execute()
+
+    def update_user(self, user_id, **fields):
+        sids = self.client.smembers(f"user_sess:{user_id}")
+        for sid in sids:
+            sid = sid.decode() if isinstance(sid, bytes) else sid
+            raw = self.client.get(self.key(sid))
+            if raw:
+                ctx = dict(json.loads(raw), **fields)
+                self.client.set(self.key(sid), json.dumps(ctx), keepttl=True)
+
+    def revoke_user(self, user_id):
+        sids = self.client.smembers(f"user_sess:{user_id}")
+        keys = [self.key(s.decode() if isinstance(s, bytes) else s) for s in sids]
+        self.client.delete(*keys, f"user_sess:{user_id}")
+
+
+class DBSessionStore:
+    """Sessions in the user_sessions table; expiry is extended once half of it has passed"""
+
+    def __init__(self, get_conn, ttl, postgres=False):
+        self.get_conn = get_conn
+        self.ttl = ttl if isinstance(ttl, timedelta) else timedelta(seconds=ttl)
+        self.postgres = postgres
+        self.p = "%s" if postgres else "?"
+
+    def encode_ts(self, dt):
+        return dt if self.postgres else dt.strftime("%Y-%m-%d %H:%M:%S")
+
+    def decode_ts(self, value):
+        return value if isinstance(value, datetime) else datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+
+    def create(self, user):
+        sid = new_sid()
+        p = self.p
+        conn = self.get_conn()
+        c = conn.cursor()
+        c.execute(f"INSERT INTO user_sessions(sid, user_id, username, role, expires_at) VALUES({p},{p},{p},{p},{p})",
+                  (sid, user["id"], user["username"], user["role"], self.encode_ts(datetime.now() + self.ttl)))
+        conn.commit()
+        conn.close()
+        return sid
+
+    def get(self, sid):
+        if not sid:
+            return None
+        p = self.p
+        now = datetime.now()
+        conn = self.get_conn()
+        c = conn.cursor()
+        c.execute(f"SELECT user_id, username, role, expires_at FROM user_sessions WHERE sid={p}", (sid,))
+        row = c.fetchone()
+        if row is not None and self.postgres:
+            row = (row['user_id'], row['username'], row['role'], row['expires_at'])
+        if not row or self.decode_ts(row[3]) <= now:
+            conn.close()
+            return None
+        if self.decode_ts(row[3]) - now < self.ttl / 2:
+            c.execute(f"UPDATE user_sessions SET expires_at={p} WHERE sid={p}", (self.encode_ts(now + self.ttl), sid))
+            conn.commit()
+        conn.close()
+        return {"id": row[0], "username": row[1], "role": row[2]}
+
+    def delete(self, sid, user_id=None):
+        conn = self.get_conn()
+        conn.cursor().execute(f"DELETE FROM user_sessions WHERE sid={self.p}", (sid,))
+        conn.commit()
+        conn.close()
+
+    def update_user(self, user_id, **fields):
+        p = self.p
+        conn = self.get_conn()
+        for col, value in fields.items():
+            conn.cursor().execute(f"UPDATE user_sessions SET {col}={p} WHERE user_id={p}", (value, user_id))
+        conn.commit()
+        conn.close()
+
+    def revoke_user(self, user_id):
+        conn = self.get_conn()
+        conn.cursor().execute(f"DELETE FROM user_sessions WHERE user_id={self.p}", (user_id,))
+        conn.commit()
+        conn.close()
+
+    def purge_expired(self):
+        conn = self.get_conn()
+        c = conn.cursor()
+        c.execute(f"DELETE FROM user_sessions WHERE expires_at <= {self.p}", (self.encode_ts(datetime.now()),))
+        conn.commit()
+        conn.close()
+        return c.rowcount
@@ -0,0 +1,99 @@
+"""
+State shared across gunicorn workers and containers, backed by Redis
+
+One redis.ConnectionPool per process is shared by the rate limiter and by
+SharedState, which holds the user cache generations (app_production's
+invalidate_user). When Redis is unreachable, SharedState keeps working from a
+per-process dict and retries Redis after retry_after seconds, so an outage
+degrades to per-worker state instead of failing requests.
+"""
+import time
+import threading
+
+import redis
+
+
+class SharedState:
+    def __init__(self, url=None, max_connections=20, retry_after=5.0, logger=None, client=None):
+        self.url = url
+        self.pool = None
+        if client is None and url:
+            self.pool = redis.ConnectionPool.from_url(
+                url, max_connections=max_connections, socket_timeout=0.5,
+                socket_connect_timeout=0.5, health_check_interval=30)
+            client = redis.Redis(connection_pool=self.pool)
+        self.client = client
+        self.retry_after = retry_after
+        self.logger = logger
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        self._local = {}  # key -> (expires_at or None, value)
+        self.fallbacks = 0
+
+    @property
+    def available(self):
+        return self.client is not None and time.monotonic() >= self._down_until
+
+    def _failed(self, e):
+        self._down_until = time.monotonic() + self.retry_after
+        self.fallbacks += 1
+        if self.logger:
+            self.logger.warning("Redis unavailable, using local state", error=str(e))
+
+    def _local_get(self, key):
+        item = self._local.get(key)
+        if item is None or (item[0] is not None and item[0] <= time.monotonic()):
+            self._local.pop(key, None)
+            return None
+        return item[1]
+
+    def incr_many(self, items, ttl=None):
+        """Increment several counters in one round trip; returns the new values
+
+        ttl is applied when a counter is created and not extended afterwards,
+        which gives fixed windows for rate-style counters. EXPIRE ... NX needs Redis 7.
+        """
+        if self.available:
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                for key, amount in items:
+                    pipe.incrby(key, amount)
+                    if ttl:
+                        pipe.expire(key, int(ttl), nx=True)
+                results = pipe.execute()
+                return results[::2] if ttl else results
+            except redis.RedisError as e:
+                self._failed(e)
+        values = []
+        with self._lock:
+            for key, amount in items:
+                current = self._local_get(key)
+                expires_at = self._local[key][0] if current is not None else (
+                    time.monotonic() + ttl if ttl else None)
+                value = (current or 0) + amount
+                self._local[key] = (expires_at, value)
+                values.append(value)
+        return values
+
+    def incr(self, key, amount=1, ttl=None):
+        return self.incr_many([(key, amount)], ttl)[0]
+
+    def get(self, key):
+        if self.available:
+            try:
+                return self.client.get(key)
+            except redis.RedisError as e:
+                self._failed(e)
+        with self._lock:
+            return self._local_get(key)
+
+    def stats(self):
+        status = "disabled"
+        if self.client is not None:
+            try:
+                self.client.ping()
+                status = "ok"
+            except redis.RedisError:
+                status = "down"
+        return {"redis": status, "fallbacks": self.fallbacks,
+                "in_use_connections": len(self.pool._in_use_connections) if self.pool else 0}
@@ -13,3 +13,7 @@ echo
 echo "List tickets"
 curl -s -c cookies.txt -b cookies.txt $host/api/tickets
 echo
+echo "Ticket history (first ticket)"
+tid=$(curl -s -c cookies.txt -b cookies.txt "$host/api/tickets?size=1" | python3 -c 'import json,sys; print(json.load(sys.stdin)["items"][0]["id"])')
+curl -s -f -c cookies.txt -b cookies.txt $host/api/tickets/$tid/history
+echo
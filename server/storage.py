@@ -0,0 +1,171 @@
+"""
+Streaming attachment uploads
+
+Werkzeug normally spools each uploaded file to a temporary file, which the
+route then copies again with FileStorage.save(). With init_app() installed,
+the multipart parser writes every chunk straight into an UploadSink as it
+arrives: a .part file inside the upload folder, or an S3 multipart upload.
+The sink hashes (SHA-256) and counts the bytes on the way through, so the
+route gets size and digest without re-reading the file. commit(name) moves
+the data to its final name; sinks that are never committed are removed when
+the request closes.
+"""
+import os
+import abc
+import hashlib
+import secrets
+
+from flask import Request, current_app
+
+
+class UploadSink(abc.ABC):
+    """Write-only file object that tracks size and SHA-256 of what passes through"""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.committed = False
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        self._write(data)
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        # The multipart parser rewinds the container once the part is complete
+        return 0
+
+    def tell(self):
+        return self.size
+
+    @abc.abstractmethod
+    def _write(self, data):
+        """Store the next chunk"""
+
+    @abc.abstractmethod
+    def commit(self, name):
+        """Move the data to its final name and return it"""
+
+    @abc.abstractmethod
+    def abort(self):
+        """Discard the data"""
+
+    def close(self):
+        if not self.committed:
+            self.abort()
+
+
+class LocalSink(UploadSink):
+    """Streams into a .part file in the upload folder and renames it on commit"""
+
+    def __init__(self, folder):
+        super().__init__()
+        self.folder = folder
+        self.tmp_path = os.path.join(folder, f".upload-{secrets.token_hex(8)}.part")
+        self._f = open(self.tmp_path, "w+b")
+
+    def _write(self, data):
+        self._f.write(data)
+
+    def seek(self, offset, whence=0):
+        return self._f.seek(offset, whence)
+
+    def read(self, size=-1):
+        return self._f.read(size)
+
+    def commit(self, name):
+        self._f.close()
+        dest = os.path.join(self.folder, name)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(self.tmp_path, dest)
+        self.committed = True
+        return name
+
+    def abort(self):
+        if not self._f.closed:
+            self._f.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class S3MultipartSink(UploadSink):
+    """Streams into an S3 multipart upload under a staging key, part_size bytes at a time
+
+    commit(key) completes the upload and, if key differs from the staging key,
+    moves the object with a server-side copy so no bytes pass through the app again.
+    """
+
+    MIN_PART_SIZE = 5 * 1024 * 1024
+
+    def __init__(self, client, bucket, prefix="uploads/staging/", part_size=8 * 1024 * 1024):
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = f"{prefix}{secrets.token_hex(16)}"
+        self.part_size = max(part_size, self.MIN_PART_SIZE)
+        self._buf = bytearray()
+        self._upload_id = None
+        self._parts = []
+
+    def _write(self, data):
+        self._buf += data
+        while len(self._buf) >= self.part_size:
+            self._flush_part(bytes(self._buf[:self.part_size]))
+            del self._buf[:self.part_size]
+
+    def _flush_part(self, body):
+        if self._upload_id is None:
+            self._upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key)["UploadId"]
+        number = len(self._parts) + 1
+        resp = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                       PartNumber=number, Body=body)
+        self._parts.append({"ETag": resp["ETag"], "PartNumber": number})
+
+    def commit(self, key=None):
+        if self._upload_id is None:
+            # Small file: a single PUT is cheaper than a one-part multipart upload
+            self.client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buf))
+        else:
+            if self._buf:
+                self._flush_part(bytes(self._buf))
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                                  MultipartUpload={"Parts": self._parts})
+        self._buf = bytearray()
+        if key and key != self.key:
+            self.client.copy({"Bucket": self.bucket, "Key": self.key}, self.bucket, key)
+            self.client.delete_object(Bucket=self.bucket, Key=self.key)
+            self.key = key
+        self.committed = True
+        return self.key
+
+    def abort(self):
+        self._buf = bytearray()
+        if self._upload_id is not None:
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception:
+                pass
+            self._upload_id = None
+
+
+class StreamingRequest(Request):
+    """Request whose file parts are written to the app's upload sink while parsing"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        factory = current_app.config.get("UPLOAD_SINK_FACTORY")
+        if factory is None or not filename:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return factory()
+
+
+def init_app(app, sink_factory):
+    """Stream file uploads of this app into sinks built by sink_factory()"""
+    app.request_class = StreamingRequest
+    app.config["UPLOAD_SINK_FACTORY"] = sink_factory
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Bulk ticket import and streaming export (NDJSON or CSV)
+
+Export reads tickets in id order through a server-side cursor (a named
+psycopg2 cursor on Postgres, fetchmany on SQLite) and yields encoded chunks,
+so memory stays flat however many rows match. GET /api/tickets/export serves
+it over HTTP; the command line writes to stdout:
+
+    python ticket_io.py export --format csv --status Open > open.csv
+    python ticket_io.py import legacy.ndjson --owner 1
+
+Import takes the export's columns (id is ignored and the database assigns new
+ones) and loads them in batches, one transaction per batch: COPY FROM STDIN on
+Postgres, executemany on SQLite. Invalid records are skipped and reported by
+line number. The search, counter and version triggers fire for each row, so
+imported tickets are searchable and counted as soon as their batch commits.
+"""
+import io
+import os
+import csv
+import sys
+import json
+import argparse
+from datetime import datetime
+
+COLUMNS = ("id", "title", "description", "status", "priority", "created_at", "updated_at", "assigned_to", "user_id")
+IMPORT_COLUMNS = COLUMNS[1:]
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+STATUSES = ("Open", "Closed")
+PRIORITIES = ("Low", "Normal", "High")
+MAX_ERRORS = 50  # reported back; later bad records are only counted
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%d")
+
+
+class BadRecord(ValueError):
+    def __init__(self, line, error):
+        super().__init__(f"line {line}: {error}")
+        self.line = line
+        self.error = error
+
+
+def filters(status=None, priority=None, user_id=None, postgres=False):
+    """WHERE clause and params for an export"""
+    p = "%s" if postgres else "?"
+    where, params = [], []
+    for col, val in (("status", status), ("priority", priority), ("user_id", user_id)):
+        if val:
+            where.append(f"{col}={p}"); params.append(val)
+    return (" WHERE " + " AND ".join(where) if where else ""), params
+
+
+def export_rows(conn, postgres=False, where="", params=(), batch=2000):
+    """Yield ticket tuples in COLUMNS order, batch rows per round trip"""
+    sql = f"SELECT {','.join(COLUMNS)} FROM tickets{where} ORDER BY id"
+    if postgres:
+        # Named cursor: the server holds the result set and we fetch itersize rows at a time
+        c = conn.cursor(name="ticket_export")
+        c.itersize = batch
+        c.execute(sql, params)
+        try:
+            for row in c:
+                yield tuple(row.values()) if isinstance(row, dict) else tuple(row)
+        finally:
+            c.close()
+        return
+    c = conn.cursor()
+    c.execute(sql, params)
+    while True:
+        rows = c.fetchmany(batch)
+        if not rows:
+            return
+        yield from rows
+
+
+def _text(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S") if isinstance(value, datetime) else value
+
+
+def encode(rows, fmt, chunk=500):
+    """Serialized export in chunks of `chunk` rows (CSV starts with a header line)"""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n") if fmt == "csv" else None
+    if writer:
+        writer.writerow(COLUMNS)
+    n = 0
+    for row in rows:
+        row = [_text(v) for v in row]
+        if writer:
+            writer.writerow(row)
+        else:
+            buf.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n")
+        n += 1
+        if n % chunk == 0:
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def read_records(stream, fmt):
+    """(line number, dict) from a text stream of NDJSON or CSV"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for n, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield n, json.loads(line)
+        except ValueError:
+            yield n, None  # rejected by clean()
+
+
+def _str(line, record, key):
+    value = record.get(key)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise BadRecord(line, f"bad_{key}")
+    return value.strip()
+
+
+def _int(line, record, key):
+    value = record.get(key)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BadRecord(line, f"bad_{key}")
+
+
+def _time(line, record, key):
+    value = _str(line, record, key)
+    if not value:
+        return None
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    raise BadRecord(line, f"bad_{key}")
+
+
+def clean(line, record, owner=None, now=None):
+    """Validate one record like POST /api/tickets does; returns a tuple in IMPORT_COLUMNS order
+
+    User ids are only checked for type here; known_users() checks them against users per batch.
+    """
+    if not isinstance(record, dict):
+        raise BadRecord(line, "bad_json")
+    title = _str(line, record, "title")
+    description = _str(line, record, "description")
+    if not title or not description:
+        raise BadRecord(line, "missing_fields")
+    if len(title) > 160:
+        raise BadRecord(line, "title_too_long")
+    if len(description) > 10000:
+        raise BadRecord(line, "description_too_long")
+    status = _str(line, record, "status") or "Open"
+    if status not in STATUSES:
+        raise BadRecord(line, "bad_status")
+    priority = _str(line, record, "priority") or "Normal"
+    if priority not in PRIORITIES:
+        raise BadRecord(line, "bad_priority")
+    user_id = _int(line, record, "user_id") or owner
+    if user_id is None:
+        raise BadRecord(line, "missing_user_id")
+    created_at = _time(line, record, "created_at") or now or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return (title, description, status, priority, created_at, _time(line, record, "updated_at") or created_at,
+            _int(line, record, "assigned_to"), user_id)
+
+
+class _CopySource:
+    """File-like CSV view of row tuples for cursor.copy_expert, encoded as COPY reads it"""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.pending = ""
+        self.buf = io.StringIO()
+        self.writer = csv.writer(self.buf, lineterminator="\n")
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            # None -> unquoted empty field, which COPY's csv format reads as NULL
+            self.writer.writerow(row)
+            self.pending += self.buf.getvalue()
+            self.buf.seek(0); self.buf.truncate()
+        if size < 0:
+            size = len(self.pending)
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+
+def known_users(conn, ids, postgres=False):
+    """The subset of ids that exist in users, a few hundred per query"""
+    p = "%s" if postgres else "?"
+    ids, found = sorted(ids), set()
+    c = conn.cursor()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        c.execute(f"SELECT id FROM users WHERE id IN ({','.join([p] * len(chunk))})", chunk)
+        found.update(r["id"] if isinstance(r, dict) else r[0] for r in c.fetchall())
+    return found
+
+
+def _reject(result, line, error):
+    result["skipped"] += 1
+    if len(result["errors"]) < MAX_ERRORS:
+        result["errors"].append({"line": line, "error": error})
+
+
+def _load(conn, rows, postgres):
+    c = conn.cursor()
+    if postgres:
+        c.copy_expert(f"COPY tickets({','.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", _CopySource(rows))
+    else:
+        c.executemany(f"INSERT INTO tickets({','.join(IMPORT_COLUMNS)}) VALUES({','.join('?' * len(IMPORT_COLUMNS))})", rows)
+    conn.commit()
+
+
+def import_tickets(conn, records, postgres=False, owner=None, actor_id=None, batch=5000):
+    """Load (line, record) pairs batch by batch; returns {imported, skipped, errors}
+
+    owner is the user_id for records without one. Referenced users are looked up
+    once per batch and records naming unknown ones are skipped like other bad
+    records. If a batch fails to load, the batches committed before it stay imported.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    result = {"imported": 0, "skipped": 0, "errors": []}
+    pending = []  # (line, row)
+
+    def flush():
+        # One users lookup per batch; rows pointing at unknown users are reported, not loaded
+        known = known_users(conn, {r[7] for _, r in pending} | {r[6] for _, r in pending if r[6] is not None}, postgres)
+        rows = []
+        for line, row in pending:
+            if row[7] not in known:
+                _reject(result, line, "unknown_user_id")
+            elif row[6] is not None and row[6] not in known:
+                _reject(result, line, "unknown_assigned_to")
+            else:
+                rows.append(row)
+        if rows:
+            _load(conn, rows, postgres)
+            result["imported"] += len(rows)
+        pending.clear()
+
+    try:
+        for line, record in records:
+            try:
+                pending.append((line, clean(line, record, owner, now)))
+            except BadRecord as e:
+                _reject(result, e.line, e.error)
+                continue
+            if len(pending) >= batch:
+                flush()
+        if pending:
+            flush()
+    except Exception:
+        conn.rollback()
+        raise
+    result["errors"].sort(key=lambda e: e["line"])
+    if result["imported"]:
+        p = "%s" if postgres else "?"
+        conn.cursor().execute(f"INSERT INTO audit_log(ts,actor_id,action,entity,entity_id,details) "
+                              f"VALUES({p},{p},'import','ticket',NULL,{p})",
+                              (now, actor_id, f"imported={result['imported']} skipped={result['skipped']}"))
+        conn.commit()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk ticket import/export")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="write tickets to stdout")
+    exp.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    exp.add_argument("--status", choices=STATUSES)
+    exp.add_argument("--priority", choices=PRIORITIES)
+    exp.add_argument("--user-id", type=int)
+    imp = sub.add_parser("import", help="load tickets from a file ('-' for stdin)")
+    imp.add_argument("file")
+    imp.add_argument("--format", choices=sorted(FORMATS), help="default: from the file extension, else ndjson")
+    imp.add_argument("--owner", type=int, help="user_id for records that have none")
+    imp.add_argument("--batch", type=int, default=5000, help="rows per transaction")
+    args = parser.parse_args()
+
+    postgres = os.getenv('DATABASE_URL', '').startswith('postgresql://')
+    if postgres:
+        import app_production as helpdesk
+    else:
+        import app as helpdesk
+    conn = helpdesk.pool.getconn()
+    try:
+        if args.command == "export":
+            where, params = filters(args.status, args.priority, args.user_id, postgres)
+            for chunk in encode(export_rows(conn, postgres, where, params), args.format):
+                sys.stdout.write(chunk)
+            return
+        fmt = args.format or ("csv" if args.file.endswith(".csv") else "ndjson")
+        stream = sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8")
+        with stream:
+            result = import_tickets(conn, read_records(stream, fmt), postgres, owner=args.owner, batch=args.batch)
+    finally:
+        helpdesk.pool.putconn(conn)
+    for err in result["errors"]:
+        print(f"line {err['line']}: {err['error']}", file=sys.stderr)
+    print(f"Imported {result['imported']} tickets, skipped {result['skipped']}")
+
+
+if __name__ == "__main__":
+    main()
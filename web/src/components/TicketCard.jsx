@@ -86,7 +86,7 @@ export default function TicketCard({ ticket, onChange }) {
           <ul>
             {attachments.map(a => (
               <li key={a.id}>
-                <a href={`/uploads/${a.path}`} target="_blank" rel="noreferrer">{a.filename}</a>
+                <a href={a.url || `/uploads/${a.id}`} target="_blank" rel="noreferrer">{a.filename}</a>
                 <span style={{color:'#777', marginLeft:8}}>({a.size} bytes)</span>
               </li>
             ))}
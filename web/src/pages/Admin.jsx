@@ -93,19 +93,33 @@ function UsersTab() {
   )
 }
 
+const AUDIT_FILTERS = [
+  ['actor_id', 'Actor ID', 'number'],
+  ['action', 'Action', 'text'],
+  ['entity', 'Entity', 'text'],
+  ['entity_id', 'Entity ID', 'number'],
+  ['since', 'Since', 'date'],
+  ['until', 'Until', 'date'],
+];
+
 function AuditTab() {
-  const [page, setPage] = useState(1);
-  const [data, setData] = useState({ items: [], page:1, size:20, total:0 });
+  // cursors[i] fetches page i; the server pages newest first by id, so Prev walks back down the stack
+  const [cursors, setCursors] = useState([null]);
+  const [form, setForm] = useState({});
+  const [filters, setFilters] = useState({});
+  const [data, setData] = useState({ items: [], size:20, next_cursor:null });
   const [err, setErr] = useState('');
   const [loading, setLoading] = useState(true);
+  const page = cursors.length;
 
-  async function load(p = page) {
+  async function load(cursor, f) {
     setErr('');
     setLoading(true);
     try {
-      console.log('Loading audit log, page:', p);
-      const r = await api(`/api/audit?page=${p}&size=20`);
-      console.log('Audit data loaded:', r);
+      const qs = new URLSearchParams({ size: '20' });
+      Object.entries(f).forEach(([k, v]) => { if (v) qs.set(k, v); });
+      if (cursor) qs.set('cursor', cursor);
+      const r = await api(`/api/audit?${qs}`);
       setData(r);
     } catch(e){ 
       console.error('Error loading audit log:', e);
@@ -115,20 +129,29 @@ function AuditTab() {
       setLoading(false);
     }
   }
-  useEffect(()=>{ load(page); }, [page]);
-
-  const totalPages = Math.max(1, Math.ceil((data.total || 0) / (data.size || 20)));
+  useEffect(()=>{ load(cursors[cursors.length - 1], filters); }, [cursors, filters]);
 
-  if (loading) {
-    return <div className="card"><h3>Audit Log</h3><div>Loading audit log...</div></div>;
-  }
+  const applyFilters = (e) => {
+    e.preventDefault();
+    setFilters(form);
+    setCursors([null]);
+  };
 
   return (
     <div className="card">
       <h3>Audit Log</h3>
+      <form className="row" style={{gap:8, flexWrap:'wrap', marginBottom:12}} onSubmit={applyFilters}>
+        {AUDIT_FILTERS.map(([key, label, type])=>(
+          <input key={key} type={type} placeholder={label} title={label} value={form[key] || ''}
+                 onChange={e=>setForm(f=>({ ...f, [key]: e.target.value }))} />
+        ))}
+        <button type="submit">Filter</button>
+      </form>
       {err && <div className="error">{err}</div>}
-      {data.items.length === 0 ? (
-        <div>No audit log entries found. This might be an authentication issue.</div>
+      {loading ? (
+        <div>Loading audit log...</div>
+      ) : data.items.length === 0 ? (
+        <div>No audit log entries found.</div>
       ) : (
         <>
           <table style={{width:'100%', borderCollapse:'collapse'}}>
@@ -147,9 +170,9 @@ function AuditTab() {
             </tbody>
           </table>
           <div className="row" style={{justifyContent:'center', gap:8, marginTop:12}}>
-            <button disabled={page<=1} onClick={()=>setPage(p=>p-1)}>Prev</button>
-            <span>Page {page} / {totalPages}</span>
-            <button disabled={page>=totalPages} onClick={()=>setPage(p=>p+1)}>Next</button>
+            <button disabled={page<=1} onClick={()=>setCursors(c=>c.slice(0, -1))}>Prev</button>
+            <span>Page {page}</span>
+            <button disabled={!data.next_cursor} onClick={()=>setCursors(c=>[...c, data.next_cursor])}>Next</button>
           </div>
         </>
       )}
@@ -10,12 +10,14 @@ export default function TicketDetail() {
   const [ticket, setTicket] = useState(null)
   const [comments, setComments] = useState([])
   const [newComment, setNewComment] = useState('')
+  const [history, setHistory] = useState({ items: [], next_cursor: null })
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState('')
 
   useEffect(() => {
     loadTicket()
     loadComments()
+    loadHistory()
   }, [id])
 
   const loadTicket = async () => {
@@ -39,6 +41,16 @@ export default function TicketDetail() {
     }
   }
 
+  // Newest first; "Show older" appends the next page
+  const loadHistory = async (cursor) => {
+    try {
+      const data = await api(`/api/tickets/${id}/history${cursor ? `?cursor=${cursor}` : ''}`)
+      setHistory(h => ({ items: cursor ? [...h.items, ...data.items] : data.items, next_cursor: data.next_cursor }))
+    } catch (e) {
+      console.log('History not available:', e.message)
+    }
+  }
+
   const addComment = async (e) => {
     e.preventDefault()
     if (!newComment.trim()) return
@@ -62,6 +74,7 @@ export default function TicketDetail() {
         body: JSON.stringify(updates)
       })
       setTicket(data)
+      loadHistory()
     } catch (e) {
       setError(e.message)
     }
@@ -74,6 +87,7 @@ export default function TicketDetail() {
         body: JSON.stringify({ user_id: userId })
       })
       loadTicket()
+      loadHistory()
     } catch (e) {
       setError(e.message)
     }
@@ -84,6 +98,7 @@ export default function TicketDetail() {
       try {
         await api(`/api/tickets/${id}/close`, { method: 'PUT' })
         loadTicket()
+        loadHistory()
       } catch (e) {
         setError(e.message)
       }
@@ -167,6 +182,30 @@ export default function TicketDetail() {
         </div>
       </div>
 
+      {/* Activity from the audit log */}
+      <div className="card">
+        <h3>History</h3>
+        {history.items.map(entry => (
+          <div key={entry.id} className="comment">
+            <div className="comment-meta">
+              <strong>{entry.action}</strong>
+              <span>by user {entry.actor_id ?? 'system'}</span>
+              <span>{new Date(entry.ts).toLocaleString()}</span>
+            </div>
+            <div className="comment-content">
+              {entry.changes
+                ? Object.entries(entry.changes).map(([field, [from, to]]) => (
+                    <div key={field}>{field}: {String(from ?? '—')} → {String(to ?? '—')}</div>
+                  ))
+                : entry.details}
+            </div>
+          </div>
+        ))}
+        {history.next_cursor && (
+          <button onClick={() => loadHistory(history.next_cursor)}>Show older</button>
+        )}
+      </div>
+
       {/* Comments Section */}
       <div className="card">
         <h3>Comments</h3>
@@ -1,13 +1,14 @@
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import { Link, useSearchParams } from 'react-router-dom'
 import TicketCard from '../components/TicketCard'
-import { api } from '../api'
+import { api, API_BASE } from '../api'
 import { useAuth } from '../AuthContext'
 
 export default function Tickets() {
   const { user } = useAuth();
   const [sp, setSp] = useSearchParams();
   const [data, setData] = useState({ items: [], page: 1, size: 12, total: 0 });
+  const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
   const [viewMode, setViewMode] = useState('all'); // 'all', 'open', 'closed'
   const priority = sp.get('priority') || 'All';
@@ -29,12 +30,31 @@ export default function Tickets() {
     if (priority !== 'All') qs.set('priority', priority);
     qs.set('page', String(page));
     qs.set('size', '50'); // Load more tickets for sectioned view
-    const res = await api(`/api/tickets?${qs.toString()}`, { method: 'GET' });
+    // Section totals come from the server-side counters, not from the 50 loaded tickets
+    const [res, counts] = await Promise.all([
+      api(`/api/tickets?${qs.toString()}`, { method: 'GET' }),
+      api('/api/tickets/stats', { method: 'GET' }).catch(() => null),
+    ]);
     setData(res);
+    setStats(counts);
     setLoading(false);
   }
   useEffect(() => { load(); }, [viewMode, priority, page]);
 
+  // Live updates instead of polling: reload when the server reports a ticket change.
+  // Bursts (bulk edits) collapse into one reload; EventSource reconnects on its own.
+  const loadRef = useRef(load);
+  loadRef.current = load;
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') return;
+    const es = new EventSource(`${API_BASE}/api/events`, { withCredentials: true });
+    let timer;
+    const refresh = () => { clearTimeout(timer); timer = setTimeout(() => loadRef.current(), 300); };
+    const types = ['ticket.created', 'ticket.updated', 'ticket.assigned', 'ticket.closed', 'ticket.deleted', 'resync'];
+    types.forEach(t => es.addEventListener(t, refresh));
+    return () => { clearTimeout(timer); es.close(); };
+  }, []);
+
   const setFilter = (k,v) => {
     const next = new URLSearchParams(sp);
     if (v === 'All') next.delete(k); else next.set(k, v);
@@ -57,6 +77,12 @@ export default function Tickets() {
 
   const totalPages = Math.max(1, Math.ceil((data.total || 0) / (data.size || 12)));
 
+  const statusCount = (status, loaded) => {
+    if (!stats) return loaded;
+    if (priority === 'All') return stats.by_status[status] ?? loaded;
+    return stats.by_status_priority[status]?.[priority] ?? loaded;
+  };
+
   return (
     <div className="stack">
       <div className="row">
@@ -105,7 +131,7 @@ export default function Tickets() {
                         {status === 'Open' ? '🟢 Open Tickets' : 
                          status === 'Closed' ? '🔴 Closed Tickets' : 
                          `📋 ${status} Tickets`}
-                        <span className="ticket-count">({tickets.length})</span>
+                        <span className="ticket-count">({statusCount(status, tickets.length)})</span>
                       </h3>
                     </div>
                     <div className="grid">